@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class QuickstartConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.quickstart'
+
+    def ready(self):
+        from django.core import checks
+
+        from . import signals  # noqa: F401
+        from .authcache import check_shared_cache
+
+        checks.register(check_shared_cache, checks.Tags.caches)
@@ -0,0 +1,159 @@
+"""
+Cache of the users of authenticated requests, read by ```CachedAuthenticationMiddleware```.
+    Django loads the session row, then the user row, before any view runs. Sessions are read from the cache
+    by the 'cached_db' session engine (see ```SESSION_ENGINE``` in settings), and users by ```get_user()```,
+    so the authenticated requests of a known user run no query to authenticate it.
+
+    Each cached user is stored with the version of its user, which is bumped when the user is saved or deleted
+    and when it logs out (see ```signals.py```). A password change thus invalidates the cached user, and the
+    session hash of the other sessions no longer matches. ```QuerySet.update()``` sends no signal: a password
+    or 'is_active' changed that way is only seen when the entry expires, after ```TIMEOUT``` seconds.
+
+    The password hash is not cached: the user is cached without it (it is deferred, loaded if read), along with
+    the session hashes derived from it. Invalidations only reach the processes sharing the cache, so both caches
+    are enabled in settings only with a shared cache backend, and ```check_shared_cache()``` reports them
+    enabled with a cache private to each process (see ```CACHES``` in settings).
+"""
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Seconds a user is cached, invalidations aside.
+    'TIMEOUT': 300,
+}
+
+
+# Cache backends holding their entries in each process.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+CACHED_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+def get_config() -> dict:
+    """Return the ```AUTH_USER_CACHE``` setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'AUTH_USER_CACHE', {})}
+
+
+def check_shared_cache(app_configs, **kwargs) -> list:
+    """
+    Fail when sessions or users are cached in a cache private to each process: a logout, password change or
+    deactivation in one process would not end the sessions cached by the others.
+    """
+    backend = settings.CACHES.get(getattr(settings, 'SESSION_CACHE_ALIAS', 'default'), {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    hint = 'Configure a shared cache (e.g. memcached), or silence this check when running a single process.'
+    errors = []
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES:
+        errors.append(checks.Error(
+            f'SESSION_ENGINE caches sessions in {backend}, which is private to each process.',
+            hint=hint, id='quickstart.E001'))
+    if get_config()['ENABLED']:
+        errors.append(checks.Error(
+            f'AUTH_USER_CACHE caches users in {backend}, which is private to each process.',
+            hint=hint, id='quickstart.E002'))
+    return errors
+
+
+def user_cache_keys(pk) -> tuple:
+    """Return the keys of a cached user and of its version."""
+    return f'auth:user:{pk}', f'auth:user:{pk}:version'
+
+
+def _bump_version(pk) -> None:
+    key, version_key = user_cache_keys(pk)
+    try:
+        cache.incr(version_key)
+    except ValueError:  # Not set yet, or evicted.
+        cache.add(version_key, 1, None)
+    # An evicted version restarts, entries stored under the previous ones must not match it again.
+    cache.delete(key)
+
+
+def invalidate_user(pk) -> None:
+    """
+    Invalidate the cached user.
+        Bumped again on commit, otherwise a read between the write and the commit
+        would cache the old row under the new version.
+    """
+    _bump_version(pk)
+    transaction.on_commit(lambda: _bump_version(pk))
+
+
+def _session_hashes(user):
+    """The session hashes a session of ```user``` may hold, None if its sessions are not verified."""
+    if not hasattr(user, 'get_session_auth_hash'):
+        return None
+    hashes = [user.get_session_auth_hash()]
+    if hasattr(user, '_legacy_get_session_auth_hash'):
+        hashes.append(user._legacy_get_session_auth_hash())
+    return tuple(hashes)
+
+
+def load_user(backend, user_id) -> tuple:
+    """
+    Load the user of ```backend.get_user()```, from the cache while it is not invalidated.
+        :return: (user or None, its session hashes or None, see ```_session_hashes()```)
+    """
+    key, version_key = user_cache_keys(user_id)
+    values = cache.get_many([key, version_key])
+    version = values.get(version_key, 0)
+    entry = values.get(key)
+    if entry is not None and entry[0] == version:
+        _, label, db, fields, hashes = entry
+        return apps.get_model(label).from_db(db, list(fields), list(fields.values())), hashes
+    user = backend.get_user(user_id)
+    if user is None:
+        return None, None
+    hashes = _session_hashes(user)
+    fields = {
+        field.attname: getattr(user, field.attname)
+        for field in user._meta.concrete_fields if field.attname != 'password'
+    }
+    cache.set(key, (version, user._meta.label, user._state.db, fields, hashes), get_config()['TIMEOUT'])
+    return user, hashes
+
+
+def get_user(request):
+    """
+    Like ```django.contrib.auth.get_user()```, with the user loaded by ```load_user()```.
+        The session hash is verified against the cached hashes of the user: they change with the password,
+        which invalidates the cached user. A session holding the legacy hash is upgraded to the current one.
+    """
+    from django.contrib import auth
+    from django.contrib.auth.models import AnonymousUser
+    from django.utils.crypto import constant_time_compare
+
+    if not get_config()['ENABLED']:
+        return auth.get_user(request)
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    user, hashes = load_user(auth.load_backend(backend_path), user_id)
+    if user is not None and hashes is not None:
+        session_hash = request.session.get(auth.HASH_SESSION_KEY)
+        current, legacy = hashes[0], hashes[1:]
+        if not (session_hash and constant_time_compare(session_hash, current)):
+            if session_hash and any(constant_time_compare(session_hash, value) for value in legacy):
+                # A session of the legacy hash moves to the current one, as auth.get_user() does.
+                request.session.cycle_key()
+                request.session[auth.HASH_SESSION_KEY] = current
+            else:
+                request.session.flush()
+                user = None
+    return user or AnonymousUser()
@@ -0,0 +1,24 @@
+"""
+Signal receivers of quickstart app, connected in ```QuickstartConfig.ready()```.
+"""
+
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authcache import invalidate_user
+
+
+@receiver(post_save, sender=User, dispatch_uid='quickstart_user_cache_save')
+@receiver(post_delete, sender=User, dispatch_uid='quickstart_user_cache_delete')
+def invalidate_cached_user(sender, instance: User, **kwargs) -> None:
+    # Password changes and logins (which set 'last_login') are saves too.
+    invalidate_user(instance.pk)
+
+
+@receiver(user_logged_out, dispatch_uid='quickstart_user_cache_logout')
+def invalidate_logged_out_user(sender, user=None, **kwargs) -> None:
+    # Sent without a user when the session was not authenticated.
+    if user is not None and user.pk is not None:
+        invalidate_user(user.pk)
@@ -3,6 +3,9 @@ Mixins for quickstart app
 """
 
 from django.contrib.auth.models import User
+from django.test import override_settings
+
+from drftutorial.querycheck import get_config
 
 
 class CreateTestUserMixin(object):
@@ -14,20 +17,38 @@ class CreateTestUserMixin(object):
     email = 'testuser01@test.py'
     password = 'ttt01'
 
-    def _create_test_user(self, email: str = None, username: str = None, password: str = None) -> None:
-        """Create User object"""
-        target_username = username if username is not None else self.username
-        target_email = email if email is not None else self.email
-        target_password = password if password is not None else self.password
+    @classmethod
+    def _create_test_user(cls, email: str = None, username: str = None, password: str = None) -> User:
+        """
+        Create User object, unless it exists, and return it.
+            A classmethod, so that ```setUpTestData()``` can create the user once per test case.
+        """
+        target_username = username if username is not None else cls.username
+        target_email = email if email is not None else cls.email
+        target_password = password if password is not None else cls.password
 
         # Check user existence.
-        try:
-            User.objects.get(username=target_username)
-            return
-        except User.DoesNotExist:
-            pass
+        user = User.objects.filter(username=target_username).first()
+        if user is not None:
+            return user
 
         # Create new user
         user = User(email=target_email, username=target_username)
-        user.set_password(target_password)  # Set hashed password
+        user.set_password(target_password)  # Set hashed password, cheap with the hasher of settings_test.
         user.save()
+        return user
+
+
+class QueryInspectMixin(object):
+    """
+    Mixin for API test cases.
+    Every request made through the test client is inspected by ```QueryInspectMiddleware```,
+    so a test fails when a view reintroduces per-row queries or exceeds its ```query_budget```.
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        override = override_settings(QUERY_INSPECT={**get_config(), 'ENABLED': True, 'RAISE': True})
+        override.enable()
+        cls.addClassCleanup(override.disable)
+        super(QueryInspectMixin, cls).setUpClass()
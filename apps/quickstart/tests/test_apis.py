@@ -5,14 +5,21 @@ Test APIs in quickstart app.
 from rest_framework import status
 from rest_framework.test import APITestCase, APIRequestFactory
 
+from django.contrib.auth import HASH_SESSION_KEY
 from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 
+from apps.quickstart.authcache import check_shared_cache, user_cache_keys
 from apps.quickstart.serializers import UserSerializer, GroupSerializer
+from drftutorial.querycheck import get_config as get_query_inspect_config
 
-from .mixins import CreateTestUserMixin
+from .mixins import CreateTestUserMixin, QueryInspectMixin
 
 
-class BaseAPITestCase(CreateTestUserMixin, APITestCase):
+class BaseAPITestCase(QueryInspectMixin, CreateTestUserMixin, APITestCase):
     """
     Base module for REST API test.
     """
@@ -20,14 +27,15 @@ class BaseAPITestCase(CreateTestUserMixin, APITestCase):
     class Meta:
         abstract = True
 
-    def setUp(self) -> None:
-        """Setup default test user, authentication and request factory"""
-        # Create test user
-        self._create_test_user()
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """Setup default test user, once per test case"""
+        cls.test_user = cls._create_test_user()
 
+    def setUp(self) -> None:
+        """Setup authentication and request factory"""
         # Set authentication for REST API call
-        test_user = User.objects.get(username=self.username)
-        self.client.force_authenticate(user=test_user)
+        self.client.force_authenticate(user=self.test_user)
 
         # Set request factory
         self.factory = APIRequestFactory()
@@ -104,3 +112,81 @@ class DeleteTest(BaseAPITestCase):
 
     def test_delete_user(self) -> None:
         pass
+
+
+# Enabled as with a shared cache, the test client runs in a single process.
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', AUTH_USER_CACHE={'ENABLED': True})
+class CachedAuthenticationTests(BaseAPITestCase):
+    """
+    Test the sessions and users of authenticated requests read from the cache, and their invalidation.
+    """
+    url = '/quickstart/groups/'
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        # Authenticated by the session, not forced.
+        self.client.force_authenticate(user=None)
+        self.client.login(username=self.username, password=self.password)
+
+    def _auth_queries(self) -> list:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in queries if 'django_session' in query['sql'] or 'auth_user' in query['sql']]
+
+    def test_steady_state_runs_no_auth_query(self) -> None:
+        self.assertEqual(len(self._auth_queries()), 1)  # The user, its session is cached by the login.
+        self.assertEqual(self._auth_queries(), [])
+
+    def test_user_update_is_seen(self) -> None:
+        self._auth_queries()
+        User.objects.get(pk=self.test_user.pk).save()
+        self.assertEqual(len(self._auth_queries()), 1)
+
+        user = User.objects.get(pk=self.test_user.pk)
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_password_change_ends_sessions(self) -> None:
+        self._auth_queries()
+        user = User.objects.get(pk=self.test_user.pk)
+        user.set_password('changed')
+        user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_legacy_session_hash_is_upgraded(self) -> None:
+        self._auth_queries()
+        session = self.client.session
+        key = session.session_key
+        session[HASH_SESSION_KEY] = self.test_user._legacy_get_session_auth_hash()
+        session.save()
+
+        # Moving the session to a new key writes it again, once, beyond the budget of the view.
+        with override_settings(QUERY_INSPECT={**get_query_inspect_config(), 'ENABLED': False}):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        session = self.client.session
+        self.assertNotEqual(session.session_key, key)
+        self.assertEqual(session[HASH_SESSION_KEY], self.test_user.get_session_auth_hash())
+
+    def test_logout_ends_session(self) -> None:
+        self._auth_queries()
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_password_is_not_cached(self) -> None:
+        self._auth_queries()
+        entry = cache.get(user_cache_keys(self.test_user.pk)[0])
+        self.assertNotIn('password', entry[3])
+        self.assertNotIn(self.test_user.password, repr(entry))
+
+        # The password of the cached user is deferred, loaded when read.
+        request = self.client.get(self.url).wsgi_request
+        self.assertEqual(request.user.get_deferred_fields(), {'password'})
+        self.assertEqual(request.user.password, self.test_user.password)
+
+    def test_check_requires_shared_cache(self) -> None:
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['quickstart.E001', 'quickstart.E002'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertEqual(check_shared_cache(None), [])
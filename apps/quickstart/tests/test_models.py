@@ -14,11 +14,10 @@ class UserTests(CreateTestUserMixin, TestCase):
     Test module for Django User model.
     """
 
-    def setUp(self) -> None:
-        """Setup default test user"""
-        self._create_test_user()
-
-        super(UserTests, self).setUp()
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """Setup default test user, once per test case"""
+        cls._create_test_user()
 
     def test_get_user(self) -> None:
         """User model test"""
@@ -7,16 +7,21 @@ from django.contrib.auth.models import User, Group
 from rest_framework import viewsets
 from rest_framework import permissions
 
+from drftutorial.pagination import ApproximateCountPagination
+
 from .serializers import UserSerializer, GroupSerializer
 
 
 class UserViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows users to be viewed or edited.
+        The count of the list is approximate, unless '?exact_count=1'.
     """
-    queryset = User.objects.all().order_by('date_joined')
+    queryset = User.objects.prefetch_related('groups').order_by('date_joined')
     serializer_class = UserSerializer
+    pagination_class = ApproximateCountPagination
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 5, 'retrieve': 4}
 
 
 class GroupViewSet(viewsets.ModelViewSet):
@@ -26,3 +31,4 @@ class GroupViewSet(viewsets.ModelViewSet):
     queryset = Group.objects.all().order_by('name')
     serializer_class = GroupSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 4, 'retrieve': 3}
@@ -2,6 +2,7 @@
 Add Snippet model to Django admin.
 """
 
+from django import forms
 from django.contrib.admin import register as admin_register
 from django.contrib.admin import ModelAdmin
 from django.utils.html import format_html
@@ -9,12 +10,30 @@ from django.utils.html import format_html
 from .models import Snippet
 
 
+class SnippetAdminForm(forms.ModelForm):
+    """
+    Snippet form editing the code, which is a property of the model stored in a shared blob.
+        The model fields are added by the admin per request, building them here at import would list the lexers.
+    """
+    code = forms.CharField(widget=forms.Textarea)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['code'].initial = self.instance.code
+
+    def save(self, commit=True):
+        self.instance.code = self.cleaned_data['code']
+        return super().save(commit)
+
+
 @admin_register(Snippet)
 class CustomSnippetAdmin(ModelAdmin):
     """
     Custom Snippet admin
     """
 
+    form = SnippetAdminForm
     fieldsets = (
         (
             'Update Snippet Values',
@@ -30,7 +49,8 @@ class CustomSnippetAdmin(ModelAdmin):
     ordering = ('-id',)
     list_filter = ModelAdmin.list_filter + ('title', 'owner',)
     search_fields = (
-        'title__contains', 'code__contains', 'highlighted__contains', 'owner__username', 'language', 'style',)
+        'title__contains', 'code_blob__data__contains', 'render_blob__data__contains',
+        'owner__username', 'language', 'style',)
 
     def view_highlighted(self, obj):
         url = f'/snippets/{obj.id}/highlight/'
@@ -0,0 +1,298 @@
+"""
+Benchmark helpers of snippets app.
+    Synthetic code generation, source corpora, latency statistics and baseline comparison
+    shared by the ```seed_snippets```, ```build_language_model``` and ```bench_*``` management commands.
+"""
+
+import fnmatch
+import hashlib
+import json
+import math
+import os
+import random
+import string
+import time
+
+from django.conf import settings
+from django.test import override_settings
+
+from drftutorial.querycheck import get_config
+
+
+# Line templates for a few common languages, any other language falls back to 'default'.
+CODE_TEMPLATES = {
+    'python': [
+        'def {name}({arg}, *args, **kwargs):',
+        '    {name} = [{arg} * {num} for {arg} in range({num})]',
+        '    if {arg} is not None and {name} > {num}:',
+        '        return {{"{text}": {arg}, "value": {num}}}',
+        '# {text}',
+        'class {Name}(object):',
+        '    """{text}"""',
+        'import {name}',
+    ],
+    'javascript': [
+        'function {name}({arg}) {{',
+        '  const {name} = {arg}.map((x) => x * {num});',
+        '  if ({arg} !== null && {name}.length > {num}) {{ return "{text}"; }}',
+        '}}',
+        '// {text}',
+        'let {name} = {{ "{text}": {num} }};',
+    ],
+    'c': [
+        'static int {name}(int {arg}) {{',
+        '    for (int i = 0; i < {num}; i++) {{ {arg} += i; }}',
+        '    return {arg} * {num};',
+        '}}',
+        '/* {text} */',
+        '#include <{name}.h>',
+    ],
+    'sql': [
+        'SELECT {name}, COUNT(*) FROM {arg} WHERE {name} > {num} GROUP BY {name};',
+        "INSERT INTO {arg} ({name}) VALUES ('{text}');",
+        '-- {text}',
+    ],
+    'html': [
+        '<div class="{name}" id="{arg}">',
+        '  <p>{text}</p>',
+        '</div>',
+        '<!-- {text} -->',
+    ],
+    'default': [
+        '{name} = {arg} + {num}',
+        '{name}({arg}, {num})',
+        '"{text}"',
+    ],
+}
+
+
+def generate_code(rng: random.Random, language: str, lines: int) -> str:
+    """
+    Generate syntactically plausible source code.
+        :param rng: Seeded random generator, so the output is reproducible.
+        :param language: Alias of the pygments lexer.
+        :param lines: Number of lines to generate.
+        :return: Source code.
+    """
+    templates = CODE_TEMPLATES.get(language, CODE_TEMPLATES['default'])
+    result = []
+    for _ in range(lines):
+        name = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+        result.append(rng.choice(templates).format(
+            name=name,
+            Name=name.capitalize(),
+            arg=rng.choice(('value', 'item', 'row', 'data', 'x')),
+            num=rng.randint(0, 10000),
+            text=' '.join(rng.choice(('lorem', 'ipsum', 'dolor', 'sit', 'amet')) for _ in range(rng.randint(1, 6))),
+        ))
+    return '\n'.join(result) + '\n'
+
+
+def generate_code_of_size(rng: random.Random, language: str, size: int) -> str:
+    """Generate source code of at least ```size``` characters, truncated at a line boundary."""
+    code = generate_code(rng, language, max(1, size // 30))
+    while len(code) < size:
+        code += generate_code(rng, language, max(1, (size - len(code)) // 30))
+    return code[:code.rfind('\n', 0, size) + 1] or code
+
+
+# Inputs known to trip backtracking regular expressions: unterminated literals, deep nesting, long lines.
+ADVERSARIAL_PATTERNS = (
+    '"' + 'a\\' * 64,
+    '(' * 64 + 'x' + ')' * 32,
+    '/*' + '*' * 128,
+    '<' * 64 + 'a=' * 32,
+    "'" + ' ' * 256,
+)
+
+
+def generate_adversarial_code(rng: random.Random, size: int) -> str:
+    """Generate a hostile paste of roughly ```size``` characters by concatenating adversarial patterns."""
+    parts, length = [], 0
+    while length < size:
+        part = rng.choice(ADVERSARIAL_PATTERNS)
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)[:size]
+
+
+def benchmark_settings(limits: bool = False) -> override_settings:
+    """
+    Settings of in-process API benchmarks: requests of the test client are accepted and not inspected.
+        :param limits: Keep the write throttles and the highlight capacity, which otherwise cut the measurements.
+    """
+    overrides = {
+        'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+        'QUERY_INSPECT': {**get_config(), 'ENABLED': False},
+    }
+    if not limits:
+        rates = settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {})
+        overrides['REST_FRAMEWORK'] = {
+            **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {scope: None for scope in rates}}
+        overrides['SNIPPET_HIGHLIGHT'] = {**getattr(settings, 'SNIPPET_HIGHLIGHT', {}), 'MAX_IN_FLIGHT': None}
+    return override_settings(**overrides)
+
+
+def parse_weights(value: str) -> dict:
+    """Parse a 'key:weight,key:weight' option into a dict."""
+    weights = {}
+    for item in filter(None, value.split(',')):
+        key, _, weight = item.partition(':')
+        weights[key.strip()] = float(weight) if weight else 1.0
+    return weights
+
+
+def percentile(values: list, pct: float) -> float:
+    """Return the percentile of values with linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(latencies: list) -> dict:
+    """
+    Summarize latencies measured in seconds.
+        :return: Throughput in requests per second and latency percentiles in milliseconds.
+    """
+    total = sum(latencies)
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / total, 2) if total else 0.0,
+        'mean_ms': round(total / len(latencies) * 1000, 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def measure(func, repeat: int = 3) -> tuple:
+    """
+    Call func ```repeat``` times.
+        :return: Best wall time in seconds and the last return value.
+    """
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def fit_power_law(sizes: list, times: list) -> tuple:
+    """
+    Least squares fit of ```time = a * size ** b``` on a log-log scale.
+        An exponent noticeably above 1 means the cost grows super-linearly with the input.
+        :return: (a, b)
+    """
+    points = [(math.log(size), math.log(max(seconds, 1e-9))) for size, seconds in zip(sizes, times)]
+    if len(points) < 2:
+        return (times[0] / sizes[0] if points else 0.0), 1.0
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    b = sum((x - mean_x) * (y - mean_y) for x, y in points) / variance if variance else 1.0
+    return math.exp(mean_y - b * mean_x), b
+
+
+def compare_with_baseline(current: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compare benchmark results keyed by scenario name.
+        Latency may grow and throughput may drop by ```tolerance``` (a ratio), queries may not grow at all.
+        :return: Human readable regressions.
+    """
+    regressions = []
+    for name, result in current.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if key in base and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f'{name}: {key} {base[key]} -> {result[key]}')
+        if 'throughput_rps' in base and result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f'{name}: throughput_rps {base["throughput_rps"]} -> {result["throughput_rps"]}')
+        if 'queries_per_request' in base and result['queries_per_request'] > base['queries_per_request']:
+            regressions.append(
+                f'{name}: queries_per_request {base["queries_per_request"]} -> {result["queries_per_request"]}')
+    return regressions
+
+
+def load_json(path: str) -> dict:
+    with open(path, encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def dump_json(data: dict, path: str = None) -> str:
+    """Serialize data and write it to path if given."""
+    output = json.dumps(data, indent=2, sort_keys=True)
+    if path:
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write(output + '\n')
+    return output
+
+
+def parse_importtime(output: str) -> list:
+    """
+    Parse the report printed to stderr by ```python -X importtime```.
+        :return: (module, self microseconds, cumulative microseconds, nesting depth) tuples in import order.
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():  # The header line.
+            continue
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def is_holdout(path: str, ratio: int = 5) -> bool:
+    """Whether a corpus file is kept for evaluation, one in ```ratio``` of them, by a hash of the path."""
+    return int(hashlib.sha1(path.encode('utf-8')).hexdigest(), 16) % ratio == 0
+
+
+def find_corpus_files(roots: list, patterns: dict, max_size: int = 1024 * 1024) -> dict:
+    """
+    Collect source files labelled by their name.
+        :param patterns: {language: file name patterns}, e.g. the file patterns of the pygments lexers.
+        :return: {language: sorted paths}. Files matching the patterns of several languages are ambiguous and left out.
+    """
+    extensions, others = {}, []
+    for language, globs in patterns.items():
+        for glob in globs:
+            if glob.startswith('*.') and not any(char in glob[2:] for char in '*?['):
+                extensions.setdefault(glob[1:], set()).add(language)
+            else:
+                others.append((glob, language))
+    files = {language: [] for language in patterns}
+    for root in roots:
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if '.min.' in name:
+                    continue
+                languages = set(extensions.get(os.path.splitext(name)[1], ()))
+                languages.update(language for glob, language in others if fnmatch.fnmatchcase(name, glob))
+                if len(languages) != 1:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    if not os.path.isfile(path) or os.path.islink(path) or os.path.getsize(path) > max_size:
+                        continue
+                except OSError:
+                    continue
+                files[languages.pop()].append(path)
+    return {language: sorted(paths) for language, paths in files.items()}
+
+
+def read_text(path: str, size: int):
+    """Read the first ```size``` characters of a UTF-8 text file, None if it is not one."""
+    try:
+        with open(path, encoding='utf-8') as fp:
+            text = fp.read(size)
+    except (OSError, UnicodeDecodeError):
+        return None
+    return text if '\0' not in text else None
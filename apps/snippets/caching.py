@@ -0,0 +1,134 @@
+"""
+Caching of snippet list queries.
+    Pages and counts are cached under keys which include a global "snippets generation" counter.
+    Any write to snippets (or their owners, whose names are listed) bumps the generation, so every entry
+    is invalidated at once in O(1), without tracking which keys a write affects. Stale entries are never
+    read again and simply expire.
+
+    The counter lives in the default cache, which must be shared by every process writing snippets
+    (see ```CACHES``` in settings), otherwise each process only sees its own writes.
+
+    Misses are read from the replicas, unless the client is pinned to the primary after its own write
+    (see drftutorial/routers.py). Entries filled from either are cached apart, so a writer is never served
+    a page a lagging replica filled without its write. An entry read while a write or a replication
+    ('sync_replica') bumped the generation is not cached, it may hold rows from before the bump.
+
+    Counts are cached with ```cached_count()``` by the paginators of drftutorial/pagination.py.
+"""
+
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from rest_framework.response import Response
+
+from drftutorial.routers import get_replicas, is_pinned
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TIMEOUT': 300,
+}
+
+GENERATION_KEY = 'snippets:generation'
+
+
+def get_config() -> dict:
+    """Return the ```SNIPPET_LIST_CACHE``` setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'SNIPPET_LIST_CACHE', {})}
+
+
+def get_generation() -> int:
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def _incr_generation() -> None:
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:  # Not set yet, or evicted.
+        cache.add(GENERATION_KEY, 1, None)
+
+
+def bump_generation() -> None:
+    """
+    Invalidate every cached list page and count.
+        Bumped again on commit, otherwise a read between the write and the commit
+        would cache the old rows under the new generation.
+    """
+    _incr_generation()
+    transaction.on_commit(_incr_generation)
+
+
+def digest(*parts) -> str:
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _source() -> str:
+    """Database the misses of the current request are read from, entries of both are cached apart."""
+    return 'primary' if is_pinned() or not get_replicas() else 'replicas'
+
+
+def _fill(key: str, value, generation: int, timeout) -> None:
+    """Cache ```value```, unless the generation was bumped while it was read."""
+    if get_generation() == generation:
+        cache.set(key, value, timeout)
+
+
+def cached_count(name: str, counter):
+    """Return the count cached under ```name``` for the current generation, calling ```counter``` on a miss."""
+    config = get_config()
+    if not config['ENABLED']:
+        return counter()
+    generation = get_generation()
+    key = f'snippets:count:{generation}:{_source()}:{name}'
+    count = cache.get(key)
+    if count is None:
+        count = counter()
+        _fill(key, count, generation, config['TIMEOUT'])
+    return count
+
+
+def list_cache_key(request, generation: int = None) -> str:
+    """
+    Key of a list page, from the query parameters normalized into a canonical order.
+        Empty parameters, 'page=1' and the response format do not change the data.
+        The scheme and host are part of it, the data holds absolute URLs.
+    """
+    if generation is None:
+        generation = get_generation()
+    params = sorted(
+        (name, value) for name, values in request.query_params.lists() for value in values
+        if value != '' and name != 'format' and not (name == 'page' and value == '1'))
+    return f'snippets:list:{generation}:{_source()}:{digest(request.build_absolute_uri("/"), request.path, params)}'
+
+
+class CachedListMixin(object):
+    """
+    Cache the data of the 'list' action, paginated or not, until the next snippet write.
+        Only the data is cached, so content negotiation and rendering still happen per request.
+    """
+
+    def list(self, request, *args, **kwargs):
+        config = get_config()
+        if not config['ENABLED']:
+            return super().list(request, *args, **kwargs)
+
+        generation = get_generation()
+        key = list_cache_key(request, generation)
+        data = cache.get(key)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            _fill(key, data, generation, config['TIMEOUT'])
+        return Response(data)
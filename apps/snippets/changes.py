@@ -0,0 +1,122 @@
+"""
+Change feed of snippets, served by ```/snippets/changes/```.
+    Every save and delete of a snippet appends a ```SnippetChange``` in its transaction, numbered by an
+    increasing sequence. Clients keep the sequence of the last change they read as their cursor and ask
+    for the changes after it, so a sync reads the changes only instead of every page of the list.
+
+    With '?wait=<seconds>', a request finding no change waits for one (long polling), reading the changes again
+    every ```POLL_INTERVAL```: one lookup of the primary key index, which sees the writes of every process.
+    A waiting request holds a server thread, so waits are for authenticated clients, ```MAX_WAITING``` at once
+    across the processes sharing the default cache. Beyond that the request gets '429 Too Many Requests'.
+
+    The sequence is assigned on insert. SQLite runs one write transaction at a time, so changes commit in
+    sequence order. Databases running concurrent write transactions may commit a change after a later one,
+    ```SETTLE``` then holds back the changes younger than a few seconds.
+"""
+
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from drftutorial.querycheck import uninspected
+
+from .models import ChangeWatermark, SnippetChange
+
+
+DEFAULTS = {
+    'PAGE_SIZE': 100,
+    'MAX_PAGE_SIZE': 1000,
+    'MAX_WAIT': 25,
+    'POLL_INTERVAL': 0.5,
+    'MAX_WAITING': 2,
+    'RETRY_AFTER': 5,
+    'SETTLE': 0,
+    'RETENTION_DAYS': 30,
+}
+
+
+def get_config() -> dict:
+    """Return the ```SNIPPET_CHANGES``` setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'SNIPPET_CHANGES', {})}
+
+
+def read_changes(since: int, limit: int) -> tuple:
+    """
+    Read the changes after the cursor ```since```, oldest first.
+        :return: (at most ```limit``` changes, True if more follow)
+    """
+    queryset = SnippetChange.objects.filter(pk__gt=since).order_by('pk')
+    settle = get_config()['SETTLE']
+    if settle:
+        queryset = queryset.filter(created__lte=timezone.now() - timedelta(seconds=settle))
+    changes = list(queryset[:limit + 1])
+    return changes[:limit], len(changes) > limit
+
+
+def wait_for_changes(since: int, limit: int, wait: float) -> tuple:
+    """Like ```read_changes()```, waiting up to ```wait``` seconds for a change when there is none yet."""
+    config = get_config()
+    deadline = time.monotonic() + wait
+    changes, more = read_changes(since, limit)
+    while not changes and time.monotonic() < deadline:
+        time.sleep(min(config['POLL_INTERVAL'], max(deadline - time.monotonic(), 0)))
+        # The same read repeated by design, not an N+1 pattern nor part of the query budget of the request.
+        with uninspected():
+            changes, more = read_changes(since, limit)
+    return changes, more
+
+
+class WaitBusy(Exception):
+    """```MAX_WAITING``` requests are waiting for changes already."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f'retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+WAITING_KEY = 'snippets:changes:waiting'
+
+
+@contextmanager
+def wait_slot():
+    """
+    Count the block as a waiting request, up to ```MAX_WAITING``` at once, or raise ```WaitBusy```.
+        The count expires after the longest wait, so slots of a killed process come back. None means no cap.
+    """
+    config = get_config()
+    if config['MAX_WAITING'] is None:
+        yield
+        return
+    timeout = config['MAX_WAIT'] * 2
+    cache.add(WAITING_KEY, 0, timeout)
+    try:
+        waiting = cache.incr(WAITING_KEY)
+    except ValueError:  # Expired in between, counted again from this request.
+        cache.set(WAITING_KEY, 1, timeout)
+        waiting = 1
+    try:
+        if waiting > config['MAX_WAITING']:
+            raise WaitBusy(config['RETRY_AFTER'])
+        yield
+    finally:
+        try:
+            cache.decr(WAITING_KEY)
+        except ValueError:
+            pass
+
+
+def is_expired(since: int) -> bool:
+    """
+    Whether changes after the cursor ```since``` may have been pruned, see the 'prune_changes' command.
+        The client must then list every snippet again ('410 Gone'), and resume from ```latest_sequence()```.
+    """
+    return since < ChangeWatermark.get_sequence()
+
+
+def latest_sequence() -> int:
+    """The sequence of the latest change, a client listing every snippet may resume the feed from it."""
+    return SnippetChange.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
@@ -0,0 +1,191 @@
+"""
+Language detection of snippets saved with 'language=auto'.
+    Pygments' ```guess_lexer()``` imports every lexer and runs each ```analyse_text()```, which takes far
+    too long for a request. The detector looks for cheap hints first:
+        - a shebang ('#!/usr/bin/env python3'),
+        - a Vim or Emacs modeline ('vim: ft=sql', '-*- mode: ruby -*-'),
+        - a file name as the title ('setup.py', 'Makefile').
+    The hints are resolved with the pygments lexer mapping, which lists names and file patterns without
+    importing a lexer. Without a hint, or when it matches several languages (e.g. '*.h'), a token frequency
+    model scores the code: a naive Bayes classifier over identifiers and punctuation, precomputed by the
+    'build_language_model' command. Model scores are cached by the content hash of the code and the version
+    of the model file, so a rebuilt model is used right away.
+"""
+
+import fnmatch
+import json
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+AUTO_LANGUAGE = 'auto'
+
+DEFAULTS = {
+    'MODEL': os.path.join(os.path.dirname(__file__), 'data', 'language_model.json'),
+    # Characters of the code scored by the model.
+    'MAX_SCAN': 16 * 1024,
+    # Fewer model tokens than this is no evidence, the fallback language is used.
+    'MIN_TOKENS': 3,
+    'FALLBACK': 'text',
+    'CACHE_TIMEOUT': 24 * 3600,
+}
+
+# Identifiers (with the sigils of Perl, PHP, shell variables and C preprocessor directives) and punctuation pairs.
+TOKEN_PATTERN = re.compile(r'[A-Za-z_$@#][\w$]*|[^\w\s]{1,2}')
+
+SHEBANG_PATTERN = re.compile(r'#!\s*(?:\S*/)?([\w.+-]+)(?:[ \t]+(?:-\S*[ \t]+)*([\w.+-]+))?')
+MODELINE_PATTERNS = (
+    re.compile(r'(?:vi|vim|ex)(?:[<=>]?\d*)?:.*?\b(?:ft|filetype|syntax)=([\w+-]+)'),
+    re.compile(r'-\*-.*?\bmode:\s*([\w+-]+)'),
+    re.compile(r'-\*-\s*([\w+-]+)\s*-\*-'),
+)
+FILENAME_PATTERN = re.compile(r'[\w.+-]+')
+
+# Interpreters of shebangs which are not an alias of their lexer.
+INTERPRETERS = {
+    'node': 'javascript',
+    'nodejs': 'javascript',
+    'deno': 'typescript',
+    'pwsh': 'powershell',
+    'dash': 'bash',
+    'ash': 'bash',
+}
+
+
+def get_config() -> dict:
+    """Return the ```SNIPPET_DETECTION``` setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'SNIPPET_DETECTION', {})}
+
+
+def tokenize(code: str) -> list:
+    return TOKEN_PATTERN.findall(code)
+
+
+@lru_cache(maxsize=None)
+def _lexer_index() -> tuple:
+    """
+    Index the lexers of the pygments mapping by the first alias, the language of ```LANGUAGE_CHOICES```.
+        :return: ({alias: language}, ((file pattern, language), ...))
+    """
+    from pygments.lexers._mapping import LEXERS
+
+    aliases, patterns = {}, []
+    for _, _, names, filenames, _ in LEXERS.values():
+        if not names:
+            continue
+        for name in names:
+            aliases.setdefault(name.lower(), names[0])
+        patterns.extend((pattern, names[0]) for pattern in filenames)
+    return aliases, tuple(patterns)
+
+
+def language_of_alias(name: str):
+    """Return the language of a lexer alias, interpreter or file type name, or None."""
+    name = name.lower()
+    aliases, _ = _lexer_index()
+    name = INTERPRETERS.get(name, name)
+    return aliases.get(name) or aliases.get(name.rstrip('0123456789.'))
+
+
+def languages_of_filename(filename: str) -> list:
+    """Return the languages whose file patterns match ```filename```, in mapping order."""
+    _, patterns = _lexer_index()
+    matches = []
+    for pattern, language in patterns:
+        if language not in matches and fnmatch.fnmatchcase(filename, pattern):
+            matches.append(language)
+    return matches
+
+
+def hinted_languages(code: str, title: str = '') -> list:
+    """Return the candidate languages named by a shebang, a modeline or a file name as the title."""
+    shebang = SHEBANG_PATTERN.match(code)
+    if shebang:
+        interpreter, argument = shebang.groups()
+        # '#!/usr/bin/env python3' names the interpreter as the argument of env.
+        language = language_of_alias(argument if interpreter == 'env' and argument else interpreter)
+        if language:
+            return [language]
+    lines = code[:1024].splitlines()[:5] + code[-1024:].splitlines()[-5:]
+    for line in lines:
+        for pattern in MODELINE_PATTERNS:
+            match = pattern.search(line)
+            language = match and language_of_alias(match.group(1))
+            if language:
+                return [language]
+    title = title.strip()
+    if FILENAME_PATTERN.fullmatch(title):
+        return languages_of_filename(title)
+    return []
+
+
+def model_version(path: str) -> str:
+    """Identify the model file by its modification time and size, both changed by 'build_language_model'."""
+    stat = os.stat(path)
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+@lru_cache(maxsize=4)
+def load_model(path: str, version: str = None) -> dict:
+    """
+    Load a model written by the 'build_language_model' command.
+        :param version: ```model_version()``` of the file, a new version is loaded again.
+        :return: {language: (log probability of each token, log probability of an unknown token)}
+    """
+    with open(path, encoding='utf-8') as fp:
+        data = json.load(fp)
+    return {language: (entry['tokens'], entry['unknown']) for language, entry in data['languages'].items()}
+
+
+def score_languages(code: str) -> dict:
+    """
+    Score the code with the token frequency model, cached by content hash and model version.
+        :return: {language: log likelihood per token}, empty without enough tokens.
+    """
+    from .models import blob_digest
+
+    config = get_config()
+    code = code[:config['MAX_SCAN']]
+    version = model_version(config['MODEL'])
+    key = f'snippets:language:{version}:{blob_digest(code)}'
+    scores = cache.get(key)
+    if scores is None:
+        scores = _score(code, load_model(config['MODEL'], version), config['MIN_TOKENS'])
+        cache.set(key, scores, config['CACHE_TIMEOUT'])
+    return scores
+
+
+def _score(code: str, model: dict, min_tokens: int) -> dict:
+    counts = Counter(tokenize(code))
+    total = sum(counts.values())
+    if total < min_tokens:
+        return {}
+    scores = {}
+    for language, (probabilities, unknown) in model.items():
+        log_likelihood = sum(probabilities.get(token, unknown) * count for token, count in counts.items())
+        scores[language] = log_likelihood / total
+    return scores
+
+
+def detect_language(code: str, title: str = '') -> str:
+    """
+    Detect the language of the code, an alias of ```LANGUAGE_CHOICES```.
+        :param title: Title of the snippet, a hint when it is a file name.
+        :return: The language, the configured fallback ('text') when there is no evidence.
+    """
+    candidates = hinted_languages(code, title)
+    if len(candidates) == 1:
+        return candidates[0]
+    scores = score_languages(code)
+    if candidates:
+        scores = {language: score for language, score in scores.items() if language in candidates}
+        if not scores:
+            return candidates[0]
+    if not scores:
+        return get_config()['FALLBACK']
+    return max(scores, key=scores.get)
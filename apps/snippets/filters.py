@@ -0,0 +1,79 @@
+"""
+Filters of snippet lists, from query parameters.
+    language=<alias>, style=<name>         Exact language alias and style name.
+    owner=<username>                       Snippets of one user.
+    created_after=, created_before=        ISO 8601 date or datetime, after is inclusive and before exclusive.
+    has_title=true|false                   Titled or untitled snippets.
+
+    Every combination is served by an index of ```Snippet.Meta.indexes```: the most selective filter picks the index
+    and its second column, 'created', keeps the rows in the default ordering. The other filters are checked on
+    the rows read from it.
+"""
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from rest_framework.exceptions import ValidationError
+
+from .models import LANGUAGE_CHOICES, STYLE_CHOICES
+
+
+FILTER_PARAMS = ('language', 'style', 'owner', 'created_after', 'created_before', 'has_title')
+
+BOOLEANS = {'true': True, '1': True, 'yes': True, 'false': False, '0': False, 'no': False}
+
+
+def parse_moment(value: str):
+    """Parse an ISO 8601 datetime, or a date as its midnight, into an aware datetime. None if invalid."""
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            date = parse_date(value)
+            if date is None:
+                return None
+            moment = timezone.datetime.combine(date, timezone.datetime.min.time())
+    except ValueError:  # Well formatted but out of range, e.g. '2022-02-30'.
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_snippets(queryset, params):
+    """
+    Filter a snippet queryset by the supported ```params```, ignoring others and empty values.
+        Raise ```ValidationError``` (400) on invalid values, listing every invalid parameter.
+    """
+    values = {name: params.get(name) for name in FILTER_PARAMS if params.get(name)}
+    errors = {}
+
+    if 'language' in values:
+        if values['language'] not in dict(LANGUAGE_CHOICES):
+            errors['language'] = [f'Unknown language "{values["language"]}".']
+        queryset = queryset.filter(language=values['language'])
+    if 'style' in values:
+        if values['style'] not in dict(STYLE_CHOICES):
+            errors['style'] = [f'Unknown style "{values["style"]}".']
+        queryset = queryset.filter(style=values['style'])
+    if 'owner' in values:
+        # Joined on the unique username, the owner row is found first and then (owner, created) is searched.
+        queryset = queryset.filter(owner__username=values['owner'])
+    for name, lookup in (('created_after', 'created__gte'), ('created_before', 'created__lt')):
+        if name in values:
+            moment = parse_moment(values[name])
+            if moment is None:
+                errors[name] = [f'Invalid date "{values[name]}", use ISO 8601.']
+                continue
+            queryset = queryset.filter(**{lookup: moment})
+    if 'has_title' in values:
+        has_title = BOOLEANS.get(values['has_title'].lower())
+        if has_title is None:
+            errors['has_title'] = ['Use "true" or "false".']
+        elif has_title:
+            queryset = queryset.exclude(title='')
+        else:
+            queryset = queryset.filter(title='')
+
+    if errors:
+        raise ValidationError(errors)
+    return queryset
@@ -0,0 +1,535 @@
+"""
+Highlighting of snippets app.
+    Render code into a full HTML document using the 'pygments' library.
+
+    A huge or adversarial paste can keep a lexer busy for seconds, so ```highlight_snippet()``` enforces
+    per-language limits of code size and wall time. The highlighter runs in a pool of worker processes
+    which are killed on timeout, and the snippet falls back to plain escaped ```<pre>``` output.
+
+    Pygments lexers and formatters are imported on first use, the models import this module at startup.
+    Instances are memoized: building an ```HtmlFormatter``` compiles its whole style into CSS class maps,
+    and lexers are stateless between calls, so both are safely shared between threads.
+
+    The lexer output is kept as a packed token stream (see ```pack_tokens()```), so that rendering the same
+    code in another style or with line numbers is a formatter pass only, without lexing again.
+    The same tokens render to the other formats of ```RENDER_FORMATS``` (see ```render_format()```).
+
+    Documents of large code are written to a file given as ```path``` instead of being returned, piece by piece
+    as the formatter produces them, and stored from the file in chunks (see ```BlobManager.intern_file()```).
+"""
+
+import copy
+import functools
+import html
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import tempfile
+import threading
+import zlib
+from array import array
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_CODE_SIZE': 256 * 1024,
+    'TIMEOUT': 5.0,
+    'WORKERS': 2,
+    'MAX_IN_FLIGHT': 8,
+    'RETRY_AFTER': 1,
+    'LANGUAGES': {},
+    # Code of this many characters or more is highlighted into a file, see ```spool_path()```.
+    'STREAM_THRESHOLD': 64 * 1024,
+    # Characters of the stored documents read or written at once.
+    'STREAM_CHUNK_SIZE': 64 * 1024,
+}
+
+# Bounds of the lexer and formatter memos, there are about 600 lexers and 50 styles.
+LEXER_CACHE_SIZE = 128
+FORMATTER_CACHE_SIZE = 128
+
+# Output formats of '/snippets/<pk>/render/?fmt=', names of pygments formatters, and their content types.
+RENDER_FORMATS = {
+    'html': 'text/html; charset=utf-8',
+    'terminal256': 'text/plain; charset=utf-8',
+    'latex': 'text/x-tex; charset=utf-8',
+    'svg': 'image/svg+xml; charset=utf-8',
+}
+
+PLAIN_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+  <title>{title}</title>
+  <meta http-equiv="content-type" content="text/html; charset=utf-8">
+</head>
+<body>
+{heading}<pre>{code}</pre>
+</body>
+</html>
+'''
+
+
+@functools.lru_cache(maxsize=LEXER_CACHE_SIZE)
+def get_lexer(language: str):
+    """Return the shared lexer instance of a language alias."""
+    from pygments.lexers import get_lexer_by_name
+
+    return get_lexer_by_name(language)
+
+
+@functools.lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def get_formatter(style: str, linenos: bool = False, full: bool = True):
+    """
+    Return the shared formatter prototype of a style.
+        Copy it before setting per-document options such as the title.
+    """
+    from pygments.formatters.html import HtmlFormatter
+
+    return HtmlFormatter(style=style, linenos='table' if linenos else False, full=full)
+
+
+@functools.lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def get_format_formatter(fmt: str, style: str, linenos: bool = False):
+    """Return the shared formatter prototype of a format of ```RENDER_FORMATS``` other than HTML."""
+    from pygments.formatters import get_formatter_by_name
+
+    options = {'full': True} if fmt == 'latex' else {}
+    return get_formatter_by_name(fmt, style=style, linenos=bool(linenos), **options)
+
+
+def lex(code: str, language: str) -> list:
+    """Return the (token type, text) pairs of the code, as produced by the lexer of the language."""
+    return list(get_lexer(language).get_tokens(code))
+
+
+def render_tokens(tokens, style: str, linenos: bool = False, title: str = '', path: str = None):
+    """
+    Format lexed tokens into a full HTML document, see ```render_highlighted()```.
+        :param path: File written with the document, which is then not returned.
+    """
+    from pygments import format
+
+    formatter = copy.copy(get_formatter(style, bool(linenos)))
+    formatter.title = title
+    if path is None:
+        return format(tokens, formatter)
+    with open(path, 'w', encoding='utf-8', newline='') as fp:
+        format(tokens, formatter, fp)
+    return None
+
+
+def render_format(tokens, fmt: str, style: str, linenos: bool = False, title: str = '') -> str:
+    """Format lexed tokens into a document of a format of ```RENDER_FORMATS```, titled if the format has titles."""
+    from pygments import format
+
+    if fmt == 'html':
+        return render_tokens(tokens, style, linenos, title)
+    formatter = copy.copy(get_format_formatter(fmt, style, bool(linenos)))
+    if fmt == 'latex':
+        from pygments.formatters.latex import escape_tex
+
+        # Pygments writes the title of a LaTeX document as is.
+        title = escape_tex(title, formatter.commandprefix)
+    formatter.title = title
+    return format(tokens, formatter)
+
+
+def render_plain_format(code: str, fmt: str, title: str = '') -> str:
+    """Like ```render_plain()``` in any format of ```RENDER_FORMATS```, for code which is not highlighted."""
+    from pygments.token import Text
+
+    if fmt == 'html':
+        return render_plain(code, title)
+    return render_format([(Text, code)], fmt, 'default', False, title)
+
+
+def render_highlighted(code: str, language: str, style: str, linenos: bool = False, title: str = '') -> str:
+    """
+    Create a highlighted HTML representation of the code.
+        :param code: Source code to highlight.
+        :param language: Alias of the pygments lexer.
+        :param style: Name of the pygments style.
+        :param linenos: Render line numbers as a table if True.
+        :param title: Title of the HTML document.
+        :return: Full HTML document.
+    """
+    return render_tokens(lex(code, language), style, linenos, title)
+
+
+def pack_tokens(code: str, tokens) -> bytes:
+    """
+    Pack lexed tokens into a compact stream: a header listing the distinct token types, then two arrays of
+    the type index (16 bits) and end offset (32 bits) of each token, compressed with zlib.
+        The token texts are slices of the code, the lexer only strips leading and trailing newlines, ensures
+        a final one and normalizes line endings. The lexed text is stored as well in the rare other cases.
+        The pygments version is recorded, a stream lexed by another version is stale.
+    """
+    from pygments import __version__
+
+    types, ids, ends = {}, array('H'), array('I')
+    parts, offset = [], 0
+    for token_type, value in tokens:
+        if not value:
+            continue
+        ids.append(types.setdefault(token_type, len(types)))
+        offset += len(value)
+        ends.append(offset)
+        parts.append(value)
+    text = ''.join(parts)
+    header = {'pygments': __version__, 'types': [str(token_type) for token_type in types]}
+    if text == code + '\n':
+        header['text'] = 'code+nl'
+    elif text != code:
+        header['text'] = text
+    if sys.byteorder == 'big':
+        ids.byteswap()
+        ends.byteswap()
+    header = json.dumps(header).encode('utf-8')
+    return zlib.compress(len(header).to_bytes(4, 'little') + header + ids.tobytes() + ends.tobytes())
+
+
+def unpack_tokens(data: bytes, code: str):
+    """Return the (token type, text) pairs packed by ```pack_tokens()```, or None if the stream is stale."""
+    from pygments import __version__
+    from pygments.token import string_to_tokentype
+
+    data = zlib.decompress(data)
+    size = int.from_bytes(data[:4], 'little')
+    header = json.loads(data[4:4 + size].decode('utf-8'))
+    if header['pygments'] != __version__:
+        return None
+    body = data[4 + size:]
+    count = len(body) // 6
+    ids, ends = array('H'), array('I')
+    ids.frombytes(body[:count * 2])
+    ends.frombytes(body[count * 2:])
+    if sys.byteorder == 'big':
+        ids.byteswap()
+        ends.byteswap()
+    text = header.get('text', 'code')
+    text = code if text == 'code' else code + '\n' if text == 'code+nl' else text
+    types = [string_to_tokentype(name) for name in header['types']]
+    tokens, start = [], 0
+    for index, end in zip(ids, ends):
+        tokens.append((types[index], text[start:end]))
+        start = end
+    return tokens
+
+
+def lex_and_render(code: str, language: str, style: str, linenos: bool = False, title: str = '',
+                   path: str = None) -> tuple:
+    """
+    Like ```render_highlighted()```, also returning the packed token stream of the code.
+        With ```style=None``` the code is only lexed, and the document is None.
+    """
+    tokens = lex(code, language)
+    highlighted = None if style is None else render_tokens(tokens, style, linenos, title, path)
+    return highlighted, pack_tokens(code, tokens)
+
+
+def preload(languages: list, styles: list) -> None:
+    """
+    Fill the lexer and formatter memos with the given languages and styles ahead of the first request.
+        Lexer classes compile their token tables on first instantiation, formatters import their style module.
+        Unknown names are skipped.
+    """
+    from pygments.util import ClassNotFound
+
+    for language in languages:
+        try:
+            get_lexer(language)
+        except ClassNotFound:
+            logger.warning('Skip preloading unknown language %s.', language)
+    for style in styles:
+        try:
+            get_formatter(style)
+        except ClassNotFound:
+            logger.warning('Skip preloading unknown style %s.', style)
+
+
+def render_plain(code: str, title: str = '', path: str = None):
+    """
+    Create an escaped, unhighlighted HTML document used when highlighting is not possible.
+        :param path: File written with the document, the code escaped a chunk at a time, which is then not returned.
+    """
+    head, tail = PLAIN_TEMPLATE.split('{code}')
+    head = head.format(title=html.escape(title), heading=f'<h2>{html.escape(title)}</h2>\n' if title else '')
+    if path is None:
+        return head + html.escape(code) + tail
+    size = get_config()['STREAM_CHUNK_SIZE']
+    with open(path, 'w', encoding='utf-8', newline='') as fp:
+        fp.write(head)
+        for start in range(0, len(code), size):
+            fp.write(html.escape(code[start:start + size]))
+        fp.write(tail)
+    return None
+
+
+@contextmanager
+def spool_path():
+    """Yield the path of a temporary file for a document written by ```path=```, removed on exit."""
+    fd, path = tempfile.mkstemp(prefix='highlight-', suffix='.html')
+    os.close(fd)
+    try:
+        yield path
+    finally:
+        os.remove(path)
+
+
+def get_config() -> dict:
+    """Return the ```SNIPPET_HIGHLIGHT``` setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'SNIPPET_HIGHLIGHT', {})}
+
+
+def get_limits(language: str) -> tuple:
+    """
+    Read the ```SNIPPET_HIGHLIGHT``` setting.
+        :return: (max code size in characters, timeout in seconds or None) of the language.
+    """
+    config = get_config()
+    limits = {**config, **config['LANGUAGES'].get(language, {})}
+    return limits['MAX_CODE_SIZE'], limits['TIMEOUT']
+
+
+def highlight_snippet(code: str, language: str, style: str, linenos: bool = False, title: str = '') -> tuple:
+    """
+    Highlight the code within the configured limits.
+        :return: (HTML document, True if it fell back to plain output)
+    """
+    highlighted, degraded, _ = highlight_with_tokens(code, language, style, linenos, title)
+    return highlighted, degraded
+
+
+def highlight_with_tokens(code: str, language: str, style: str, linenos: bool = False, title: str = '',
+                          path: str = None) -> tuple:
+    """
+    Like ```highlight_snippet()```, also returning the packed token stream of the code.
+        :param path: File written with the document, which is then None in the result. A worker process
+            writes it directly, so the document is never sent back through the pipe.
+        :return: (HTML document, True if it fell back to plain output, token stream or None if it did)
+    """
+    max_size, timeout = get_limits(language)
+    if max_size is not None and len(code) > max_size:
+        logger.warning('Skip highlighting %s code of %d characters (limit %d).', language, len(code), max_size)
+        return render_plain(code, title, path), True, None
+    if timeout is None:
+        highlighted, stream = lex_and_render(code, language, style, linenos, title, path)
+        return highlighted, False, stream
+
+    try:
+        highlighted, stream = worker_pool.run((code, language, style, linenos, title, path), timeout)
+    except HighlightAborted as exc:
+        logger.warning('Highlighting %s code of %d characters aborted: %s', language, len(code), exc)
+        return render_plain(code, title, path), True, None
+    return highlighted, False, stream
+
+
+def lex_with_limits(code: str, language: str):
+    """
+    Lex the code within the configured limits, like ```highlight_with_tokens()``` without formatting a document.
+        :return: The packed token stream, None if the code is too large or lexing timed out.
+    """
+    max_size, timeout = get_limits(language)
+    if max_size is not None and len(code) > max_size:
+        return None
+    if timeout is None:
+        return lex_and_render(code, language, None)[1]
+    try:
+        return worker_pool.run((code, language, None), timeout)[1]
+    except HighlightAborted as exc:
+        logger.warning('Lexing %s code of %d characters aborted: %s', language, len(code), exc)
+        return None
+
+
+class HighlightAborted(Exception):
+    """The highlighter process timed out or died, and was discarded."""
+
+
+class HighlightBusy(Exception):
+    """Too much highlighting is running in this process already."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f'retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+@contextmanager
+def highlight_slot():
+    """
+    Count the block as running highlight work, up to ```MAX_IN_FLIGHT``` at once in this process.
+        Beyond that ```HighlightBusy``` is raised right away instead of waiting for a worker. None means no cap.
+    """
+    global _in_flight
+    config = get_config()
+    with _in_flight_lock:
+        if config['MAX_IN_FLIGHT'] is not None and _in_flight >= config['MAX_IN_FLIGHT']:
+            raise HighlightBusy(config['RETRY_AFTER'])
+        _in_flight += 1
+    try:
+        yield
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+
+
+def _raise_timeout(signum, frame):
+    raise HighlightAborted('timed out')
+
+
+def highlight_rows(rows: list) -> list:
+    """
+    Highlight many snippets in the current process, used by ```ProcessPoolExecutor``` jobs.
+        The time limit is enforced with a real-time interval timer, so it must run in the main thread
+        of a worker process on a platform providing ```signal.setitimer()```.
+        :param rows: (pk, code, language, style, linenos, title, max_size, timeout) tuples.
+        :return: (pk, HTML document, degraded, token stream or None) tuples.
+    """
+    use_timer = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+    if use_timer:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    results = []
+    try:
+        for pk, code, language, style, linenos, title, max_size, timeout in rows:
+            if max_size is not None and len(code) > max_size:
+                results.append((pk, render_plain(code, title), True, None))
+                continue
+            try:
+                if use_timer and timeout:
+                    signal.setitimer(signal.ITIMER_REAL, timeout)
+                highlighted, stream = lex_and_render(code, language, style, linenos, title)
+                result = (pk, highlighted, False, stream)
+            except HighlightAborted:
+                result = (pk, render_plain(code, title), True, None)
+            finally:
+                if use_timer:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            results.append(result)
+    finally:
+        if use_timer:
+            signal.signal(signal.SIGALRM, previous)
+    return results
+
+
+def _worker_main(conn) -> None:
+    """Loop of a worker process: receive render arguments and send back the HTML and token stream."""
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, lex_and_render(*args)))
+        except Exception as exc:
+            conn.send((False, exc))
+
+
+class _Worker(object):
+    """A highlighter process connected by a pipe."""
+
+    def __init__(self) -> None:
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def run(self, args: tuple, timeout: float) -> tuple:
+        try:
+            self.conn.send(args)
+            if not self.conn.poll(timeout):
+                raise HighlightAborted(f'timed out after {timeout}s')
+            ok, result = self.conn.recv()
+        except (EOFError, OSError) as exc:
+            # The worker died, e.g. killed by the kernel for running out of memory.
+            raise HighlightAborted(f'worker died: {exc!r}')
+        if not ok:
+            raise result
+        return result
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool(object):
+    """
+    A bounded pool of highlighter processes.
+        Unlike ```multiprocessing.Pool```, a single stuck worker can be killed and replaced
+        without disturbing the jobs running on the other workers.
+    """
+
+    def __init__(self) -> None:
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+
+    def _acquire(self) -> _Worker:
+        limit = get_config()['WORKERS']
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                if self._size < limit:
+                    self._size += 1
+                    break
+            try:
+                return self._idle.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        try:
+            return _Worker()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+            raise
+
+    def prestart(self) -> None:
+        """Start idle workers up to the configured limit, e.g. right after a server forked this process."""
+        limit = get_config()['WORKERS']
+        while True:
+            with self._lock:
+                if self._size >= limit:
+                    return
+                self._size += 1
+            try:
+                worker = _Worker()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+            self._idle.put(worker)
+
+    def run(self, args: tuple, timeout: float) -> tuple:
+        worker = self._acquire()
+        try:
+            result = worker.run(args, timeout)
+        except HighlightAborted:
+            self._discard(worker)
+            raise
+        except Exception:
+            self._idle.put(worker)
+            raise
+        self._idle.put(worker)
+        return result
+
+    def _discard(self, worker: _Worker) -> None:
+        worker.kill()
+        with self._lock:
+            self._size -= 1
+
+
+worker_pool = WorkerPool()
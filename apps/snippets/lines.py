@@ -0,0 +1,166 @@
+"""
+Line ranges of highlighted documents, served by ```/snippets/<pk>/highlight/?lines=start-end```.
+    A highlighted document holds its lines in ```<pre>``` blocks: one, or two with line numbers (a table of
+    the numbers and the code). The line index of a document records where each block and each of its lines
+    starts, so a range of lines is the head of the document, the lines of each block and the text between
+    them, read as substrings of the stored document without highlighting again.
+
+    The index is packed as little-endian 32-bit integers at fixed positions, so the entries of a range are
+    substrings of the index too, and a viewport costs the same on a document of any length:
+        - version, number of blocks, number of lines,
+        - start and end of the content of 2 blocks (0 for a missing second block),
+        - the start of each line in each block, line by line.
+    Offsets are in characters, as the substrings of text columns. Pygments closes the spans of its tokens at
+    the end of each line; documents leaving a span open across lines are not indexed, and are sliced
+    in memory with the spans reopened and closed around the range (see ```slice_lines()```).
+"""
+
+import re
+import struct
+
+VERSION = 1
+MAX_BLOCKS = 2
+# Larger line numbers are clamped, they are beyond any document.
+MAX_LINE = 2 ** 31 - 1
+HEADER = struct.Struct('<7I')
+ENTRY = struct.Struct('<2I')
+
+_PRE = re.compile(r'<pre\b[^>]*>')
+_TAG = re.compile(r'<(/?)span\b[^>]*>')
+
+
+class LineRangeError(ValueError):
+    pass
+
+
+def parse_range(value: str) -> tuple:
+    """Parse 'start-end' or 'line', 1-based and inclusive, into (start, end)."""
+    match = re.fullmatch(r'([0-9]+)(?:-([0-9]+))?', value.strip())
+    if not match:
+        raise LineRangeError('Expected "start-end", e.g. "1-100".')
+    start = min(int(match.group(1)), MAX_LINE)
+    end = min(int(match.group(2) or match.group(1)), MAX_LINE)
+    if start < 1 or end < start:
+        raise LineRangeError('Lines are numbered from 1, and the end may not precede the start.')
+    return start, end
+
+
+def split_lines(html: str):
+    """Yield the lines of a document with their newline, split on '\\n' only as files opened with newline='\\n'."""
+    position = 0
+    while position < len(html):
+        newline = html.find('\n', position)
+        end = len(html) if newline < 0 else newline + 1
+        yield html[position:end]
+        position = end
+
+
+def find_blocks(html) -> list:
+    """
+    Find the line blocks of a highlighted document, given as a string or an iterable of its lines (a file).
+        Lines are scanned one at a time, a document read from a file is never held whole.
+        :return: (content start, content end, [line starts], [open span tags at each line start]) per block.
+    """
+    blocks, block, offset = [], None, 0
+    for line in split_lines(html) if isinstance(html, str) else html:
+        position = 0
+        while True:
+            if block is None:
+                match = _PRE.search(line, position)
+                if not match:
+                    break
+                position = match.end()
+                block = (offset + position, [offset + position], [()], [])
+            start, starts, stacks, stack = block
+            end = line.find('</pre>', position)
+            for tag in _TAG.finditer(line, position, len(line.rstrip('\n')) if end < 0 else end):
+                if tag.group(1):
+                    if stack:
+                        stack.pop()
+                else:
+                    stack.append(tag.group(0))
+            if end < 0:
+                if line.endswith('\n'):
+                    starts.append(offset + len(line))
+                    stacks.append(tuple(stack))
+                break
+            if starts[-1] == offset + end:  # A final newline ends the last line, it does not start one.
+                starts.pop()
+                stacks.pop()
+            blocks.append((start, offset + end, starts, stacks))
+            block, position = None, end + len('</pre>')
+        offset += len(line)
+    return blocks
+
+
+def pack_line_index(html) -> bytes:
+    """
+    Return the line index of a highlighted document, given as to ```find_blocks()```, empty if it can not be
+    sliced by substrings:
+    no block, more than ```MAX_BLOCKS```, blocks of different line counts or spans open across lines.
+    """
+    blocks = find_blocks(html)
+    if not blocks or len(blocks) > MAX_BLOCKS or len({len(starts) for _, _, starts, _ in blocks}) != 1:
+        return b''
+    if any(stack for _, _, _, stacks in blocks for stack in stacks):
+        return b''
+    bounds = [value for start, end, _, _ in blocks for value in (start, end)]
+    bounds += [0] * (2 * MAX_BLOCKS - len(bounds))
+    lines = len(blocks[0][2])
+    starts = [block[2] for block in blocks] + [[0] * lines] * (MAX_BLOCKS - len(blocks))
+    return HEADER.pack(VERSION, len(blocks), lines, *bounds) + b''.join(
+        ENTRY.pack(*entry) for entry in zip(*starts))
+
+
+def entry_position(line: int) -> int:
+    """1-based position in the index of the entry of a 0-based line, as taken by ```Substr()```."""
+    return HEADER.size + ENTRY.size * line + 1
+
+
+def range_pieces(header: bytes, first: bytes, last: bytes, start: int, end: int):
+    """
+    Locate a line range in a document from substrings of its index.
+        :param header: The header, ```HEADER.size``` bytes from the start of the index.
+        :param first: The entry of the first line of the range, empty beyond the last line.
+        :param last: The entry of the line following the range, empty beyond the last line.
+        :return: (number of lines, [(0-based offset, length or None up to the end)]) of the pieces
+            of the document to join, or None if the index is missing or of another version.
+    """
+    if not header or len(header) < HEADER.size:
+        return None
+    version, count, lines, *bounds = HEADER.unpack(header)
+    if version != VERSION:
+        return None
+    firsts = ENTRY.unpack(first) if first else bounds[1:2 * count:2]
+    lasts = ENTRY.unpack(last) if last and end < lines else bounds[1:2 * count:2]
+    pieces, position = [], 0
+    for block in range(count):
+        content_start, content_end = bounds[2 * block], bounds[2 * block + 1]
+        pieces.append((position, content_start - position))
+        pieces.append((firsts[block], max(lasts[block] - firsts[block], 0)))
+        position = content_end
+    pieces.append((position, None))
+    return lines, pieces
+
+
+def slice_lines(html: str, start: int, end: int) -> tuple:
+    """
+    Slice a line range of a document in memory, reopening the spans open at its start and closing those
+    left open at its end.
+        :return: (number of lines, document of the range)
+    """
+    blocks = find_blocks(html)
+    if not blocks:
+        return 0, html
+    parts, position, lines = [], 0, max(len(block[2]) for block in blocks)
+    for content_start, content_end, starts, stacks in blocks:
+        parts.append(html[position:content_start])
+        if start <= len(starts):
+            first = starts[start - 1]
+            last = starts[end] if end < len(starts) else content_end
+            opened = stacks[start - 1]
+            closing = stacks[end] if end < len(starts) else ()
+            parts.append(''.join(opened) + html[first:last] + '</span>' * len(closing))
+        position = content_end
+    parts.append(html[position:])
+    return lines, ''.join(parts)
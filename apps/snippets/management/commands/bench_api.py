@@ -0,0 +1,92 @@
+"""
+Benchmark the REST API in-process with the Django test client.
+"""
+
+import platform
+import random
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from apps.snippets.benchmarks import benchmark_settings, compare_with_baseline, dump_json, load_json, summarize
+from apps.snippets.models import Snippet
+from drftutorial.querycheck import QueryInspector
+
+
+class Command(BaseCommand):
+    help = 'Measure throughput, latency percentiles and queries per request of the API endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per endpoint.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed used to pick snippets and pages.')
+        parser.add_argument('--output', help='Write the JSON report to this path.')
+        parser.add_argument('--baseline', help='Compare against a stored JSON report and fail on regressions.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed latency/throughput regression ratio against the baseline.')
+
+    def handle(self, *args, **options):
+        pks = list(Snippet.objects.order_by('pk').values_list('pk', flat=True))
+        user = User.objects.filter(is_active=True).order_by('pk').first()
+        if not pks or user is None:
+            raise CommandError('No snippets to benchmark. Run "manage.py seed_snippets" first.')
+
+        rng = random.Random(options['seed'])
+        pages = max(1, len(pks) // settings.REST_FRAMEWORK.get('PAGE_SIZE', 10))
+        json, html = 'application/json', 'text/html'
+        scenarios = {
+            'snippet-list': (lambda: f'/snippets/?page={rng.randint(1, pages)}', json),
+            'snippet-detail': (lambda: f'/snippets/{rng.choice(pks)}/', json),
+            'snippet-highlight': (lambda: f'/snippets/{rng.choice(pks)}/highlight/', html),
+            'user-snippet-list': (lambda: '/user-snippets/', json),
+            'quickstart-user-list': (lambda: '/quickstart/users/', json),
+            'quickstart-group-list': (lambda: '/quickstart/groups/', json),
+        }
+
+        # The query inspector middleware would add its own overhead to every request.
+        with benchmark_settings():
+            client = Client()
+            client.force_login(user)
+            results = {name: self._run(client, url, accept, options) for name, (url, accept) in scenarios.items()}
+
+        report = {
+            'meta': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'debug': settings.DEBUG,
+                'snippets': len(pks),
+                'requests': options['requests'],
+            },
+            'endpoints': results,
+        }
+        self.stdout.write(dump_json(report, options['output']))
+
+        if options['baseline']:
+            regressions = compare_with_baseline(
+                results, load_json(options['baseline'])['endpoints'], options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+            self.stderr.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    @staticmethod
+    def _run(client: Client, url, accept: str, options: dict) -> dict:
+        for _ in range(options['warmup']):
+            client.get(url(), HTTP_ACCEPT=accept)
+
+        latencies = []
+        queries = 0
+        for _ in range(options['requests']):
+            inspector = QueryInspector(n_plus_one_threshold=0, slow_query_ms=0)
+            with inspector.watch():
+                start = time.perf_counter()
+                response = client.get(url(), HTTP_ACCEPT=accept)
+                latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(f'{response.status_code} response from {response.request["PATH_INFO"]}')
+            queries += len(inspector.queries)
+
+        return {**summarize(latencies), 'queries_per_request': round(queries / len(latencies), 2)}
@@ -0,0 +1,122 @@
+"""
+Benchmark the snippet read endpoints served by WSGI sync views against ASGI coroutine views.
+"""
+
+import asyncio
+import random
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import include, path
+
+from apps.snippets.benchmarks import benchmark_settings, dump_json, summarize
+from apps.snippets.models import Snippet
+from apps.snippets.urls import async_urlpatterns
+
+
+class Command(BaseCommand):
+    help = ('Send the same mix of snippet reads through the WSGI handler from a fixed number of threads and '
+            'through the ASGI handler from one event loop, and report throughput and latency percentiles.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Measured requests per mode.')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at once.')
+        parser.add_argument('--wsgi-threads', type=int, default=4,
+                            help='Threads of the WSGI worker, i.e. how many of the in-flight requests it serves.')
+        parser.add_argument('--client-delay-ms', type=float, default=0.0,
+                            help='Time a slow client takes to receive each response. A sync worker thread is '
+                                 'blocked meanwhile, the event loop serves other requests.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed used to pick snippets and pages.')
+        parser.add_argument('--output', help='Write the JSON report to this path.')
+
+    def handle(self, *args, **options):
+        pks = list(Snippet.objects.order_by('pk').values_list('pk', flat=True))
+        user = User.objects.filter(is_active=True).order_by('pk').first()
+        if not pks or user is None:
+            raise CommandError('No snippets to benchmark. Run "manage.py seed_snippets" first.')
+
+        rng = random.Random(options['seed'])
+        pages = max(1, len(pks) // settings.REST_FRAMEWORK.get('PAGE_SIZE', 10))
+        requests = [
+            rng.choice((
+                (f'/snippets/?page={rng.randint(1, pages)}', 'application/json'),
+                (f'/snippets/{rng.choice(pks)}/', 'application/json'),
+                (f'/snippets/{rng.choice(pks)}/highlight/', 'text/html'),
+            ))
+            for _ in range(options['requests'])
+        ]
+
+        # The project's routes with the coroutine views in front, as with SNIPPETS_ASYNC_READS.
+        asgi_urlconf = types.ModuleType('asgi_urlconf')
+        asgi_urlconf.urlpatterns = [path('', include(async_urlpatterns)), path('', include(settings.ROOT_URLCONF))]
+
+        report = {'meta': {'requests': options['requests'], 'concurrency': options['concurrency'],
+                           'wsgi_threads': options['wsgi_threads'], 'client_delay_ms': options['client_delay_ms']}}
+        with benchmark_settings():
+            report['wsgi'] = self._run_wsgi(user, requests, options)
+            with override_settings(ROOT_URLCONF=asgi_urlconf):
+                report['asgi'] = asyncio.run(self._run_asgi(user, requests, options))
+        connections.close_all()
+
+        for mode in ('wsgi', 'asgi'):
+            self.stderr.write(f'{mode}: {report[mode]["throughput_rps"]} req/s, p95 {report[mode]["p95_ms"]}ms')
+        self.stdout.write(dump_json(report, options['output']))
+
+    @staticmethod
+    def _result(latencies: list, elapsed: float, errors: list) -> dict:
+        if errors:
+            raise CommandError(f'{len(errors)} failed requests, e.g. {errors[0]}')
+        return {**summarize(latencies), 'throughput_rps': round(len(latencies) / elapsed, 2)}
+
+    def _run_wsgi(self, user: User, requests: list, options: dict) -> dict:
+        latencies, errors = [], []
+        pending = iter(requests)
+        delay = options['client_delay_ms'] / 1000
+
+        def worker() -> None:
+            client = Client()
+            client.force_login(user)
+            try:
+                # next() on a shared iterator is atomic, so threads never send the same request twice.
+                for url, accept in pending:
+                    start = time.perf_counter()
+                    response = client.get(url, HTTP_ACCEPT=accept)
+                    time.sleep(delay)
+                    if response.status_code != 200:
+                        errors.append(f'{response.status_code} from {url}')
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['wsgi_threads']) as executor:
+            for future in [executor.submit(worker) for _ in range(options['wsgi_threads'])]:
+                future.result()
+        return self._result(latencies, time.perf_counter() - start, errors)
+
+    async def _run_asgi(self, user: User, requests: list, options: dict) -> dict:
+        latencies, errors = [], []
+        client = AsyncClient()
+        # force_login() uses the ORM, which must not run on the event loop.
+        await asyncio.get_running_loop().run_in_executor(None, client.force_login, user)
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        delay = options['client_delay_ms'] / 1000
+
+        async def send(url: str, accept: str) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url, HTTP_ACCEPT=accept)
+                await asyncio.sleep(delay)
+                if response.status_code != 200:
+                    errors.append(f'{response.status_code} from {url}')
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(url, accept) for url, accept in requests))
+        return self._result(latencies, time.perf_counter() - start, errors)
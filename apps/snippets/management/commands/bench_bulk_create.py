@@ -0,0 +1,68 @@
+"""
+Benchmark the per-save highlighting overhead of bulk creates with and without the lexer/formatter memos.
+"""
+
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+
+from apps.snippets.benchmarks import dump_json, generate_code, parse_weights, summarize
+from apps.snippets.highlighting import get_formatter, get_lexer
+from apps.snippets.models import Snippet
+
+
+class Command(BaseCommand):
+    help = ('Save the same generated snippets once with fresh lexer and formatter instances per save, as before '
+            'the memos, and once with the shared instances. Everything is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snippets', type=int, default=300, help='Snippets saved per mode.')
+        parser.add_argument('--lines', type=int, default=20, help='Lines of code per snippet.')
+        parser.add_argument('--languages', default='python,javascript,sql,c,html',
+                            help='Comma separated languages, optionally weighted as language:weight.')
+        parser.add_argument('--styles', default='friendly,monokai,fruity,emacs', help='Comma separated styles.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the generated code.')
+        parser.add_argument('--output', help='Write the JSON report to this path.')
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(is_active=True).order_by('pk').first()
+        if owner is None:
+            raise CommandError('No user to own the snippets. Run "manage.py seed_snippets" first.')
+
+        rng = random.Random(options['seed'])
+        weights = parse_weights(options['languages'])
+        styles = options['styles'].split(',')
+        rows = [
+            (language, rng.choice(styles), generate_code(rng, language, options['lines']))
+            for language in rng.choices(list(weights), weights=list(weights.values()), k=options['snippets'])
+        ]
+
+        report = {}
+        # Highlight in-process, the memos of highlighter worker processes are out of reach here.
+        with override_settings(SNIPPET_HIGHLIGHT={'TIMEOUT': None}):
+            for mode, shared in (('fresh', False), ('shared', True)):
+                report[mode] = self._run(owner, rows, shared)
+                self.stderr.write(f'{mode}: {report[mode]["mean_ms"]}ms per save')
+        report['saving_per_save_ms'] = round(report['fresh']['mean_ms'] - report['shared']['mean_ms'], 3)
+        self.stdout.write(dump_json(report, options['output']))
+
+    @staticmethod
+    def _run(owner: User, rows: list, shared: bool) -> dict:
+        get_lexer.cache_clear()
+        get_formatter.cache_clear()
+        latencies = []
+        with transaction.atomic():
+            for language, style, code in rows:
+                if not shared:
+                    get_lexer.cache_clear()
+                    get_formatter.cache_clear()
+                snippet = Snippet(code=code, language=language, style=style, owner=owner)
+                start = time.perf_counter()
+                snippet.save()
+                latencies.append(time.perf_counter() - start)
+            transaction.set_rollback(True)
+        return summarize(latencies)
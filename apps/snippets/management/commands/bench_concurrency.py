@@ -0,0 +1,125 @@
+"""
+Benchmark concurrent readers and writers against the configured SQLite database.
+"""
+
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+from apps.snippets.benchmarks import benchmark_settings, dump_json, summarize
+from drftutorial.backends.sqlite3.base import DEFAULT_PRAGMAS
+
+
+# Django's stock SQLite configuration next to the tuned one.
+PROFILES = {
+    'default': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'mmap_size': 0, 'cache_size': -2000,
+                'busy_timeout': 5000, 'temp_store': 'DEFAULT'},
+    'tuned': DEFAULT_PRAGMAS,
+}
+
+
+class Command(BaseCommand):
+    help = ('Run reader threads on /snippets/ while writer threads create snippets, once per SQLite PRAGMA '
+            'profile, and report reader latency percentiles and throughput.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='default,tuned', help=f'Comma separated of {", ".join(PROFILES)}.')
+        parser.add_argument('--readers', type=int, default=4, help='Number of reader threads.')
+        parser.add_argument('--writers', type=int, default=2, help='Number of writer threads.')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile.')
+        parser.add_argument('--limits', action='store_true',
+                            help='Keep the write throttles and the highlight capacity, shed writes are counted apart.')
+        parser.add_argument('--output', help='Write the JSON report to this path.')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            raise CommandError('A file based SQLite "default" database is required.')
+        user = User.objects.filter(is_active=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No user to write snippets with. Run "manage.py seed_snippets" first.')
+
+        profiles = options['profiles'].split(',')
+        for profile in profiles:
+            if profile not in PROFILES:
+                raise CommandError(f'Unknown profile: {profile}')
+
+        # The reader and writer threads connect with this settings dict too, so it is changed in place.
+        db_options = connection.settings_dict.setdefault('OPTIONS', {})
+        configured = db_options.get('pragmas')
+        report = {}
+        try:
+            for profile in profiles:
+                # The journal mode can only change while no other connection is open.
+                connections.close_all()
+                db_options['pragmas'] = PROFILES[profile]
+                connection.ensure_connection()
+                connection.close()
+                with benchmark_settings(limits=options['limits']):
+                    report[profile] = self._run(user, options)
+                self.stderr.write(f'{profile}: reader p95 {report[profile]["reads"]["p95_ms"]}ms')
+        finally:
+            connections.close_all()
+            # Later connections of this process get the configured PRAGMAs back.
+            if configured is None:
+                db_options.pop('pragmas', None)
+            else:
+                db_options['pragmas'] = configured
+
+        self.stdout.write(dump_json(report, options['output']))
+
+    def _run(self, user: User, options: dict) -> dict:
+        stop = threading.Event()
+        reads, writes, shed, errors = [], [], [], []
+
+        def worker(record: list, request) -> None:
+            try:
+                client = Client()
+                client.force_login(user)
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    response = request(client)
+                    if response.status_code == 429:
+                        shed.append(response.status_code)
+                    elif response.status_code >= 400:
+                        errors.append(response.status_code)
+                    else:
+                        record.append(time.perf_counter() - start)
+            except Exception as exc:  # e.g. 'database is locked'
+                errors.append(repr(exc))
+            finally:
+                connections.close_all()
+
+        def read(client):
+            return client.get('/snippets/', HTTP_ACCEPT='application/json')
+
+        sequence = itertools.count()
+
+        def write(client):
+            # Unique code, an identical snippet would reuse the first render instead of being highlighted.
+            code = 'print("bench")\n' * 20 + f'# {next(sequence)}\n'
+            return client.post('/snippets/', {'title': 'bench', 'code': code},
+                               content_type='application/json', HTTP_ACCEPT='application/json')
+
+        threads = [threading.Thread(target=worker, args=(reads, read)) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(writes, write)) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        return {
+            'reads': {**summarize(reads), 'max_ms': round(max(reads, default=0) * 1000, 3),
+                      'throughput_rps': round(len(reads) / options['duration'], 2)},
+            'writes': {'requests': len(writes), 'throughput_rps': round(len(writes) / options['duration'], 2),
+                       'shed': len(shed)},
+            'errors': len(errors),
+        }
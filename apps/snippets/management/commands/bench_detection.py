@@ -0,0 +1,87 @@
+"""
+Benchmark the accuracy and latency of language detection against pygments' ```guess_lexer()```.
+"""
+
+import random
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from apps.snippets.benchmarks import dump_json, find_corpus_files, is_holdout, percentile, read_text
+from apps.snippets.detection import detect_language, get_config, load_model
+from apps.snippets.management.commands.build_language_model import lexer_patterns
+
+
+class Command(BaseCommand):
+    help = ("Cut snippet sized samples out of the source files held out by 'build_language_model', detect their "
+            'language and compare the accuracy and latency with guess_lexer().')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', nargs='+', required=True, help='Directories searched for source files.')
+        parser.add_argument('--samples', type=int, default=40, help='Samples per language.')
+        parser.add_argument('--lines', default='5,60', help='Range of the lines of a sample.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the samples.')
+        parser.add_argument('--output', help='Write the JSON report to this path.')
+
+    def handle(self, *args, **options):
+        languages = sorted(load_model(get_config()['MODEL']))
+        samples = self._samples(options, languages)
+
+        from pygments.lexers import guess_lexer
+        from pygments.util import ClassNotFound
+
+        def guess(code):
+            try:
+                return guess_lexer(code).aliases[0]
+            except ClassNotFound:
+                return None
+
+        start = time.perf_counter()
+        guess('x = 1\n')  # Imports every lexer once, not counted.
+        import_ms = (time.perf_counter() - start) * 1000
+
+        results = {name: {'correct': Counter(), 'ms': []} for name in ('detect', 'detect_cached', 'guess_lexer')}
+        for language, code in samples:
+            for name, func in (('detect', detect_language), ('detect_cached', detect_language), ('guess_lexer', guess)):
+                start = time.perf_counter()
+                detected = func(code)
+                results[name]['ms'].append((time.perf_counter() - start) * 1000)
+                results[name]['correct'][language] += detected == language
+
+        total = Counter(language for language, _ in samples)
+        report = {
+            'options': {key: options[key] for key in ('samples', 'lines', 'seed')},
+            'samples': len(samples),
+            'guess_lexer_import_ms': round(import_ms, 1),
+        }
+        for name, result in results.items():
+            report[name] = {
+                'accuracy': round(sum(result['correct'].values()) / len(samples), 4) if samples else 0.0,
+                'p50_ms': round(percentile(result['ms'], 50), 3),
+                'p95_ms': round(percentile(result['ms'], 95), 3),
+                'max_ms': round(max(result['ms'], default=0.0), 3),
+                'accuracy_by_language': {
+                    language: round(result['correct'][language] / count, 2) for language, count in total.items()},
+            }
+            self.stderr.write(f'{name}: accuracy {report[name]["accuracy"]:.1%}, p50 {report[name]["p50_ms"]}ms, '
+                              f'p95 {report[name]["p95_ms"]}ms')
+        self.stdout.write(dump_json(report, options['output']))
+
+    @staticmethod
+    def _samples(options: dict, languages: list) -> list:
+        """(language, code) windows of held out files, the language named by the file name."""
+        rng = random.Random(options['seed'])
+        low, high = (int(value) for value in options['lines'].split(','))
+        corpus = find_corpus_files(options['corpus'], {language: lexer_patterns(language) for language in languages})
+        samples = []
+        for language in languages:
+            paths = [path for path in corpus[language] if is_holdout(path)]
+            for path in rng.sample(paths, min(len(paths), options['samples'])):
+                lines = (read_text(path, 64 * 1024) or '').splitlines(keepends=True)
+                if len(lines) < low:
+                    continue
+                count = rng.randint(low, min(high, len(lines)))
+                first = rng.randrange(len(lines) - count + 1)
+                samples.append((language, ''.join(lines[first:first + count])))
+        return samples
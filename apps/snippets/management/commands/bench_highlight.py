@@ -0,0 +1,117 @@
+"""
+Benchmark the highlighting cost of each language.
+"""
+
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.snippets.benchmarks import (
+    dump_json, fit_power_law, generate_adversarial_code, generate_code_of_size, measure,
+)
+from apps.snippets.highlighting import render_highlighted
+from apps.snippets.models import LANGUAGE_CHOICES, STYLE_CHOICES, Snippet
+
+
+class Command(BaseCommand):
+    help = ('Measure highlight time and output size per (language, style, linenos, code size), '
+            'flag super-linear lexers and suggest per-language size limits and timeouts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--languages', default='all',
+                            help="Comma separated language aliases, or 'all' for every entry of LANGUAGE_CHOICES.")
+        parser.add_argument('--styles', default='friendly', help='Comma separated style names.')
+        parser.add_argument('--sizes', default='1,8,64', help='Comma separated code sizes in KiB.')
+        parser.add_argument('--corpus', choices=('synthetic', 'adversarial', 'database'), default='synthetic',
+                            help="Input source. 'database' uses the stored snippets of each language.")
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the best one is kept.')
+        parser.add_argument('--budget-ms', type=float, default=200,
+                            help='Highlight time budget used to suggest a per-language size limit.')
+        parser.add_argument('--superlinear', type=float, default=1.3,
+                            help='Flag lexers whose fitted time/size exponent exceeds this value.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic corpus.')
+        parser.add_argument('--output', help='Write the JSON cost table to this path.')
+
+    def handle(self, *args, **options):
+        choices = dict(LANGUAGE_CHOICES)
+        languages = list(choices) if options['languages'] == 'all' else options['languages'].split(',')
+        styles = options['styles'].split(',')
+        unknown = (set(languages) - set(choices)) | (set(styles) - set(dict(STYLE_CHOICES)))
+        if unknown:
+            raise CommandError(f'Unknown language or style: {", ".join(sorted(unknown))}')
+        sizes = sorted(int(size) * 1024 for size in options['sizes'].split(','))
+
+        table = {}
+        for language in languages:
+            corpus = self._corpus(language, sizes, options)
+            if not corpus:
+                continue
+            rows = []
+            for style in styles:
+                for linenos in (False, True):
+                    rows.extend(self._measure_sizes(language, style, linenos, corpus, options))
+            if not rows:
+                # Every measurement failed, as reported: listed without a fit.
+                table[language] = {'failed': True, 'measurements': []}
+                continue
+            table[language] = self._summarize(rows, options)
+            if table[language]['superlinear']:
+                self.stderr.write(self.style.WARNING(
+                    f'{language}: super-linear highlight cost (exponent {table[language]["exponent"]})'))
+
+        self.stdout.write(dump_json({'options': {
+            key: options[key] for key in ('styles', 'sizes', 'corpus', 'repeat', 'budget_ms', 'superlinear')
+        }, 'languages': table}, options['output']))
+
+    @staticmethod
+    def _corpus(language: str, sizes: list, options: dict) -> list:
+        """Return (size, code) pairs ordered by size."""
+        rng = random.Random(f'{options["seed"]}-{language}')
+        if options['corpus'] == 'adversarial':
+            return [(size, generate_adversarial_code(rng, size)) for size in sizes]
+        if options['corpus'] == 'database':
+            codes = Snippet.objects.filter(language=language).order_by('id').values_list('code_blob__data', flat=True)
+            return sorted({len(code): code for code in codes[:50] if code}.items())
+        return [(size, generate_code_of_size(rng, language, size)) for size in sizes]
+
+    def _measure_sizes(self, language: str, style: str, linenos: bool, corpus: list, options: dict) -> list:
+        def render(code):
+            return render_highlighted(code, language=language, style=style, linenos=linenos)
+
+        rows = []
+        try:
+            # Highlighting an empty input warms up imports and measures the fixed per-call overhead.
+            overhead, _ = measure(lambda: render(''), repeat=options['repeat'] + 1)
+        except Exception as exc:  # A broken lexer should not abort the whole table.
+            self.stderr.write(self.style.ERROR(f'{language}/{style}: {exc!r}'))
+            return rows
+        for size, code in corpus:
+            try:
+                seconds, html = measure(lambda: render(code), repeat=options['repeat'])
+            except Exception as exc:
+                self.stderr.write(self.style.ERROR(f'{language}/{style}: {exc!r}'))
+                break
+            rows.append({'style': style, 'linenos': linenos, 'size': len(code), 'ms': round(seconds * 1000, 3),
+                         'overhead_ms': round(overhead * 1000, 3), 'output_size': len(html)})
+            # Stop growing the input once a lexer is already far beyond the budget.
+            if seconds * 1000 > options['budget_ms'] * 10:
+                break
+        return rows
+
+    @staticmethod
+    def _summarize(rows: list, options: dict) -> dict:
+        plain = [row for row in rows if not row['linenos']] or rows
+        a, b = fit_power_law(
+            [row['size'] for row in plain], [(row['ms'] - row['overhead_ms']) / 1000 for row in plain])
+        largest = max(rows, key=lambda row: row['size'])
+        # Largest input the fitted curve highlights within the budget, and a timeout with 2x headroom.
+        max_size = int((options['budget_ms'] / 1000 / a) ** (1 / b)) if a > 0 and b > 0 else None
+        return {
+            'exponent': round(b, 3),
+            'superlinear': len(plain) > 1 and b > options['superlinear'],
+            'ms_per_kib': round(largest['ms'] / (largest['size'] / 1024), 3),
+            'output_ratio': round(largest['output_size'] / max(largest['size'], 1), 2),
+            'suggested_max_code_size': max_size,
+            'suggested_timeout': round(options['budget_ms'] * 2 / 1000, 3),
+            'measurements': rows,
+        }
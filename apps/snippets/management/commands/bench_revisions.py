@@ -0,0 +1,110 @@
+"""
+Benchmark the storage and rebuild time of delta-compressed revisions against full copies.
+"""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from apps.snippets.benchmarks import dump_json, generate_code, generate_code_of_size
+from apps.snippets.revisions import encode_revision, make_keyframe, read_keyframe, rebuild
+
+
+class Command(BaseCommand):
+    help = ('Generate an edit history of a synthetic snippet, store it with several keyframe intervals and compare '
+            'the stored bytes and the time to rebuild every version with full copies.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--language', default='python', help='Language of the synthetic code.')
+        parser.add_argument('--size', type=int, default=8, help='Size of the first version in KiB.')
+        parser.add_argument('--versions', type=int, default=200, help='Number of versions in the history.')
+        parser.add_argument('--edits', type=int, default=3, help='Line edits between two versions.')
+        parser.add_argument('--intervals', default='1,4,16,64', help='Comma separated keyframe intervals.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the history.')
+        parser.add_argument('--output', help='Write the JSON report to this path.')
+
+    def handle(self, *args, **options):
+        if options['versions'] < 1:
+            raise CommandError('--versions must be positive.')
+        versions = self._history(options)
+        raw = sum(len(code.encode('utf-8')) for code in versions)
+        copies = [make_keyframe(code) for code in versions]
+        report = {
+            'options': {key: options[key] for key in ('language', 'size', 'versions', 'edits', 'seed')},
+            'raw_bytes': raw,
+            'full_copies': {
+                'stored_bytes': sum(len(data) for data in copies),
+                **self._timings(lambda number: read_keyframe(copies[number]), len(versions)),
+            },
+            'intervals': {},
+        }
+        for interval in sorted(int(value) for value in options['intervals'].split(',')):
+            with override_settings(SNIPPET_REVISIONS={'KEYFRAME_INTERVAL': interval}):
+                stored = self._encode(versions)
+
+            def rebuild_version(number):
+                start = number - stored[number][1]
+                return rebuild(data for data, _ in stored[start:number + 1])
+
+            assert all(rebuild_version(number) == code for number, code in enumerate(versions))
+            total = sum(len(data) for data, _ in stored)
+            report['intervals'][interval] = {
+                'stored_bytes': total,
+                'keyframes': sum(1 for _, depth in stored if depth == 0),
+                'ratio_to_full_copies': round(total / report['full_copies']['stored_bytes'], 4),
+                'ratio_to_raw': round(total / raw, 4),
+                **self._timings(rebuild_version, len(versions)),
+            }
+            self.stderr.write(
+                f'interval {interval}: {total} bytes ({report["intervals"][interval]["ratio_to_full_copies"]:.1%} '
+                f'of full copies), rebuild p50 {report["intervals"][interval]["rebuild_p50_ms"]}ms, '
+                f'max {report["intervals"][interval]["rebuild_max_ms"]}ms')
+        self.stdout.write(dump_json(report, options['output']))
+
+    @staticmethod
+    def _history(options: dict) -> list:
+        """Versions of the code, each with a few lines replaced, inserted or deleted."""
+        rng = random.Random(options['seed'])
+        lines = generate_code_of_size(rng, options['language'], options['size'] * 1024).splitlines(keepends=True)
+        versions = [''.join(lines)]
+        for _ in range(options['versions'] - 1):
+            for _ in range(options['edits']):
+                position = rng.randrange(len(lines) + 1)
+                operation = rng.choice(('replace', 'insert', 'delete'))
+                if operation == 'delete' and len(lines) > 1 and position < len(lines):
+                    del lines[position]
+                    continue
+                new = generate_code(rng, options['language'], rng.randint(1, 3)).splitlines(keepends=True)
+                lines[position:position + (operation == 'replace')] = new
+            versions.append(''.join(lines))
+        return versions
+
+    @staticmethod
+    def _encode(versions: list) -> list:
+        """(data, depth) of each version, as ```RevisionManager.record()``` stores them."""
+        stored, base, depth = [], None, None
+        for code in versions:
+            data, depth = encode_revision(base, code, depth)
+            stored.append((data, depth))
+            base = code
+        return stored
+
+    @staticmethod
+    def _timings(rebuild_version, count: int) -> dict:
+        """Time to rebuild every version, the best of three runs each."""
+        timings = []
+        for number in range(count):
+            best = float('inf')
+            for _ in range(3):
+                start = time.perf_counter()
+                rebuild_version(number)
+                best = min(best, time.perf_counter() - start)
+            timings.append(best * 1000)
+        return {
+            'rebuild_mean_ms': round(statistics.mean(timings), 4),
+            'rebuild_p50_ms': round(statistics.median(timings), 4),
+            'rebuild_max_ms': round(max(timings), 4),
+        }
@@ -0,0 +1,89 @@
+"""
+Benchmark the first requests of a fresh worker process, with and without the warm-up.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.snippets.benchmarks import dump_json
+
+
+# Run in a fresh interpreter, like a worker forked by a server. Created snippets are rolled back.
+WORKER_SCRIPT = '''
+import itertools, json, statistics, time
+from drftutorial.wsgi import application
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import Client
+from apps.snippets.benchmarks import benchmark_settings
+from apps.snippets.highlighting import worker_pool
+
+if {warm}:
+    worker_pool.prestart()  # gunicorn.conf.py's post_fork hook.
+benchmark_settings().enable()
+languages = {languages!r}
+client = Client()
+client.force_login(User.objects.filter(is_active=True).order_by('pk').first())
+
+def timed(request):
+    start = time.perf_counter()
+    response = request()
+    assert response.status_code < 400, response.status_code
+    return (time.perf_counter() - start) * 1000
+
+sequence = itertools.count()
+
+def create(language):
+    # Unique code, an identical snippet would reuse the first render instead of being highlighted.
+    code = 'x = 1\\n' * 20 + '# {{}}\\n'.format(next(sequence))
+    return client.post('/snippets/', {{'code': code, 'language': language}},
+                       content_type='application/json', HTTP_ACCEPT='application/json')
+
+result = {{}}
+with transaction.atomic():
+    result['first_list_ms'] = timed(lambda: client.get('/snippets/', HTTP_ACCEPT='application/json'))
+    result['steady_list_ms'] = statistics.median(
+        timed(lambda: client.get('/snippets/', HTTP_ACCEPT='application/json')) for _ in range(10))
+    result['first_create_ms'] = statistics.mean(timed(lambda: create(language)) for language in languages)
+    result['steady_create_ms'] = statistics.mean(timed(lambda: create(language)) for language in languages)
+    transaction.set_rollback(True)
+print(json.dumps({{key: round(value, 3) for key, value in result.items()}}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Start fresh worker processes with and without DRFTUTORIAL_WARM_UP and compare the latency of their '
+            'first requests with the steady state.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--languages', default='python,javascript,sql,c,html',
+                            help='Comma separated languages of the created snippets, each first use imports a lexer.')
+        parser.add_argument('--repeat', type=int, default=3, help='Processes per mode, the best run is reported.')
+        parser.add_argument('--output', help='Write the JSON report to this path.')
+
+    def handle(self, *args, **options):
+        languages = [language for language in options['languages'].split(',') if language]
+        report = {}
+        for mode, warm in (('cold', False), ('warm', True)):
+            env = {**os.environ, 'DRFTUTORIAL_WARM_UP': '1' if warm else '0',
+                   'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'drftutorial.settings'),
+                   # Warm up the languages used below, as the top languages of production data would be.
+                   'DRFTUTORIAL_WARM_UP_LANGUAGES': ','.join(languages)}
+            runs = []
+            for _ in range(options['repeat']):
+                result = subprocess.run(
+                    [sys.executable, '-c', WORKER_SCRIPT.format(warm=warm, languages=languages)],
+                    cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+                if result.returncode:
+                    raise CommandError(f'Worker failed:\n{result.stderr[-2000:]}')
+                runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            report[mode] = min(runs, key=lambda run: run['first_list_ms'] + run['first_create_ms'])
+            self.stderr.write(
+                f'{mode}: first list {report[mode]["first_list_ms"]}ms (steady {report[mode]["steady_list_ms"]}ms), '
+                f'first create {report[mode]["first_create_ms"]}ms (steady {report[mode]["steady_create_ms"]}ms)')
+        self.stdout.write(dump_json(report, options['output']))
@@ -0,0 +1,136 @@
+"""
+Build the token frequency model of language detection, see ```apps.snippets.detection```.
+"""
+
+import json
+import math
+import random
+import re
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.snippets.benchmarks import CODE_TEMPLATES, find_corpus_files, generate_code, is_holdout, read_text
+from apps.snippets.detection import get_config, tokenize
+from apps.snippets.models import LANGUAGE_CHOICES
+
+
+DEFAULT_LANGUAGES = (
+    'bash,batch,c,cmake,cpp,csharp,css,go,html,ini,java,javascript,json,markdown,perl,powershell,python,'
+    'restructuredtext,ruby,rust,sql,tcl,text,toml,typescript,vim,xml,yaml'
+)
+
+KEYWORD_PATTERN = re.compile(r'[A-Za-z_][\w-]*')
+
+
+def lexer_patterns(language: str) -> tuple:
+    """File name patterns of the lexer of a language, from the pygments mapping."""
+    from pygments.lexers._mapping import LEXERS
+
+    for _, _, names, filenames, _ in LEXERS.values():
+        if names and names[0] == language:
+            return filenames
+    return ()
+
+
+def lexer_keywords(language: str) -> set:
+    """
+    Keywords of the lexer of a language: the ```words()``` and the plain alternations ('(if|else)\\b') of its rules.
+        Gives a vocabulary to languages with few or no corpus files. Case insensitive lexers add both cases.
+    """
+    from pygments.lexer import words
+    from pygments.lexers import find_lexer_class_by_name
+
+    lexer = find_lexer_class_by_name(language)
+    keywords = set()
+    for cls in lexer.__mro__:
+        for rules in (cls.__dict__.get('tokens') or {}).values():
+            for rule in rules:
+                if not isinstance(rule, tuple) or not rule:
+                    continue
+                if isinstance(rule[0], words):
+                    keywords.update(word for word in rule[0].words if KEYWORD_PATTERN.fullmatch(word))
+                elif isinstance(rule[0], str):
+                    keywords.update(_alternatives(rule[0]))
+    if getattr(lexer, 'flags', 0) & re.IGNORECASE:
+        keywords = {case for keyword in keywords for case in (keyword.lower(), keyword.upper())}
+    return keywords
+
+
+def _alternatives(regex: str) -> list:
+    body = re.sub(r'\\b|\(\?:|\(\?i\)|[\^$]', '', regex).strip('()')
+    parts = body.split('|')
+    if len(parts) < 2 or '(' in body or ')' in body:
+        return []
+    return parts if all(KEYWORD_PATTERN.fullmatch(part) for part in parts) else []
+
+
+class Command(BaseCommand):
+    help = ('Count the tokens of source files labelled by file name, and of the keywords of the pygments lexers, '
+            'and write the naive Bayes model of language detection. One in five files is held out for '
+            "'bench_detection'.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', nargs='+', required=True, help='Directories searched for source files.')
+        parser.add_argument('--languages', default=DEFAULT_LANGUAGES, help='Comma separated language aliases.')
+        parser.add_argument('--files', type=int, default=300, help='Training files per language at most.')
+        parser.add_argument('--chars', type=int, default=32 * 1024, help='Characters read from each file.')
+        parser.add_argument('--tokens', type=int, default=1000, help='Most frequent tokens kept per language.')
+        parser.add_argument('--keyword-count', type=int, default=20, help='Count given to each lexer keyword.')
+        parser.add_argument('--synthetic', type=int, default=2000,
+                            help='Lines of synthetic code of languages without corpus files, see CODE_TEMPLATES.')
+        parser.add_argument('--min-total', type=int, default=100000,
+                            help='Smallest token total of a language when smoothing, so that languages with little '
+                                 'training data do not win on unknown tokens.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the file sample.')
+        parser.add_argument('--output', help='Model path, by default the MODEL of SNIPPET_DETECTION.')
+
+    def handle(self, *args, **options):
+        languages = options['languages'].split(',')
+        unknown = set(languages) - set(dict(LANGUAGE_CHOICES))
+        if unknown:
+            raise CommandError(f'Unknown language: {", ".join(sorted(unknown))}')
+
+        rng = random.Random(options['seed'])
+        corpus = find_corpus_files(options['corpus'], {language: lexer_patterns(language) for language in languages})
+        counts, report = {}, {}
+        for language in languages:
+            paths = [path for path in corpus[language] if not is_holdout(path)]
+            paths = rng.sample(paths, min(len(paths), options['files']))
+            counts[language] = Counter()
+            for path in paths:
+                text = read_text(path, options['chars'])
+                if text:
+                    counts[language].update(tokenize(text))
+            if not paths and language in CODE_TEMPLATES:
+                counts[language].update(tokenize(generate_code(rng, language, options['synthetic'])))
+            keywords = lexer_keywords(language)
+            counts[language].update({keyword: options['keyword_count'] for keyword in keywords})
+            report[language] = {'files': len(paths), 'keywords': len(keywords),
+                                'tokens': sum(counts[language].values())}
+            self.stderr.write(f'{language}: {len(paths)} files, {len(keywords)} keywords, '
+                              f'{report[language]["tokens"]} tokens')
+
+        model = self._model(counts, options['tokens'], options['min_total'])
+        path = options['output'] or get_config()['MODEL']
+        with open(path, 'w', encoding='utf-8') as fp:
+            json.dump({'languages': model, 'report': report}, fp, sort_keys=True, separators=(',', ':'))
+            fp.write('\n')
+        self.stdout.write(f'Wrote the model of {len(model)} languages to {path}')
+
+    @staticmethod
+    def _model(counts: dict, top: int, min_total: int) -> dict:
+        """
+        Log probabilities of the most frequent tokens of each language, with add-one smoothing.
+            The totals include the tokens which are not kept, their probability is the one of unknown tokens.
+        """
+        kept = {language: dict(counter.most_common(top)) for language, counter in counts.items()}
+        vocabulary = len(set().union(*kept.values()))
+        model = {}
+        for language, tokens in kept.items():
+            denominator = max(sum(counts[language].values()), min_total) + vocabulary
+            model[language] = {
+                'tokens': {token: round(math.log((count + 1) / denominator), 3) for token, count in tokens.items()},
+                'unknown': round(math.log(1 / denominator), 3),
+            }
+        return model
@@ -0,0 +1,82 @@
+"""
+Delete the blobs no longer referenced by any snippet, and report how much deduplication saves.
+"""
+
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.snippets.models import Blob, Snippet
+from drftutorial.routers import pin_to_primary
+
+
+class Command(BaseCommand):
+    help = ('Delete unreferenced code and render blobs in batches. With --recount, the reference counts are '
+            'first recomputed from the snippets, e.g. after writes by raw SQL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recount', action='store_true', help='Recompute the reference count of every blob.')
+        parser.add_argument('--dry-run', action='store_true', help='Report the unreferenced blobs only.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Blobs deleted per transaction.')
+
+    def handle(self, *args, **options):
+        # Read on the primary, a lagging replica would miss the latest references.
+        # A dry run reports the recounted references, but rolls them back.
+        with pin_to_primary(), (transaction.atomic() if options['dry_run'] else nullcontext()):
+            if options['recount']:
+                updated = self._recount()
+                self.stdout.write(f'Recounted the references of {updated} blobs.')
+            self._report('Before' if not options['dry_run'] else 'Stored')
+            deleted, freed = self._collect(options['batch_size'], options['dry_run'])
+            verb = 'Would delete' if options['dry_run'] else 'Deleted'
+            self.stdout.write(self.style.SUCCESS(f'{verb} {deleted} blobs, {freed} bytes.'))
+            if options['dry_run']:
+                transaction.set_rollback(True)
+            else:
+                self._report('After')
+
+    @staticmethod
+    def _references(field: str):
+        return Exists(Snippet.objects.filter(**{field: OuterRef('pk')}))
+
+    @staticmethod
+    def _recount() -> int:
+        def count(field: str):
+            counts = Snippet.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+                count=Count('pk')).values('count')
+            return Coalesce(Subquery(counts), Value(0))
+
+        return Blob.objects.update(refs=count('code_blob') + count('render_blob'))
+
+    def _unreferenced(self):
+        # Both checks: the count says so, and no snippet row does reference it.
+        return Blob.objects.filter(refs__lte=0).exclude(self._references('code_blob')).exclude(
+            self._references('render_blob'))
+
+    def _collect(self, batch_size: int, dry_run: bool) -> tuple:
+        if dry_run:
+            totals = self._unreferenced().aggregate(count=Count('pk'), size=Sum('size'))
+            return totals['count'], totals['size'] or 0
+        deleted = freed = 0
+        while True:
+            with transaction.atomic():
+                batch = list(self._unreferenced().values_list('pk', 'size')[:batch_size])
+                if not batch:
+                    return deleted, freed
+                pks = [pk for pk, _ in batch]
+                # Checked again by the DELETE, a save may have referenced a blob meanwhile.
+                self._unreferenced().filter(pk__in=pks).delete()
+                kept = set(Blob.objects.filter(pk__in=pks).values_list('pk', flat=True))
+            deleted += len(pks) - len(kept)
+            freed += sum(size for pk, size in batch if pk not in kept)
+
+    def _report(self, label: str) -> None:
+        totals = Blob.objects.aggregate(
+            blobs=Count('pk'), stored=Sum('size'), referenced=Sum(F('size') * F('refs')))
+        stored, referenced = totals['stored'] or 0, totals['referenced'] or 0
+        ratio = f'{referenced / stored:.2f}x' if stored else '-'
+        self.stdout.write(f'{label}: {totals["blobs"]} blobs, {stored} bytes stored for {referenced} bytes '
+                          f'referenced by snippets (deduplication {ratio}).')
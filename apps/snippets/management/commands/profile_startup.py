@@ -0,0 +1,81 @@
+"""
+Report the import cost of a worker boot, per module and per top-level package.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.snippets.benchmarks import dump_json, parse_importtime
+
+
+# Run in a fresh interpreter, like a server worker loading the application.
+BOOT_SCRIPT = '''
+import time
+start = time.perf_counter()
+from drftutorial.{target} import application
+if {first_request}:
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+print((time.perf_counter() - start) * 1000)
+'''
+
+
+class Command(BaseCommand):
+    help = ('Boot the WSGI or ASGI application in fresh interpreters with "python -X importtime" and report '
+            'the boot time and the most expensive imports.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=('wsgi', 'asgi'), default='wsgi', help='Application to boot.')
+        parser.add_argument('--first-request', action='store_true',
+                            help='Also load the URLConf, i.e. the imports paid by the first request.')
+        parser.add_argument('--repeat', type=int, default=5, help='Boots to run, the median is reported.')
+        parser.add_argument('--top', type=int, default=20, help='Number of modules and packages to list.')
+        parser.add_argument('--output', help='Write the JSON report to this path.')
+
+    def handle(self, *args, **options):
+        script = BOOT_SCRIPT.format(target=options['target'], first_request=options['first_request'])
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'drftutorial.settings')}
+
+        boots, self_times, cumulative_times = [], {}, {}
+        for _ in range(options['repeat']):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', script], cwd=settings.BASE_DIR, env=env,
+                capture_output=True, text=True)
+            if result.returncode:
+                raise CommandError(f'Boot failed:\n{result.stderr[-2000:]}')
+            boots.append(float(result.stdout.strip().splitlines()[-1]))
+            for module, self_us, cumulative_us, _ in parse_importtime(result.stderr):
+                self_times.setdefault(module, []).append(self_us)
+                cumulative_times.setdefault(module, []).append(cumulative_us)
+
+        def median_ms(values: list) -> float:
+            return round(statistics.median(values) / 1000, 3)
+
+        packages = {}
+        for module, values in self_times.items():
+            package = module.split('.')[0]
+            packages[package] = packages.get(package, 0) + statistics.median(values)
+        # Lists of [name, milliseconds] pairs, most expensive first.
+        top = options['top']
+        report = {
+            'boot_ms': round(statistics.median(boots), 3),
+            'modules_imported': len(self_times),
+            'packages_ms': [
+                [package, round(us / 1000, 3)]
+                for package, us in sorted(packages.items(), key=lambda item: -item[1])[:top]],
+            'modules_self_ms': [
+                [module, median_ms(values)]
+                for module, values in sorted(self_times.items(), key=lambda item: -statistics.median(item[1]))[:top]],
+            'project_cumulative_ms': [
+                [module, median_ms(values)]
+                for module, values in sorted(cumulative_times.items(), key=lambda item: -statistics.median(item[1]))
+                if module.split('.')[0] in ('apps', 'drftutorial')],
+        }
+        self.stderr.write(f'{options["target"]} boot: {report["boot_ms"]}ms, {report["modules_imported"]} modules')
+        self.stdout.write(dump_json(report, options['output']))
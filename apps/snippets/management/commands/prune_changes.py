@@ -0,0 +1,37 @@
+"""
+Delete the old entries of the snippet change feed, e.g. periodically from cron.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.snippets.changes import get_config
+from apps.snippets.models import ChangeWatermark, SnippetChange
+
+
+class Command(BaseCommand):
+    help = ('Delete the snippet changes older than the retention period. Clients whose cursor falls before the '
+            'remaining changes get "410 Gone" and list the snippets again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Retention in days, SNIPPET_CHANGES["RETENTION_DAYS"] by default.')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else get_config()['RETENTION_DAYS']
+        cutoff = timezone.now() - timedelta(days=days)
+        # By sequence up to the last old change, the latest change is always kept to anchor the cursors.
+        last = SnippetChange.objects.filter(created__lt=cutoff).aggregate(last=Max('pk'))['last']
+        latest = SnippetChange.objects.aggregate(latest=Max('pk'))['latest']
+        if last is None:
+            deleted = 0
+        else:
+            bound = min(last, latest - 1)
+            with transaction.atomic():
+                deleted, _ = SnippetChange.objects.filter(pk__lte=bound).delete()
+                # Cursors before it are expired, whatever the gaps of the sequence after it.
+                ChangeWatermark.advance(bound)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} changes older than {days} days.'))
@@ -0,0 +1,28 @@
+"""
+Recount the rows behind the approximate counts of paginated lists, e.g. periodically from cron.
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from apps.snippets.caching import bump_generation
+from apps.snippets.models import RowCounter, Snippet
+from drftutorial.routers import pin_to_primary
+
+
+# Models listed with ```ApproximateCountPagination```.
+COUNTED_MODELS = (Snippet, User)
+
+
+class Command(BaseCommand):
+    help = ('Store the exact row count of every model listed with approximate counts, correcting the drift of '
+            'bulk inserts and raw SQL, which send no signals.')
+
+    def handle(self, *args, **options):
+        # Counted on the primary, a lagging replica would store an old count.
+        with pin_to_primary():
+            for model in COUNTED_MODELS:
+                previous = RowCounter.get_count(model)
+                count = RowCounter.refresh(model)
+                self.stdout.write(f'{model._meta.label_lower}: {count} rows (counter was {previous}).')
+        bump_generation()
@@ -0,0 +1,118 @@
+"""
+Re-highlight stored snippets in parallel, e.g. after a Pygments upgrade or a style change.
+"""
+
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from apps.snippets.caching import bump_generation
+from apps.snippets.filters import parse_moment
+from apps.snippets.highlighting import get_limits, highlight_rows
+from apps.snippets.models import Snippet
+
+
+class Command(BaseCommand):
+    help = ('Re-highlight snippets in primary key chunks across a process pool, '
+            'writing back with bulk_update() and checkpointing progress so an interrupted run can resume.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--language', help='Comma separated language aliases to re-highlight.')
+        parser.add_argument('--style', help='Comma separated style names to re-highlight.')
+        parser.add_argument('--since', help='Only snippets created at or after this date (ISO 8601).')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Snippets per job.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of processes.')
+        parser.add_argument('--checkpoint', help='Checkpoint file. An existing checkpoint resumes the run.')
+
+    def handle(self, *args, **options):
+        queryset = self._filter(Snippet.objects.all(), options)
+        filters = {key: options[key] for key in ('language', 'style', 'since')}
+        last_pk = self._load_checkpoint(options['checkpoint'], filters)
+        total = queryset.filter(pk__gt=last_pk).count()
+        self.stdout.write(f'Re-highlighting {total} snippets from pk > {last_pk} with {options["workers"]} workers.')
+
+        chunks = self._chunks(queryset, last_pk, options['chunk_size'])
+        first = next(chunks, None)
+        # The pool forks all its workers on the first submit, after this first query: forked workers must not
+        # share the parent's database connections. Later chunks reopen a connection in the parent only.
+        connections.close_all()
+        done, start = 0, time.monotonic()
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            for chunk_last_pk, rows in chain([first] if first else [], chunks):
+                pending.append((chunk_last_pk, executor.submit(highlight_rows, rows)))
+                # Keep every worker busy while bounding the number of chunks held in memory.
+                while len(pending) > options['workers'] * 2:
+                    done += self._write(*pending.popleft(), options['checkpoint'], filters)
+                    self._progress(done, total, start)
+            while pending:
+                done += self._write(*pending.popleft(), options['checkpoint'], filters)
+                self._progress(done, total, start)
+
+        self.stdout.write(self.style.SUCCESS(f'Re-highlighted {done} snippets in {time.monotonic() - start:.1f}s.'))
+
+    @staticmethod
+    def _filter(queryset, options: dict):
+        if options['language']:
+            queryset = queryset.filter(language__in=options['language'].split(','))
+        if options['style']:
+            queryset = queryset.filter(style__in=options['style'].split(','))
+        if options['since']:
+            since = parse_moment(options['since'])
+            if since is None:
+                raise CommandError(f'Invalid --since date: {options["since"]}')
+            queryset = queryset.filter(created__gte=since)
+        return queryset
+
+    @staticmethod
+    def _chunks(queryset, last_pk: int, chunk_size: int):
+        """Stream (last pk, rows) chunks ordered by primary key, passing the highlight limits to the workers."""
+        fields = ('pk', 'code_blob__data', 'language', 'style', 'linenos', 'title')
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list(*fields)[:chunk_size])
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+            yield last_pk, [row + get_limits(row[2]) for row in rows]
+
+    def _write(self, chunk_last_pk: int, future, checkpoint: str, filters: dict) -> int:
+        results = future.result()
+        renders = {pk: (highlighted, degraded) for pk, highlighted, degraded, _ in results}
+        with transaction.atomic():
+            # The fresh token streams replace those lexed by an older pygments.
+            Snippet.objects.update_renders(renders, streams={pk: stream for pk, _, _, stream in results})
+            # Bulk updates send no post_save signals.
+            bump_generation()
+        # Chunks are written in primary key order, so everything up to this pk is done.
+        self._save_checkpoint(checkpoint, chunk_last_pk, filters)
+        return len(renders)
+
+    @staticmethod
+    def _load_checkpoint(path: str, filters: dict) -> int:
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path, encoding='utf-8') as fp:
+            checkpoint = json.load(fp)
+        if checkpoint['filters'] != filters:
+            raise CommandError(f'Checkpoint {path} was created with other filters: {checkpoint["filters"]}')
+        return checkpoint['last_pk']
+
+    @staticmethod
+    def _save_checkpoint(path: str, last_pk: int, filters: dict) -> None:
+        if not path:
+            return
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as fp:
+            json.dump({'last_pk': last_pk, 'filters': filters}, fp)
+        os.replace(f'{path}.tmp', path)
+
+    def _progress(self, done: int, total: int, start: float) -> None:
+        elapsed = time.monotonic() - start
+        rate = done / elapsed if elapsed else 0
+        eta = (total - done) / rate if rate else 0
+        self.stdout.write(f'{done}/{total} snippets, {rate:.0f}/s, ETA {eta:.0f}s')
@@ -0,0 +1,108 @@
+"""
+Generate a reproducible synthetic dataset of users and snippets.
+"""
+
+import math
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.snippets.benchmarks import generate_code, parse_weights
+from apps.snippets.caching import bump_generation
+from apps.snippets.highlighting import render_highlighted
+from apps.snippets.models import RowCounter, Snippet, LANGUAGE_CHOICES, STYLE_CHOICES
+from drftutorial.routers import pin_to_primary
+
+
+class Command(BaseCommand):
+    help = 'Create synthetic users and snippets with bulk inserts (users x snippets x language mix x code size).'
+
+    username_prefix = 'seed-user-'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of users to create.')
+        parser.add_argument('--snippets', type=int, default=100, help='Number of snippets per user.')
+        parser.add_argument('--languages', default='python:5,javascript:3,c:1,sql:1',
+                            help="Language mix as 'alias:weight,...'.")
+        parser.add_argument('--styles', default='friendly:3,monokai:1', help="Style mix as 'name:weight,...'.")
+        parser.add_argument('--median-lines', type=int, default=30, help='Median code size in lines (log-normal).')
+        parser.add_argument('--sigma', type=float, default=1.0, help='Spread of the log-normal code size.')
+        parser.add_argument('--max-lines', type=int, default=2000, help='Upper bound of code size in lines.')
+        parser.add_argument('--linenos-ratio', type=float, default=0.3, help='Ratio of snippets with line numbers.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, same seed gives the same dataset.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk insert.')
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded users and snippets first.')
+
+    def handle(self, *args, **options):
+        # Rows are read back right after being written, a lagging replica would miss them.
+        with pin_to_primary():
+            self._seed(options)
+
+    def _seed(self, options: dict) -> None:
+        languages = parse_weights(options['languages'])
+        styles = parse_weights(options['styles'])
+        self._validate(languages, dict(LANGUAGE_CHOICES), 'language')
+        self._validate(styles, dict(STYLE_CHOICES), 'style')
+        rng = random.Random(options['seed'])
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=self.username_prefix).delete()
+            self.stdout.write(f'Deleted {deleted} seeded rows.')
+
+        # Hash the password once, PBKDF2 per user would dominate the run.
+        password = make_password('seed-password')
+        start = User.objects.filter(username__startswith=self.username_prefix).count()
+        users = User.objects.bulk_create([
+            User(username=f'{self.username_prefix}{index:06d}', email=f'{index:06d}@seed.test', password=password)
+            for index in range(start, start + options['users'])
+        ], batch_size=options['batch_size'])
+        # SQLite does not return primary keys from bulk_create() on every version.
+        users = list(User.objects.filter(username__in=[user.username for user in users]).order_by('id'))
+
+        created = 0
+        batch = []
+        for owner in users:
+            for _ in range(options['snippets']):
+                batch.append(self._build_snippet(rng, owner, languages, styles, options))
+                if len(batch) >= options['batch_size']:
+                    created += self._flush(batch)
+            self.stdout.write(f'{owner.username}: {created + len(batch)} snippets so far.')
+        created += self._flush(batch)
+        # bulk_create() sends no post_save signals.
+        RowCounter.refresh(User)
+        RowCounter.refresh(Snippet)
+        bump_generation()
+
+        self.stdout.write(self.style.SUCCESS(f'Created {len(users)} users and {created} snippets.'))
+
+    @staticmethod
+    def _validate(weights: dict, choices: dict, name: str) -> None:
+        unknown = set(weights) - set(choices)
+        if unknown:
+            raise CommandError(f'Unknown {name}: {", ".join(sorted(unknown))}')
+        if not weights:
+            raise CommandError(f'At least one {name} is required.')
+
+    def _build_snippet(self, rng: random.Random, owner: User, languages: dict, styles: dict, options: dict) -> Snippet:
+        language = rng.choices(list(languages), weights=list(languages.values()))[0]
+        style = rng.choices(list(styles), weights=list(styles.values()))[0]
+        lines = int(rng.lognormvariate(math.log(options['median_lines']), options['sigma']))
+        lines = max(1, min(lines, options['max_lines']))
+        linenos = rng.random() < options['linenos_ratio']
+        title = f'{language} snippet #{rng.randint(0, 10 ** 6)}'
+        code = generate_code(rng, language, lines)
+        return Snippet(
+            title=title, code=code, linenos=linenos, language=language, style=style, owner=owner,
+            highlighted=render_highlighted(code, language=language, style=style, linenos=linenos, title=title),
+        )
+
+    @staticmethod
+    def _flush(batch: list) -> int:
+        count = len(batch)
+        with transaction.atomic():
+            Snippet.objects.bulk_create(batch)
+        batch.clear()
+        return count
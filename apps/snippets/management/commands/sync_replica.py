@@ -0,0 +1,54 @@
+"""
+Copy the primary SQLite database into the local read replica stand-in.
+"""
+
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.snippets.caching import bump_generation
+
+
+class Command(BaseCommand):
+    help = ('Replicate the primary database into a replica alias with the SQLite online backup API. '
+            'With --interval it keeps replicating, the interval being the simulated replication lag.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replica', default='replica', help='Alias of the replica database.')
+        parser.add_argument('--interval', type=float, help='Replicate every N seconds until interrupted.')
+
+    def handle(self, *args, **options):
+        source = self._database_name(DEFAULT_DB_ALIAS)
+        target = self._database_name(options['replica'])
+
+        while True:
+            start = time.monotonic()
+            self._copy(source, target)
+            # Pages cached from the lagging replica are outdated now.
+            bump_generation()
+            self.stdout.write(f'Replicated {source} to {target} in {time.monotonic() - start:.2f}s.')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def _database_name(alias: str) -> str:
+        if alias not in settings.DATABASES:
+            raise CommandError(f'Unknown database alias: {alias}')
+        connection = connections[alias]
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            raise CommandError(f'Database "{alias}" is not a file based SQLite database.')
+        return str(connection.settings_dict['NAME'])
+
+    @staticmethod
+    def _copy(source: str, target: str) -> None:
+        src, dst = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            # Copy in steps of pages, so writers on the primary are not blocked for the whole copy.
+            src.backup(dst, pages=1024)
+        finally:
+            src.close()
+            dst.close()
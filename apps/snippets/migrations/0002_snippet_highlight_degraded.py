@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-19 07:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='highlight_degraded',
+            field=models.BooleanField(default=False),
+        ),
+    ]
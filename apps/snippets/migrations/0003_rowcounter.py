@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-19 07:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_rows(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    RowCounter = apps.get_model('snippets', 'RowCounter')
+    for model in (apps.get_model('snippets', 'Snippet'), apps.get_model(settings.AUTH_USER_MODEL)):
+        RowCounter.objects.using(db_alias).create(
+            label=model._meta.label_lower, count=model.objects.using(db_alias).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('snippets', '0002_snippet_highlight_degraded'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RowCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=100, unique=True)),
+                ('count', models.BigIntegerField(default=0)),
+                ('refreshed', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(count_rows, migrations.RunPython.noop),
+    ]
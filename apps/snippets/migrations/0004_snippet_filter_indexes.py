@@ -0,0 +1,45 @@
+# Generated by Django 3.2.16 on 2026-10-19 07:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('snippets', '0003_rowcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['created'], name='snippet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['language', 'created'], name='snippet_language_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['style', 'created'], name='snippet_style_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['owner', 'created'], name='snippet_owner_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='snippets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(condition=models.Q(('title', ''), _negated=True), fields=['created'], name='snippet_titled_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(condition=models.Q(('title', '')), fields=['created'], name='snippet_untitled_created_idx'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:05
+
+import hashlib
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_texts_to_blobs(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Blob = apps.get_model('snippets', 'Blob')
+    Snippet = apps.get_model('snippets', 'Snippet')
+    refs, sizes = Counter(), {}
+    snippets = Snippet.objects.using(db_alias).only('pk', 'code', 'highlighted').order_by('pk')
+    for snippet in snippets.iterator(chunk_size=500):
+        digests = []
+        for text in (snippet.code, snippet.highlighted):
+            digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            if digest not in sizes:
+                sizes[digest] = len(text.encode('utf-8'))
+                Blob.objects.using(db_alias).create(digest=digest, data=text, size=sizes[digest])
+            refs[digest] += 1
+            digests.append(digest)
+        Snippet.objects.using(db_alias).filter(pk=snippet.pk).update(code_blob=digests[0], render_blob=digests[1])
+    for digest, count in refs.items():
+        Blob.objects.using(db_alias).filter(pk=digest).update(refs=count)
+
+
+def move_blobs_to_texts(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Snippet = apps.get_model('snippets', 'Snippet')
+    snippets = Snippet.objects.using(db_alias).select_related('code_blob', 'render_blob').order_by('pk')
+    for snippet in snippets.iterator(chunk_size=500):
+        Snippet.objects.using(db_alias).filter(pk=snippet.pk).update(
+            code=snippet.code_blob.data, highlighted=snippet.render_blob.data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0004_snippet_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.TextField()),
+                ('size', models.PositiveIntegerField()),
+                ('refs', models.IntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='code_blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='snippets.blob'),
+        ),
+        migrations.AddField(
+            model_name='snippet',
+            name='render_blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='snippets.blob'),
+        ),
+        # Before removing the fields, so that the reverse migration restores them in place.
+        migrations.AlterField(
+            model_name='snippet',
+            name='code',
+            field=models.TextField(default=''),
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='highlighted',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(move_texts_to_blobs, move_blobs_to_texts),
+        migrations.RemoveField(
+            model_name='snippet',
+            name='code',
+        ),
+        migrations.RemoveField(
+            model_name='snippet',
+            name='highlighted',
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='code_blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='snippets.blob'),
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='render_blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='snippets.blob'),
+        ),
+    ]
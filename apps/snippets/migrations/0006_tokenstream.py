@@ -0,0 +1,27 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0005_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenStream',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=100)),
+                ('data', models.BinaryField()),
+                ('code_blob', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='snippets.blob')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='tokenstream',
+            constraint=models.UniqueConstraint(fields=('code_blob', 'language'), name='tokenstream_code_language_uniq'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:03
+
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def record_first_revisions(apps, schema_editor):
+    # The current state of each snippet as a keyframe, the start of its history.
+    db_alias = schema_editor.connection.alias
+    Revision = apps.get_model('snippets', 'Revision')
+    Snippet = apps.get_model('snippets', 'Snippet')
+    snippets = Snippet.objects.using(db_alias).select_related('code_blob').order_by('pk')
+    batch = []
+    for snippet in snippets.iterator(chunk_size=500):
+        code = snippet.code_blob.data.encode('utf-8')
+        batch.append(Revision(
+            snippet_id=snippet.pk, number=1, title=snippet.title, language=snippet.language, style=snippet.style,
+            linenos=snippet.linenos, code_digest=snippet.code_blob_id, size=len(code), depth=0,
+            data=zlib.compress(code)))
+        if len(batch) == 500:
+            Revision.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    Revision.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0006_tokenstream'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Revision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('title', models.CharField(blank=True, default='', max_length=100)),
+                ('language', models.CharField(max_length=100)),
+                ('style', models.CharField(max_length=100)),
+                ('linenos', models.BooleanField(default=False)),
+                ('code_digest', models.CharField(max_length=64)),
+                ('size', models.PositiveIntegerField()),
+                ('depth', models.PositiveSmallIntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('snippet', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='snippets.snippet')),
+            ],
+            options={
+                'ordering': ('number',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='revision',
+            constraint=models.UniqueConstraint(fields=('snippet', 'number'), name='revision_snippet_number_uniq'),
+        ),
+        migrations.RunPython(record_first_revisions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:48
+
+from django.db import migrations, models
+
+
+def record_existing_snippets(apps, schema_editor):
+    # A change per existing snippet, so that a client reading the feed from the start sees every snippet.
+    db_alias = schema_editor.connection.alias
+    Snippet = apps.get_model('snippets', 'Snippet')
+    SnippetChange = apps.get_model('snippets', 'SnippetChange')
+    pks = Snippet.objects.using(db_alias).order_by('created', 'pk').values_list('pk', flat=True)
+    SnippetChange.objects.using(db_alias).bulk_create(
+        (SnippetChange(snippet_id=pk) for pk in pks.iterator()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0007_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnippetChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snippet_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.RunPython(record_existing_snippets, migrations.RunPython.noop),
+    ]
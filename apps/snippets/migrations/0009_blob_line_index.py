@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-19 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0008_snippetchange'),
+    ]
+
+    # Stored renders are left unindexed (null), they are indexed on their first read of a line range.
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='line_index',
+            field=models.BinaryField(editable=False, null=True),
+        ),
+    ]
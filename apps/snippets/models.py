@@ -1,44 +1,692 @@
 """
 Models of snippets app.
+    Language and style choices are listed on first use. Listing the pygments lexers loads every installed
+    pygments plugin (e.g. IPython's lexers), a cost which every process would otherwise pay at startup.
+
+    The code and highlighted HTML of snippets are stored in content-addressed ```Blob``` rows, shared by every
+    snippet with the same text, and a snippet saved with the code and options of a stored one reuses its render.
+    The lexer output of each code and language is stored as a ```TokenStream```, rendering the code with other
+    options or in another format formats it again without lexing, see ```Snippet.render_variant()```.
+
+    Every save records a ```Revision``` of the snippet, its code delta-compressed against the previous one.
+    Every save and delete appends a ```SnippetChange``` to the change feed, in the same transaction.
+
+    Large code is highlighted into a temporary file, stored from it in chunks and read back in chunks by
+    ```Snippet.iter_highlighted()```, so a multi-megabyte render is not held whole by a WSGI process.
 """
 
-from django.db import models
+import hashlib
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import F, Func, Subquery, Value
+from django.db.models.functions import Cast, Substr
 from django.contrib.auth.models import User
 
-from pygments import highlight
-from pygments.lexers import get_all_lexers, get_lexer_by_name
-from pygments.styles import get_all_styles
-from pygments.formatters.html import HtmlFormatter
+from .highlighting import (
+    get_config as get_highlight_config, highlight_slot, highlight_snippet, highlight_with_tokens, lex_with_limits,
+    render_format, render_plain_format, render_tokens, spool_path, unpack_tokens,
+)
+from .lines import HEADER, ENTRY, entry_position, pack_line_index, range_pieces, slice_lines
+from .revisions import encode_revision, encode_unchanged, rebuild
+from .variants import get_variant
+
+
+class LazyChoices(object):
+    """
+    Field choices computed by ```loader``` on first iteration.
+        Django keeps any iterable which is not an iterator as is, and only iterates it to validate values,
+        build form or serializer fields and run system checks.
+    """
+
+    def __init__(self, loader) -> None:
+        self._loader = loader
+        self._choices = None
+
+    def _load(self) -> list:
+        if self._choices is None:
+            self._choices = self._loader()
+        return self._choices
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+
+def _language_choices() -> list:
+    from pygments.lexers import get_all_lexers
+
+    return sorted([(item[1][0], item[0]) for item in get_all_lexers() if item[1]])
+
+
+def _style_choices() -> list:
+    from pygments.styles import get_all_styles
+
+    return sorted([(item, item) for item in get_all_styles()])
+
+
+LANGUAGE_CHOICES = LazyChoices(_language_choices)
+STYLE_CHOICES = LazyChoices(_style_choices)
+
+
+def blob_digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _chunked(items: list, size: int = 500):
+    # Bounds the parameters of 'IN' lookups, SQLite limits the variables of a statement.
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class RenderCollected(Exception):
+    """The blobs of a render found for reuse were deleted by 'gc_blobs' before the save referenced them."""
+
+
+class BlobManager(models.Manager):
+
+    def intern(self, texts, indexed=()) -> list:
+        """
+        Store each of ```texts``` unless a blob already holds it, and return their digests in the same order.
+            References are counted separately, see ```adjust_refs()```.
+            :param indexed: Positions of highlighted texts in ```texts```, stored with their line index.
+        """
+        texts = list(texts)
+        digests = [blob_digest(text) for text in texts]
+        unique = dict(zip(digests, texts))
+        renders = {digests[position] for position in indexed}
+        existing = set()
+        for chunk in _chunked(list(unique)):
+            existing.update(self.filter(pk__in=chunk).values_list('pk', flat=True))
+        missing = [
+            Blob(digest=digest, data=text, size=len(text.encode('utf-8')),
+                 line_index=pack_line_index(text) if digest in renders else None)
+            for digest, text in unique.items() if digest not in existing
+        ]
+        # A concurrent save may store the same text first, which is just as good.
+        self.bulk_create(missing, ignore_conflicts=True)
+        return digests
+
+    def intern_file(self, path: str, indexed: bool = False) -> str:
+        """
+        Like ```intern()``` for the text of a UTF-8 file, read ```STREAM_CHUNK_SIZE``` characters at a time.
+            On SQLite the row is created with a placeholder of the size of the text, which is then written over
+            a chunk at a time with incremental blob I/O, in the transaction of the caller: other connections only
+            see it complete. Other databases store the text in a single insert.
+            :param indexed: Store the line index of the text, a highlighted document.
+        """
+        size = get_highlight_config()['STREAM_CHUNK_SIZE']
+        digest, length = hashlib.sha256(), 0
+        with open(path, encoding='utf-8', newline='') as fp:
+            for chunk in iter(lambda: fp.read(size), ''):
+                data = chunk.encode('utf-8')
+                digest.update(data)
+                length += len(data)
+        digest = digest.hexdigest()
+        if self.filter(pk=digest).exists():
+            return digest
+        line_index = None
+        if indexed:
+            with open(path, encoding='utf-8', newline='\n') as fp:
+                line_index = pack_line_index(fp)
+        connection = connections[self.db]
+        connection.ensure_connection()
+        # Connection.blobopen() is new in Python 3.11.
+        incremental = connection.vendor == 'sqlite' and hasattr(connection.connection, 'blobopen')
+        with open(path, encoding='utf-8', newline='') as fp:
+            # The placeholder is a text of NUL characters, the column keeps the type of the text written over it.
+            data = Cast(Func(Value(length), function='zeroblob'), models.TextField()) if incremental else fp.read()
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(digest=digest, data=data, size=length, line_index=line_index)
+            except IntegrityError:
+                return digest  # A concurrent save stored it first, which is just as good.
+            if incremental:
+                self._write_blob(connection, digest, iter(lambda: fp.read(size), ''))
+        return digest
+
+    def _write_blob(self, connection, digest: str, chunks) -> None:
+        """Write ```chunks``` of text over the data of a blob, from its start, with SQLite incremental blob I/O."""
+        table = Blob._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {connection.ops.quote_name(table)} WHERE digest = %s', [digest])
+            rowid, = cursor.fetchone()
+        with connection.connection.blobopen(table, 'data', rowid) as blob:
+            for chunk in chunks:
+                blob.write(chunk.encode('utf-8'))
+
+    def adjust_refs(self, added=(), removed=()) -> int:
+        """
+        Count references to the ```added``` digests and release those to the ```removed``` ones, in bulk.
+            :return: Number of blobs updated, those of missing digests are not.
+        """
+        deltas = Counter(digest for digest in added if digest)
+        deltas.subtract(digest for digest in removed if digest)
+        by_delta = defaultdict(list)
+        for digest, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(digest)
+        updated = 0
+        for delta, digests in by_delta.items():
+            for chunk in _chunked(digests):
+                # A single UPDATE per chunk, so concurrent saves never lose a reference.
+                updated += self.filter(pk__in=chunk).update(refs=F('refs') + delta)
+        return updated
+
+
+class Blob(models.Model):
+    """
+    Text shared by snippets, keyed by its SHA-256 digest: their code and highlighted HTML.
+        ```refs``` counts the snippet fields referencing the blob. Blobs no longer referenced are deleted
+        by the 'gc_blobs' command, which also recounts references drifted by raw SQL.
+        ```line_index``` locates the lines of highlighted HTML, see ```lines.pack_line_index()```. It is null
+        for code and renders not indexed yet, empty for renders which can not be sliced by substrings.
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    data = models.TextField()
+    # Size of the data in bytes, encoded as UTF-8.
+    size = models.PositiveIntegerField()
+    line_index = models.BinaryField(null=True, editable=False)
+    refs = models.IntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = BlobManager()
+
+
+class TokenStreamManager(models.Manager):
+
+    def store(self, streams: dict) -> None:
+        """Store the packed streams given as {(code digest, language): data}, replacing stale ones."""
+        by_digest = defaultdict(dict)
+        for (digest, language), data in streams.items():
+            by_digest[digest][language] = data
+        for chunk in _chunked(list(by_digest)):
+            existing = set(self.filter(code_blob_id__in=chunk).values_list('code_blob_id', 'language'))
+            for digest, language in existing:
+                if language in by_digest[digest]:
+                    self.filter(code_blob_id=digest, language=language).update(data=by_digest[digest][language])
+            # A concurrent save may store the same stream first, which is just as good.
+            self.bulk_create([
+                TokenStream(code_blob_id=digest, language=language, data=data)
+                for digest in chunk for language, data in by_digest[digest].items()
+                if (digest, language) not in existing
+            ], ignore_conflicts=True)
+
+
+class TokenStream(models.Model):
+    """
+    Lexer output of a code blob in a language, packed by ```highlighting.pack_tokens()```.
+        Deleted along with the code blob. A stream lexed by another pygments version is stale, it is
+        lexed again and replaced on use.
+    """
+    # Indexed by the unique constraint.
+    code_blob = models.ForeignKey(Blob, related_name='+', on_delete=models.CASCADE, db_index=False)
+    language = models.CharField(max_length=100)
+    data = models.BinaryField()
+
+    objects = TokenStreamManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['code_blob', 'language'], name='tokenstream_code_language_uniq'),
+        ]
+
+
+class SnippetQuerySet(models.QuerySet):
+
+    def _write_db(self) -> str:
+        return self._db or router.db_for_write(self.model)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Store the code and highlighted texts of the snippets as blobs, which ```bulk_create()``` cannot save.
+            Snippets given no 'highlighted' text are highlighted first. Snippets referencing blobs already,
+            e.g. copies of stored rows, keep them.
+        """
+        objs = list(objs)
+        pending = []  # (snippet, blob field, text)
+        for snippet in objs:
+            if '_code' in snippet.__dict__ or not snippet.code_blob_id:
+                pending.append((snippet, 'code_blob_id', snippet.code))
+            if '_highlighted' in snippet.__dict__ or not snippet.render_blob_id:
+                if '_highlighted' not in snippet.__dict__:
+                    snippet.highlighted, snippet.highlight_degraded = snippet.highlight()
+                pending.append((snippet, 'render_blob_id', snippet.highlighted))
+        db = self._write_db()
+        blobs = Blob.objects.db_manager(db)
+        with transaction.atomic(using=db):
+            digests = blobs.intern((text for _, _, text in pending), indexed=[
+                position for position, (_, attname, _) in enumerate(pending) if attname == 'render_blob_id'])
+            for (snippet, attname, _), digest in zip(pending, digests):
+                setattr(snippet, attname, digest)
+            latest = self.using(db).order_by('-pk').values_list('pk', flat=True).first() or 0
+            objs = super().bulk_create(objs, *args, **kwargs)
+            blobs.adjust_refs(added=[
+                digest for snippet in objs for digest in (snippet.code_blob_id, snippet.render_blob_id)])
+            # Bulk inserts send no signals. Databases not returning the primary keys, e.g. SQLite, insert the rows
+            # after the latest one; a concurrent insert caught as well only gets a redundant change.
+            saved = {snippet.pk for snippet in objs if snippet.pk is not None}
+            if len(saved) < len(objs):
+                saved.update(self.using(db).filter(pk__gt=latest).values_list('pk', flat=True))
+            SnippetChange.objects.db_manager(db).bulk_create([SnippetChange(snippet_id=pk) for pk in sorted(saved)])
+        return objs
+
+    def with_render_head(self, size: int):
+        """
+        Annotate the first ```size``` characters of the render and its size in bytes, instead of loading it whole.
+            The rest of a larger render is read by ```Snippet.iter_highlighted()```.
+        """
+        return self.annotate(render_head=Substr('render_blob__data', 1, size), render_size=F('render_blob__size'))
 
+    def with_line_range(self, start: int, end: int):
+        """
+        Annotate the entries of the line index of the render locating the lines ```start``` to ```end```,
+        see ```Snippet.highlighted_lines()```. Only these few bytes of the index are read.
+        """
+        index = 'render_blob__line_index'
+        return self.annotate(
+            line_header=Substr(index, 1, HEADER.size, output_field=models.BinaryField()),
+            line_first=Substr(index, entry_position(start - 1), ENTRY.size, output_field=models.BinaryField()),
+            line_last=Substr(index, entry_position(end), ENTRY.size, output_field=models.BinaryField()),
+        )
 
-LEXERS = [item for item in get_all_lexers() if item[1]]
-LANGUAGE_CHOICES = sorted([(item[1][0], item[0]) for item in LEXERS])
-STYLE_CHOICES = sorted([(item, item) for item in get_all_styles()])
+    def update_renders(self, renders: dict, streams: dict = None) -> None:
+        """
+        Replace the highlighted HTML of snippets, given as {pk: (highlighted, degraded)}, in bulk.
+            The token streams of their code, given as {pk: data}, are stored as well.
+        """
+        db = self._write_db()
+        blobs = Blob.objects.db_manager(db)
+        queryset = self.using(db)
+        streams = streams or {}
+        with transaction.atomic(using=db):
+            stored, packed = [], {}
+            for chunk in _chunked(list(renders)):
+                rows = queryset.filter(pk__in=chunk).values_list('pk', 'code_blob_id', 'language', 'render_blob_id')
+                for pk, code_digest, language, render_digest in rows:
+                    stored.append(render_digest)
+                    if streams.get(pk) is not None:
+                        packed[code_digest, language] = streams[pk]
+            TokenStream.objects.db_manager(db).store(packed)
+            digests = blobs.intern([highlighted for highlighted, _ in renders.values()], indexed=range(len(renders)))
+            queryset.bulk_update([
+                self.model(pk=pk, render_blob_id=digest, highlight_degraded=degraded)
+                for (pk, (_, degraded)), digest in zip(renders.items(), digests)
+            ], ['render_blob', 'highlight_degraded'])
+            blobs.adjust_refs(added=digests, removed=stored)
+            # Bulk updates send no signals.
+            SnippetChange.objects.db_manager(db).bulk_create([SnippetChange(snippet_id=pk) for pk in renders])
 
 
 class Snippet(models.Model):
-    """Snippet model"""
+    """
+    Snippet model
+        ```code``` and ```highlighted``` are properties reading the blobs, or the text assigned until saved.
+    """
     created = models.DateTimeField(auto_now_add=True)
     title = models.CharField(max_length=100, blank=True, default='')
-    code = models.TextField()
+    code_blob = models.ForeignKey(Blob, related_name='+', on_delete=models.PROTECT)
     linenos = models.BooleanField(default=False)
     language = models.CharField(choices=LANGUAGE_CHOICES, default='python', max_length=100)
     style = models.CharField(choices=STYLE_CHOICES, default='friendly', max_length=100)
 
     # Tutorial4: Add fields for authentication and highlighting HTML representation of the code.
-    owner = models.ForeignKey(User, related_name='snippets', on_delete=models.CASCADE)
-    highlighted = models.TextField()
+    # Indexed by 'snippet_owner_created_idx', which also serves the lookups of the foreign key.
+    owner = models.ForeignKey(User, related_name='snippets', on_delete=models.CASCADE, db_index=False)
+    render_blob = models.ForeignKey(Blob, related_name='+', on_delete=models.PROTECT)
+    # Set when the code exceeded the highlight limits and 'highlighted' holds plain escaped output.
+    highlight_degraded = models.BooleanField(default=False)
+
+    objects = SnippetQuerySet.as_manager()
 
     class Meta:
         ordering = ('created',)
+        # Indexes of the list filters (see ```filters.py```), each ending with the ordering column.
+        indexes = [
+            models.Index(fields=['created'], name='snippet_created_idx'),
+            models.Index(fields=['language', 'created'], name='snippet_language_created_idx'),
+            models.Index(fields=['style', 'created'], name='snippet_style_created_idx'),
+            models.Index(fields=['owner', 'created'], name='snippet_owner_created_idx'),
+            models.Index(fields=['created'], condition=~models.Q(title=''), name='snippet_titled_created_idx'),
+            models.Index(fields=['created'], condition=models.Q(title=''), name='snippet_untitled_created_idx'),
+        ]
+
+    @property
+    def code(self) -> str:
+        if '_code' in self.__dict__:
+            return self.__dict__['_code']
+        return self.code_blob.data if self.code_blob_id else ''
+
+    @code.setter
+    def code(self, value: str) -> None:
+        self.__dict__['_code'] = value
+
+    @property
+    def highlighted(self) -> str:
+        if '_highlighted' in self.__dict__:
+            return self.__dict__['_highlighted']
+        return self.render_blob.data if self.render_blob_id else ''
+
+    @highlighted.setter
+    def highlighted(self, value: str) -> None:
+        # Only kept by bulk_create(), save() renders the code itself.
+        self.__dict__['_highlighted'] = value
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        snippet = super().from_db(db, field_names, values)
+        # The blobs referenced by the stored row, whose references are released when the snippet changes them.
+        snippet._stored_blobs = (snippet.__dict__.get('code_blob_id'), snippet.__dict__.get('render_blob_id'))
+        return snippet
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.__dict__.pop('_code', None)
+        self.__dict__.pop('_highlighted', None)
+        super().refresh_from_db(*args, **kwargs)
+        self._stored_blobs = (self.code_blob_id, self.render_blob_id)
+
+    def highlight(self) -> tuple:
+        return highlight_snippet(
+            self.code, language=self.language, style=self.style, linenos=self.linenos, title=self.title)
+
+    def stored_tokens(self, code_digest: str):
+        """Return the lexed tokens of the code stored under ```code_digest```, or None if missing or stale."""
+        data = TokenStream.objects.filter(
+            code_blob_id=code_digest, language=self.language).values_list('data', flat=True).first()
+        return None if data is None else unpack_tokens(bytes(data), self.code)
+
+    def render_style(self, style: str) -> str:
+        """Return the highlighted HTML of the snippet in another style, see ```render_variant()```."""
+        return self.render_variant('html', style)
+
+    def render_variant(self, fmt: str, style: str = None) -> str:
+        """
+        Return the snippet rendered in a format of ```RENDER_FORMATS``` and a style, its own by default.
+            Variants are cached by content hash (see ```variants```). The stored token stream is formatted
+            without lexing again. Snippets saved before streams were stored are lexed once, and their stream stored.
+        """
+        style = style or self.style
+        if fmt == 'html' and (style == self.style or self.highlight_degraded):
+            return self.highlighted
+        key = (f'snippets:variant:{self.code_blob_id}:{self.language}:{fmt}:{style}:{int(self.linenos)}:'
+               f'{blob_digest(self.title)}')
+        return get_variant(key, lambda: self._render_variant(fmt, style))
+
+    def _render_variant(self, fmt: str, style: str) -> tuple:
+        """:return: (rendered variant, False if it fell back to plain output, which is not cached)"""
+        with highlight_slot():
+            if self.highlight_degraded:
+                return render_plain_format(self.code, fmt, self.title), False
+            tokens = self.stored_tokens(self.code_blob_id)
+            if tokens is None:
+                stream = lex_with_limits(self.code, self.language)
+                if stream is None:  # A timeout may not happen again.
+                    return render_plain_format(self.code, fmt, self.title), False
+                TokenStream.objects.store({(self.code_blob_id, self.language): stream})
+                tokens = unpack_tokens(stream, self.code)
+            return render_format(tokens, fmt, style, self.linenos, self.title), True
+
+    def iter_highlighted(self, size: int):
+        """
+        Yield the highlighted HTML in chunks of ```size``` characters, read as substrings of the render.
+            The first chunk is the head annotated by ```with_render_head()``` with the same size.
+        """
+        blobs = Blob.objects.using(self._state.db).filter(pk=self.render_blob_id)
+        chunk, position = self.render_head, 1
+        while chunk:
+            yield chunk
+            if len(chunk) < size:
+                return
+            position += size
+            chunk = blobs.values_list(Substr('data', position, size), flat=True).get()
+
+    def highlighted_lines(self, start: int, end: int) -> tuple:
+        """
+        Return the highlighted HTML of the lines ```start``` to ```end```, 1-based and inclusive.
+            The range is read as substrings of the render, located by the index entries annotated by
+            ```with_line_range()```. A render not indexed yet is sliced in memory and indexed for the next reads.
+            :return: (number of lines of the whole render, HTML document of the range)
+        """
+        header = getattr(self, 'line_header', None)
+        located = header is not None and range_pieces(*(
+            bytes(entry or b'') for entry in (header, self.line_first, self.line_last)), start, end)
+        if located:
+            lines, pieces = located
+            parts = Blob.objects.using(self._state.db).filter(pk=self.render_blob_id).values_list(*(
+                Substr('data', offset + 1, length) if length is not None else Substr('data', offset + 1)
+                for offset, length in pieces
+            )).get()
+            return lines, ''.join(parts)
+        highlighted = self.highlighted
+        if header is None:
+            Blob.objects.filter(pk=self.render_blob_id, line_index__isnull=True).update(
+                line_index=pack_line_index(highlighted))
+        return slice_lines(highlighted, start, end)
+
+    def find_render(self, code_digest: str):
+        """
+        Return the render digest of a stored snippet with this code and these options, or None.
+            Degraded renders are not reused, the limits they fell back on may have been transient, e.g. a timeout.
+        """
+        renders = Snippet.objects.filter(
+            code_blob_id=code_digest, language=self.language, style=self.style, linenos=self.linenos, title=self.title,
+            highlight_degraded=False,
+        ).order_by().values_list('render_blob_id', flat=True)[:1]
+        return next(iter(renders), None)
 
     def save(self, *args, **kwargs):
         """
         Use the 'pygments' library to create a highlighted HTML representation of the code snippet.
+        Falls back to plain escaped output when the code exceeds the size or time limits of its language.
+        Highlighting is skipped when a stored snippet has the same code and options, its render is shared,
+        unless it is degraded or collected by 'gc_blobs' before this save references it.
+        Otherwise lexing is skipped when the token stream of the code is stored, e.g. when only the style changed.
+        Code of ```STREAM_THRESHOLD``` characters or more is highlighted into a temporary file, stored in chunks.
+        """
+        if '_code' in self.__dict__ or not self.code_blob_id:
+            code_digest = blob_digest(self.code)
+        else:
+            code_digest = self.code_blob_id  # Unchanged code, not even loaded.
+        render = self.find_render(code_digest)
+        if render is not None:
+            try:
+                return self._save(code_digest, render, None, *args, **kwargs)
+            except RenderCollected:
+                pass
+        if len(self.code) >= get_highlight_config()['STREAM_THRESHOLD']:
+            with spool_path() as path:
+                return self._save(code_digest, None, path, *args, **kwargs)
+        return self._save(code_digest, None, None, *args, **kwargs)
+
+    def _save(self, code_digest: str, render, path, *args, **kwargs) -> None:
         """
-        lexer = get_lexer_by_name(self.language)
-        linenos = 'table' if self.linenos else False
-        options = {'title': self.title} if self.title else {}
-        formatter = HtmlFormatter(style=self.style, linenos=linenos, full=True, **options)
-        self.highlighted = highlight(self.code, lexer=lexer, formatter=formatter)
-        super().save(*args, **kwargs)
+        Highlight unless the ```render``` digest of another snippet is reused, and save.
+            :raise RenderCollected: The blobs of ```render``` are gone, nothing was saved.
+            :param path: File the document is written to and stored from in chunks, None to render it in memory.
+        """
+        highlighted = stream = None
+        if render is None:
+            tokens = self.stored_tokens(code_digest)
+            if tokens is not None:
+                highlighted = render_tokens(tokens, self.style, self.linenos, self.title, path)
+                self.highlight_degraded = False
+            else:
+                highlighted, self.highlight_degraded, stream = highlight_with_tokens(
+                    self.code, language=self.language, style=self.style, linenos=self.linenos, title=self.title,
+                    path=path)
+        else:
+            render_digest, self.highlight_degraded = render, False
+
+        db = kwargs.get('using') or router.db_for_write(Snippet, instance=self)
+        blobs = Blob.objects.db_manager(db)
+        with transaction.atomic(using=db):
+            if render is not None:
+                # Referenced first: once referenced, 'gc_blobs' can no longer delete them, but it may have since
+                # the lookup, if the snippets sharing them were deleted meanwhile.
+                if blobs.adjust_refs(added=(code_digest, render_digest)) < 2:
+                    raise RenderCollected
+            stored = getattr(self, '_stored_blobs', None)
+            if stored is None or None in stored:
+                stored = Snippet.objects.using(db).filter(pk=self.pk).values_list(
+                    'code_blob_id', 'render_blob_id').first() if self.pk else None
+            # Nothing to store for a reused render, the snippet using it references the same code.
+            if path is not None:
+                code_digest, = blobs.intern([self.code])
+                render_digest = blobs.intern_file(path, indexed=True)
+            elif highlighted is not None:
+                code_digest, render_digest = blobs.intern([self.code, highlighted], indexed=[1])
+            if stream is not None:
+                TokenStream.objects.db_manager(db).store({(code_digest, self.language): stream})
+            self.code_blob_id, self.render_blob_id = code_digest, render_digest
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'code_blob', 'render_blob', 'highlight_degraded'}
+            super().save(*args, **kwargs)
+            blobs.adjust_refs(added=(code_digest, render_digest) if render is None else (), removed=stored or ())
+            Revision.objects.db_manager(db).record(self)
+        self._stored_blobs = (code_digest, render_digest)
+        self.__dict__.pop('_highlighted', None)
+
+
+class RevisionManager(models.Manager):
+
+    def record(self, snippet: Snippet) -> 'Revision':
+        """
+        Record the saved state of the snippet as its next revision, in the transaction saving it.
+            The snippet row is locked first, so concurrent saves of a snippet number their revisions in turn.
+            Saves leaving the code unchanged, e.g. a new title, do not load it unless a keyframe is due.
+        """
+        list(Snippet.objects.db_manager(self.db).select_for_update().filter(pk=snippet.pk).values_list('pk'))
+        latest = self.filter(snippet=snippet).order_by('-number').values_list(
+            'number', 'code_digest', 'depth', 'size').first()
+        number, base, depth, size, encoded = 1, None, None, None, None
+        if latest is not None:
+            number, depth = latest[0] + 1, latest[2]
+            if latest[1] == snippet.code_blob_id:
+                # Unchanged code, e.g. a new title, makes an empty delta, or a keyframe when one is due.
+                size, encoded = latest[3], encode_unchanged(depth)
+            else:
+                # The previous code is still stored as a blob, unless it was collected since, e.g. when the history
+                # missed writes done in bulk.
+                base = Blob.objects.db_manager(self.db).filter(pk=latest[1]).values_list('data', flat=True).first()
+                if base is None:
+                    base = self.get_code(snippet.pk, latest[0])
+        data, depth = encoded or encode_revision(base, snippet.code, depth)
+        if size is None:
+            size = len(snippet.code.encode('utf-8'))
+        return self.create(
+            snippet=snippet, number=number, title=snippet.title, language=snippet.language, style=snippet.style,
+            linenos=snippet.linenos, code_digest=snippet.code_blob_id, size=size, depth=depth, data=data)
+
+    def chain(self, snippet_id: int, number: int):
+        """Revisions rebuilding the revision ```number```: from the keyframe it depends on up to itself."""
+        start = self.filter(snippet_id=snippet_id, number=number).values(first=F('number') - F('depth'))
+        return self.filter(snippet_id=snippet_id, number__gte=Subquery(start), number__lte=number).order_by('number')
+
+    def get_code(self, snippet_id: int, number: int) -> str:
+        """Return the code of a revision, None if there is no such revision."""
+        chain = list(self.chain(snippet_id, number).values_list('data', flat=True))
+        return rebuild(bytes(data) for data in chain) if chain else None
+
+    def get_with_code(self, snippet_id: int, number: int):
+        """Return the revision with its rebuilt ```code```, in a single query, or None."""
+        chain = list(self.chain(snippet_id, number))
+        if not chain:
+            return None
+        revision = chain[-1]
+        revision.code = rebuild(bytes(item.data) for item in chain)
+        return revision
+
+
+class Revision(models.Model):
+    """
+    A saved version of a snippet.
+        The code is stored as a keyframe or as a delta against the previous revision (see ```revisions.py```),
+        ```depth``` counts the deltas applied since the keyframe. Snippets inserted in bulk start their history
+        at their next save.
+    """
+    # Indexed by the unique constraint.
+    snippet = models.ForeignKey(Snippet, related_name='revisions', on_delete=models.CASCADE, db_index=False)
+    number = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+    title = models.CharField(max_length=100, blank=True, default='')
+    language = models.CharField(max_length=100)
+    style = models.CharField(max_length=100)
+    linenos = models.BooleanField(default=False)
+    code_digest = models.CharField(max_length=64)
+    # Size of the code in bytes, encoded as UTF-8.
+    size = models.PositiveIntegerField()
+    depth = models.PositiveSmallIntegerField(default=0)
+    data = models.BinaryField()
+
+    objects = RevisionManager()
+
+    class Meta:
+        ordering = ('number',)
+        constraints = [
+            models.UniqueConstraint(fields=['snippet', 'number'], name='revision_snippet_number_uniq'),
+        ]
+
+
+class SnippetChange(models.Model):
+    """
+    An entry of the snippet change feed: the snippet was saved, or deleted (a tombstone).
+        The primary key is the sequence number of the change, the cursor of ```/snippets/changes/```.
+        Recorded by signals, and by the bulk writes of ```SnippetQuerySet```. Raw SQL is missed.
+    """
+    # Not a foreign key, tombstones outlive their snippet.
+    snippet_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class ChangeWatermark(models.Model):
+    """
+    Highest sequence deleted from the change feed by the 'prune_changes' command, in a single row.
+        The oldest change left does not tell it: sequences may have gaps, e.g. values used up by rolled back
+        inserts on PostgreSQL or MySQL.
+    """
+    sequence = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get_sequence(cls) -> int:
+        """Return the highest pruned sequence, 0 when nothing was pruned."""
+        return cls.objects.filter(pk=1).values_list('sequence', flat=True).first() or 0
+
+    @classmethod
+    def advance(cls, sequence: int) -> None:
+        cls.objects.update_or_create(pk=1, defaults={'sequence': max(sequence, cls.get_sequence())})
+
+
+class RowCounter(models.Model):
+    """
+    Row count of a model, maintained by signals so that paginated lists need not run ```COUNT(*)```.
+        Bulk inserts and raw SQL send no signals, so the counts may drift until the next refresh
+        (see the 'refresh_row_counts' command).
+    """
+    label = models.CharField(max_length=100, unique=True)
+    count = models.BigIntegerField(default=0)
+    refreshed = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get_count(cls, model):
+        """Return the counted rows of ```model```, or None when it has never been counted."""
+        return cls.objects.filter(label=model._meta.label_lower).values_list('count', flat=True).first()
+
+    @classmethod
+    def add(cls, model, delta: int) -> None:
+        # A single UPDATE, so concurrent writes never lose an increment. Nothing is counted until the first refresh.
+        cls.objects.filter(label=model._meta.label_lower).update(count=F('count') + delta)
+
+    @classmethod
+    def refresh(cls, model, count: int = None) -> int:
+        """Store the exact row count of ```model```, counting it unless given."""
+        if count is None:
+            count = model._default_manager.count()
+        cls.objects.update_or_create(label=model._meta.label_lower, defaults={'count': count})
+        return count
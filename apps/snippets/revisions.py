@@ -0,0 +1,105 @@
+"""
+Delta compression of snippet revisions.
+    A revision stores its code either in full (a keyframe) or as a delta against the previous revision:
+    ranges of lines copied from the previous code and inserted text, packed as binary operations and
+    compressed with zlib. A keyframe is stored every ```KEYFRAME_INTERVAL``` revisions, and whenever the
+    delta would not be smaller, so rebuilding any revision applies a bounded number of deltas.
+"""
+
+import struct
+import zlib
+from difflib import SequenceMatcher
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    'KEYFRAME_INTERVAL': 16,
+}
+
+# Operations of a delta: copy (first line, line count) of the base, or insert (byte length) UTF-8 text.
+COPY, INSERT = 0, 1
+_COPY = struct.Struct('<BII')
+_INSERT = struct.Struct('<BI')
+
+
+def get_config() -> dict:
+    """Return the ```SNIPPET_REVISIONS``` setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'SNIPPET_REVISIONS', {})}
+
+
+def make_keyframe(code: str) -> bytes:
+    return zlib.compress(code.encode('utf-8'))
+
+
+def read_keyframe(data: bytes) -> str:
+    return zlib.decompress(data).decode('utf-8')
+
+
+def make_delta(base: str, code: str) -> bytes:
+    """Return the delta rebuilding ```code``` from ```base```. Empty when the code is unchanged."""
+    if base == code:
+        return b''
+    base_lines, lines = base.splitlines(keepends=True), code.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, base_lines, lines, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append(_COPY.pack(COPY, i1, i2 - i1))
+        elif j2 > j1:
+            text = ''.join(lines[j1:j2]).encode('utf-8')
+            ops.append(_INSERT.pack(INSERT, len(text)) + text)
+    return zlib.compress(b''.join(ops))
+
+
+def apply_delta(base: str, delta: bytes) -> str:
+    """Rebuild the code from ```base``` and a delta made by ```make_delta()```."""
+    if not delta:
+        return base
+    base_lines, data = base.splitlines(keepends=True), zlib.decompress(delta)
+    parts, offset = [], 0
+    while offset < len(data):
+        if data[offset] == COPY:
+            _, first, count = _COPY.unpack_from(data, offset)
+            parts.extend(base_lines[first:first + count])
+            offset += _COPY.size
+        else:
+            _, length = _INSERT.unpack_from(data, offset)
+            offset += _INSERT.size
+            parts.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+    return ''.join(parts)
+
+
+def encode_revision(base, code: str, depth: int) -> tuple:
+    """
+    Encode the code of a new revision.
+        :param base: Code of the previous revision, None if there is none.
+        :param depth: Deltas applied to rebuild the previous revision, None if there is none.
+        :return: (data, depth of the new revision), a keyframe has depth 0.
+    """
+    if base is not None and depth + 1 < get_config()['KEYFRAME_INTERVAL']:
+        delta = make_delta(base, code)
+        keyframe = make_keyframe(code)
+        if len(delta) < len(keyframe):
+            return delta, depth + 1
+        return keyframe, 0
+    return make_keyframe(code), 0
+
+
+def encode_unchanged(depth: int):
+    """
+    Encode a new revision with the code of the previous one, without the code: an empty delta.
+        :return: (data, depth of the new revision), None when a keyframe is due and the code must be encoded.
+    """
+    if depth + 1 < get_config()['KEYFRAME_INTERVAL']:
+        return b'', depth + 1
+    return None
+
+
+def rebuild(chain) -> str:
+    """Rebuild the code of the last of ```chain```, the data of revisions from a keyframe on, in order."""
+    chain = iter(chain)
+    code = read_keyframe(next(chain))
+    for delta in chain:
+        code = apply_delta(code, delta)
+    return code
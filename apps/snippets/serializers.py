@@ -5,8 +5,10 @@ Serializers of snippets app.
 from django.contrib.auth.models import User
 
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 
-from .models import Snippet
+from .detection import AUTO_LANGUAGE, detect_language
+from .models import Revision, Snippet, SnippetChange
 
 
 # Use HyperlinkedModelSerializer instead of ModelSerializer.
@@ -27,6 +29,17 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('url', 'id', 'username', 'snippets',)
 
 
+class LanguageField(serializers.ChoiceField):
+    """
+    A language of ```LANGUAGE_CHOICES```, or 'auto' to detect it from the code (see ```detection```).
+    """
+
+    def to_internal_value(self, data):
+        if data == AUTO_LANGUAGE:
+            return AUTO_LANGUAGE
+        return super().to_internal_value(data)
+
+
 class SnippetSerializer(serializers.HyperlinkedModelSerializer):
     """
     ```HyperlinkedModelSerializer``` has the following differences from ```ModelSerializer```.
@@ -40,79 +53,78 @@ class SnippetSerializer(serializers.HyperlinkedModelSerializer):
     # Because we've included format suffixed URLs such as '.json', we also need to indicate on the 'highlight' field
     # that any format suffixed hyperlinks it returns should use the '.html' suffix.
     highlight = serializers.HyperlinkedIdentityField(view_name='snippet-highlight', format='html')
+    # Declared, the code is a property of the model, stored in a shared blob.
+    code = serializers.CharField(style={'base_template': 'textarea.html'})
 
     class Meta:
         model = Snippet
-        fields = ('url', 'id', 'highlight', 'owner', 'title', 'code', 'linenos', 'language', 'style',)
+        fields = ('url', 'id', 'highlight', 'owner', 'title', 'code', 'linenos', 'language', 'style',
+                  'highlight_degraded',)
+        read_only_fields = ('highlight_degraded',)
+
+    def build_standard_field(self, field_name, model_field):
+        field_class, field_kwargs = super().build_standard_field(field_name, model_field)
+        if field_name == 'language':
+            field_class = LanguageField
+        return field_class, field_kwargs
+
+    def validate(self, attrs: dict) -> dict:
+        """Resolve 'language=auto' with the code and title of the request, or of the updated snippet."""
+        if attrs.get('language') == AUTO_LANGUAGE:
+            code = attrs['code'] if 'code' in attrs else self.instance.code
+            title = attrs['title'] if 'title' in attrs else getattr(self.instance, 'title', '')
+            attrs['language'] = detect_language(code, title)
+        return attrs
+
+
+class RevisionSerializer(serializers.ModelSerializer):
+    """
+    A version of a snippet, without its code. The ```url``` points to the 'snippet-revision' url pattern.
+    """
+    url = serializers.SerializerMethodField()
 
+    class Meta:
+        model = Revision
+        fields = ('url', 'number', 'created', 'title', 'language', 'style', 'linenos', 'size',)
 
-# Use ModelSerializer by default
+    def get_url(self, revision: Revision) -> str:
+        return reverse('snippet-revision', kwargs={'pk': revision.snippet_id, 'number': revision.number},
+                       request=self.context.get('request'))
 
 
-class DeprecatedUserSerializer(serializers.ModelSerializer):
+class RevisionDetailSerializer(RevisionSerializer):
     """
-    DEPRECATED!
-
-    User serializer. This is endpoints for User models.
-        'Snippets' is a reverse relationship on the User model, it will not be included by default
-        when using the ```ModelSerializer``` class, so we needed to add an explicit field for it.
+    A version of a snippet with its ```code```, rebuilt by ```RevisionManager.get_with_code()```.
     """
-    snippets = serializers.PrimaryKeyRelatedField(many=True, queryset=Snippet.objects.all())
+    code = serializers.CharField(read_only=True)
 
-    class Meta:
-        model = User
-        fields = ('id', 'username', 'snippets',)
+    class Meta(RevisionSerializer.Meta):
+        fields = RevisionSerializer.Meta.fields + ('code',)
 
 
-class DeprecatedSnippetSerializer(serializers.ModelSerializer):
+class SnippetChangeSerializer(serializers.ModelSerializer):
     """
-    DEPRECATED!
-
-    Snippet serializer
-        The create() and update() methods define how fully fledged instances
-        are created or modified when calling serializer.save()
+    An entry of the change feed, with the current state of the snippet unless it was deleted.
+        The saved snippets are loaded in bulk and passed as ```context['snippets']```, keyed by id.
     """
-    # 'Snippets' are associated with the user who created them(named by owner).
-    # The 'source' argument controls which attribute is used to populate a field,
-    # and can point at any attribute on the serialized instance.
-    # It can also take the dotted notation shown below, in which case it will traverse the given attributes,
-    # in a similar way as it is used with Django's template language.
-    owner = serializers.ReadOnlyField(source='owner.username')
+    sequence = serializers.IntegerField(source='pk', read_only=True)
+    snippet = serializers.SerializerMethodField()
 
     class Meta:
-        """
-        If this class is instance of ModelSerializer,
-        Set the code below.
-        """
-        model = Snippet
-        fields = ('id', 'title', 'code', 'linenos', 'language', 'style', 'owner',)
-
-    # id = serializers.IntegerField(read_only=True)
-    # title = serializers.CharField(required=False, allow_blank=True, max_length=100)
-    # code = serializers.CharField(style={'base_template': 'textarea.html'})
-    # linenos = serializers.BooleanField(required=False)
-    # language = serializers.ChoiceField(choices=LANGUAGE_CHOICES, default='python')
-    # style = serializers.ChoiceField(choices=STYLE_CHOICES, default='friendly')
-    #
-    # def create(self, validated_data):
-    #     """
-    #     Create and return a new 'Snippet' instance, given the validate data.
-    #         :param validated_data: Validated data from .is_valid() method.
-    #         :return: Created 'Snippet' instance.
-    #     """
-    #     return Snippet.objects.create(**validated_data)
-    #
-    # def update(self, instance, validated_data):
-    #     """
-    #     Update and return an existing 'Snippet' instance, given the validated data.
-    #         :param instance: 'Snippet' instance to update.
-    #         :param validated_data: Validated data from .is_valid() method.
-    #         :return: Updated 'Snippet' instance.
-    #     """
-    #     instance.title = validated_data.get('title', instance.title)
-    #     instance.code = validated_data.get('code', instance.code)
-    #     instance.linenos = validated_data.get('linenos', instance.linenos)
-    #     instance.language = validated_data.get('language', instance.language)
-    #     instance.style = validated_data.get('style', instance.style)
-    #     instance.save()
-    #     return instance
+        model = SnippetChange
+        fields = ('sequence', 'snippet_id', 'deleted', 'created', 'snippet',)
+
+    def get_snippet(self, change: SnippetChange):
+        snippet = None if change.deleted else self.context['snippets'].get(change.snippet_id)
+        return None if snippet is None else SnippetSerializer(snippet, context=self.context).data
+
+
+# DEPRECATED serializers are imported on first access only (PEP 562).
+DEPRECATED_SERIALIZERS = ('DeprecatedUserSerializer', 'DeprecatedSnippetSerializer')
+
+
+def __getattr__(name: str):
+    if name in DEPRECATED_SERIALIZERS:
+        from . import deprecated_serializers
+        return getattr(deprecated_serializers, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
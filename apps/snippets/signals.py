@@ -0,0 +1,49 @@
+"""
+Signal receivers of snippets app, connected in ```SnippetsConfig.ready()```.
+"""
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Blob, RowCounter, Snippet, SnippetChange
+
+
+@receiver(post_save, sender=Snippet, dispatch_uid='snippets_generation_snippet_save')
+@receiver(post_delete, sender=Snippet, dispatch_uid='snippets_generation_snippet_delete')
+@receiver(post_save, sender=User, dispatch_uid='snippets_generation_user_save')
+@receiver(post_delete, sender=User, dispatch_uid='snippets_generation_user_delete')
+def invalidate_snippet_lists(sender, update_fields=None, **kwargs) -> None:
+    # Logins only save 'last_login', which lists do not show.
+    if sender is User and update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    # Imported here, REST framework (imported by the caching module) imports pygments, which is not needed at startup.
+    from .caching import bump_generation
+
+    # Snippet lists show the owner's username, so user writes invalidate them too.
+    bump_generation()
+
+
+@receiver(post_save, sender=Snippet, dispatch_uid='snippets_row_count_snippet_save')
+@receiver(post_delete, sender=Snippet, dispatch_uid='snippets_row_count_snippet_delete')
+@receiver(post_save, sender=User, dispatch_uid='snippets_row_count_user_save')
+@receiver(post_delete, sender=User, dispatch_uid='snippets_row_count_user_delete')
+def count_rows(sender, created: bool = True, raw: bool = False, **kwargs) -> None:
+    # post_delete sends neither 'created' nor 'raw'. Fixtures (raw saves) are counted by a refresh.
+    if created and not raw:
+        RowCounter.add(sender, -1 if kwargs['signal'] is post_delete else 1)
+
+
+@receiver(post_delete, sender=Snippet, dispatch_uid='snippets_release_blobs')
+def release_blobs(sender, instance: Snippet, using: str, **kwargs) -> None:
+    # Unreferenced blobs are left to the 'gc_blobs' command, a concurrent save may reference them again.
+    Blob.objects.db_manager(using).adjust_refs(removed=(instance.code_blob_id, instance.render_blob_id))
+
+
+@receiver(post_save, sender=Snippet, dispatch_uid='snippets_change_feed_save')
+@receiver(post_delete, sender=Snippet, dispatch_uid='snippets_change_feed_delete')
+def record_change(sender, instance: Snippet, using: str, raw: bool = False, **kwargs) -> None:
+    # Sent within the transaction of the save or delete, so the change commits or rolls back with it.
+    if not raw:
+        SnippetChange.objects.using(using).create(
+            snippet_id=instance.pk, deleted=kwargs['signal'] is post_delete)
@@ -0,0 +1,13 @@
+"""
+URLConf for async view tests: the project's routes served the way ```SNIPPETS_ASYNC_READS``` serves them.
+"""
+
+from django.urls import path, include
+
+from apps.snippets.urls import async_urlpatterns
+
+
+urlpatterns = [
+    path('', include(async_urlpatterns)),
+    path('', include('drftutorial.urls')),
+]
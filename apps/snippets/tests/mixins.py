@@ -2,12 +2,42 @@
 Mixins for snippets app.
 """
 
+from unittest import mock
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
 
 from rest_framework.test import APIRequestFactory
 
-from apps.quickstart.tests.mixins import CreateTestUserMixin
+from apps.quickstart.tests.mixins import CreateTestUserMixin, QueryInspectMixin
+from apps.snippets import models
+from apps.snippets.highlighting import get_limits, highlight_with_tokens
 from apps.snippets.models import Snippet
+from apps.snippets.variants import local_variants
+
+
+# Highlighted fixtures of this test process, keyed by the highlight arguments and limits.
+_highlighted_fixtures = {}
+
+
+def highlight_fixture(code: str, language: str, style: str, linenos: bool = False, title: str = '',
+                      path: str = None) -> tuple:
+    """
+    ```highlight_with_tokens()``` memoized across the test cases of this process.
+        Most test cases save the same fixture snippets, they are highlighted once. Degraded output is not kept,
+        a time limit may not be hit again.
+    """
+    key = (code, language, style, linenos, title, get_limits(language))
+    result = _highlighted_fixtures.get(key)
+    if result is None:
+        result = highlight_with_tokens(code, language=language, style=style, linenos=linenos, title=title)
+        if not result[1]:
+            _highlighted_fixtures[key] = result
+    if path is not None:
+        with open(path, 'w', encoding='utf-8', newline='') as fp:
+            fp.write(result[0])
+        return (None, *result[1:])
+    return result
 
 
 class CreateTestSnippetMixin(CreateTestUserMixin):
@@ -18,23 +48,23 @@ class CreateTestSnippetMixin(CreateTestUserMixin):
     title = 'My test snippet 01'
     code = 'print("Hi, this is test code 01!!")'
 
-    def _create_test_snippet(self,
+    @classmethod
+    def _create_test_snippet(cls,
                              title: str = None,
                              code: str = None,
                              linenos: bool = None,
                              language: str = None,
                              style: str = None,
-                             owner: User = None):
+                             owner: User = None) -> Snippet:
         # Set target variable
-        target_title = title if title is not None else self.title
-        target_code = code if code is not None else self.code
+        target_title = title if title is not None else cls.title
+        target_code = code if code is not None else cls.code
         target_linenos = linenos if linenos is not None else False
         target_language = language if language is not None else 'python'
         target_style = style if style is not None else 'fruity'
 
         # Create test user if it doesn't exist and set it to owner field.
-        self._create_test_user()
-        target_owner = owner if owner is not None else User.objects.get(username=self.username)
+        target_owner = owner if owner is not None else cls._create_test_user()
 
         # Create new snippet
         snippet = Snippet(
@@ -46,22 +76,25 @@ class CreateTestSnippetMixin(CreateTestUserMixin):
             owner=target_owner,
         )
         # This action involves using 'pygments' package to make a 'highlighted' field
-        # that are HTML representation of the code snippet.
-        snippet.save()
+        # that are HTML representation of the code snippet, memoized by ```highlight_fixture()```.
+        with mock.patch.object(models, 'highlight_with_tokens', highlight_fixture):
+            snippet.save()
+        return snippet
 
 
-class APITestRequiredMixin(CreateTestUserMixin):
+class APITestRequiredMixin(QueryInspectMixin, CreateTestUserMixin):
     """
     Mixin for API testing.
     """
 
     def _set_required_config_to_api_call(self) -> None:
-        # Create test user if it doesn't exist.
-        self._create_test_user()
-
-        # Set authentication for REST API call
-        test_user = User.objects.get(username=self.username)
+        # Create test user if it doesn't exist, and set authentication for REST API call.
+        test_user = self._create_test_user()
         self.client.force_authenticate(user=test_user)
 
         # Set request factory
         self.factory = APIRequestFactory()
+
+        # Start with full throttle buckets, and without cached variants
+        cache.clear()
+        local_variants.clear()
@@ -2,13 +2,33 @@
 Test APIs in snippets app.
 """
 
+import asyncio
+import io
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
 from django.forms.models import model_to_dict
+from django.db import connection, connections
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
 
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase, APITransactionTestCase
 
-from apps.snippets.models import Snippet
+from apps.snippets.caching import GENERATION_KEY, bump_generation, cached_count, get_generation, list_cache_key
+from apps.snippets.changes import wait_slot
+from apps.snippets.models import Blob, ChangeWatermark, RowCounter, Snippet, SnippetChange
 from apps.snippets.serializers import UserSerializer, SnippetSerializer
+from apps.snippets.throttles import TokenBucketThrottle
+from drftutorial.pagination import ApproximateCountPaginator
+from drftutorial.querycheck import QueryInspector, QueryCheckFailed
+from drftutorial.routers import pin_to_primary
 from .mixins import CreateTestSnippetMixin, APITestRequiredMixin
 
 
@@ -19,8 +39,11 @@ class GetAndRetrieveSnippetTests(CreateTestSnippetMixin,
     Test APIs of snippets app: GET, RETRIEVE
     """
 
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls._create_test_snippet()
+
     def setUp(self) -> None:
-        self._create_test_snippet()
         self._set_required_config_to_api_call()
 
     def test_get_snippets(self) -> None:
@@ -57,8 +80,11 @@ class RetrieveHighlightedCodeTest(CreateTestSnippetMixin,
     Test APIs of snippets app: GET Highlighted
     """
 
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls._create_test_snippet()
+
     def setUp(self) -> None:
-        self._create_test_snippet()
         self._set_required_config_to_api_call()
 
     def test_highlighted_code(self) -> None:
@@ -71,6 +97,70 @@ class RetrieveHighlightedCodeTest(CreateTestSnippetMixin,
         self.assertIn('text/html', response.headers['Content-Type'])
         self.assertIn('<https://pygments.org/>', response.data)  # Check highlighted page source generated by Pygments
 
+    def test_highlighted_code_in_other_style(self) -> None:
+        snippet = Snippet.objects.filter(title__contains=self.title).first()
+        url = f'/snippets/{snippet.id}/highlight/'
+        response = self.client.get(url, {'style': 'monokai'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('#272822', response.data)
+        self.assertNotIn('#272822', snippet.highlighted)
+
+        response = self.client.get(url, {'style': 'no-such-style'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_large_highlighted_code_is_streamed(self) -> None:
+        snippet = Snippet.objects.filter(title__contains=self.title).first()
+        url = f'/snippets/{snippet.id}/highlight/'
+        with override_settings(SNIPPET_HIGHLIGHT={'STREAM_CHUNK_SIZE': 500}):
+            response = self.client.get(url)
+            self.assertTrue(response.streaming)
+            self.assertEqual(b''.join(response.streaming_content).decode(), snippet.highlighted)
+        self.assertEqual(int(response['Content-Length']), len(snippet.highlighted.encode('utf-8')))
+        self.assertIn('text/html', response['Content-Type'])
+
+        response = self.client.get(url)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.data, snippet.highlighted)
+
+    def test_highlighted_lines(self) -> None:
+        snippet = Snippet.objects.filter(title__contains=self.title).first()
+        url = f'/snippets/{snippet.id}/highlight/'
+        response = self.client.get(url, {'lines': '1-10'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Total-Lines'], '1')
+        self.assertEqual(response.data, snippet.highlighted)
+
+        response = self.client.get(url, {'lines': '2'})
+        self.assertNotIn('Hi, this is test code', response.data)
+        self.assertIn('<pre>', response.data)
+
+        response = self.client.get(url, {'lines': '1', 'style': 'monokai'})
+        self.assertIn('#272822', response.data)
+        self.assertEqual(response['X-Total-Lines'], '1')
+
+        for lines in ('0-1', '3-2', 'a-b', '1-'):
+            self.assertEqual(self.client.get(url, {'lines': lines}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_render_formats(self) -> None:
+        snippet = Snippet.objects.filter(title__contains=self.title).first()
+        url = f'/snippets/{snippet.id}/render/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content.decode(), snippet.highlighted)
+
+        response = self.client.get(url, {'fmt': 'terminal256', 'style': 'monokai'})
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('\x1b[38;5;', response.content.decode())
+        # The format is chosen by the query parameter, whatever the client accepts.
+        response = self.client.get(url, {'fmt': 'svg'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('image/svg+xml'))
+        self.assertIn('<svg', response.content.decode())
+        self.assertIn('\\documentclass', self.client.get(url, {'fmt': 'latex'}).content.decode())
+
+        for params in ({'fmt': 'pdf'}, {'fmt': 'latex', 'style': 'no-such-style'}):
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class CreateAndPutSnippetTests(CreateTestSnippetMixin,
                                APITestRequiredMixin,
@@ -79,8 +169,11 @@ class CreateAndPutSnippetTests(CreateTestSnippetMixin,
     Test APIs of snippets app: CREATE, PUT
     """
 
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls._create_test_snippet()
+
     def setUp(self) -> None:
-        self._create_test_snippet()
         self._set_required_config_to_api_call()
         self.new_data = {
             'title': 'My test snippet 02',
@@ -102,6 +195,23 @@ class CreateAndPutSnippetTests(CreateTestSnippetMixin,
         })
         self.assertEqual(response.data, serializer.data)
 
+    def test_create_snippet_with_detected_language(self) -> None:
+        response = self.client.post('/snippets/', data={
+            'title': 'main.go',
+            'code': 'package main\n\nfunc main() {}\n',
+            'language': 'auto',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['language'], 'go')
+
+        # Detected from the stored code when only the language changes.
+        snippet = Snippet.objects.get(id=response.data['id'])
+        response = self.client.patch(f'/snippets/{snippet.id}/', data={'title': 'x', 'language': 'auto'}, format='json')
+        self.assertEqual(response.data['language'], 'go')
+
+        response = self.client.post('/snippets/', data={**self.new_data, 'language': 'klingon'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_put_snippet(self) -> None:
         snippet = Snippet.objects.filter(title__contains=self.title).first()
         url = f'/snippets/{snippet.id}/'
@@ -130,6 +240,148 @@ class CreateAndPutSnippetTests(CreateTestSnippetMixin,
         self.assertIn('Modified</span>', highlighted_response.data)
 
 
+class SnippetRevisionTests(CreateTestSnippetMixin,
+                           APITestRequiredMixin,
+                           APITestCase):
+    """
+    Test APIs of snippets app: revisions
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.snippet = cls._create_test_snippet()
+
+    def setUp(self) -> None:
+        self._set_required_config_to_api_call()
+        for number in (2, 3):
+            self.client.patch(f'/snippets/{self.snippet.pk}/', data={'code': f'version = {number}'}, format='json')
+
+    def test_list_revisions(self) -> None:
+        response = self.client.get(f'/snippets/{self.snippet.pk}/revisions/', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([revision['number'] for revision in response.data['results']], [1, 2, 3])
+        self.assertNotIn('code', response.data['results'][0])
+        self.assertTrue(response.data['results'][0]['url'].endswith(f'/snippets/{self.snippet.pk}/revisions/1/'))
+
+    def test_retrieve_revision(self) -> None:
+        for number, code in ((1, self.code), (2, 'version = 2'), (3, 'version = 3')):
+            response = self.client.get(f'/snippets/{self.snippet.pk}/revisions/{number}/', format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['code'], code)
+
+        response = self.client.get(f'/snippets/{self.snippet.pk}/revisions/4/', format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ChangeFeedTests(CreateTestSnippetMixin,
+                      APITestRequiredMixin,
+                      APITestCase):
+    """
+    Test APIs of snippets app: change feed
+    """
+
+    url = '/snippets/changes/'
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.snippet = cls._create_test_snippet()
+
+    def setUp(self) -> None:
+        self._set_required_config_to_api_call()
+
+    def _feed(self, **params):
+        response = self.client.get(self.url, params, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_saves_and_tombstones_in_order(self) -> None:
+        self._create_test_snippet(title='Second')
+        second = Snippet.objects.get(title='Second').pk
+        self.snippet.title = 'Renamed'
+        self.snippet.save()
+        Snippet.objects.filter(pk=second).delete()
+
+        feed = self._feed()
+        self.assertEqual(feed['cursor'], SnippetChange.objects.latest('pk').pk)
+        self.assertFalse(feed['has_more'])
+        # One entry per snippet, the latest: the first snippet saved, then the second deleted.
+        self.assertEqual([(change['snippet_id'], change['deleted']) for change in feed['changes']],
+                         [(self.snippet.pk, False), (second, True)])
+        self.assertEqual(feed['changes'][0]['snippet']['title'], 'Renamed')
+        self.assertIsNone(feed['changes'][1]['snippet'])
+
+        self.assertEqual(self._feed(since=feed['cursor'])['changes'], [])
+
+    def test_limit_and_resume(self) -> None:
+        for number in range(3):
+            self._create_test_snippet(title=f'Snippet {number}')
+        first = self._feed(limit=2)
+        self.assertTrue(first['has_more'])
+        rest = self._feed(since=first['cursor'], limit=2)
+        self.assertFalse(rest['has_more'])
+        self.assertEqual(len(first['changes']) + len(rest['changes']), 4)
+
+    def test_long_poll_returns_on_write(self) -> None:
+        # Written without touching the cache, as by another process with its own.
+        def write(seconds):
+            SnippetChange.objects.create(snippet_id=self.snippet.pk)
+
+        cursor = self._feed()['cursor']
+        with mock.patch('apps.snippets.changes.time.sleep', side_effect=write) as sleep:
+            feed = self._feed(since=cursor, wait=5)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual([change['snippet_id'] for change in feed['changes']], [self.snippet.pk])
+
+    def test_long_poll_requires_login(self) -> None:
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self._feed()['changes'][0]['snippet_id'], self.snippet.pk)
+        response = self.client.get(self.url, {'wait': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(SNIPPET_CHANGES={'MAX_WAITING': 1, 'RETRY_AFTER': 3})
+    def test_waiting_requests_are_capped(self) -> None:
+        cursor = self._feed()['cursor']
+        with wait_slot():
+            response = self.client.get(self.url, {'since': cursor, 'wait': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '3')
+        with mock.patch('apps.snippets.changes.time.sleep'):
+            self.assertEqual(self._feed(since=cursor, wait=1)['changes'], [])
+
+    def test_bulk_inserts_are_recorded(self) -> None:
+        cursor = self._feed()['cursor']
+        created = Snippet.objects.bulk_create([
+            Snippet(code='x = 1', owner=self.snippet.owner, highlighted='x') for _ in range(2)])
+        feed = self._feed(since=cursor)
+        self.assertEqual(len(feed['changes']), 2)
+        self.assertEqual({change['snippet_id'] for change in feed['changes']},
+                         set(Snippet.objects.exclude(pk=self.snippet.pk).values_list('pk', flat=True)))
+        self.assertEqual(len(created), 2)
+
+    def test_invalid_parameters(self) -> None:
+        response = self.client.get(self.url, {'since': 'x', 'limit': 0, 'wait': 3600}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'since', 'limit', 'wait'})
+
+    def test_pruned_cursor_is_gone(self) -> None:
+        self._create_test_snippet(title='Second')
+        call_command('prune_changes', days=0, stdout=io.StringIO())
+        response = self.client.get(self.url, {'since': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(response.data['cursor'], SnippetChange.objects.latest('pk').pk)
+
+    def test_sequence_gap_is_not_gone(self) -> None:
+        for title in ('Second', 'Third'):
+            self._create_test_snippet(title=title)
+        first, second, third = SnippetChange.objects.order_by('pk').values_list('pk', flat=True)
+        ChangeWatermark.advance(first)
+        SnippetChange.objects.filter(pk=second).delete()  # A sequence value used up by a rolled back insert.
+        self.assertEqual([change['sequence'] for change in self._feed(since=first)['changes']], [third])
+        response = self.client.get(self.url, {'since': first - 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+
 class DeleteSnippetTest(CreateTestSnippetMixin,
                         APITestRequiredMixin,
                         APITestCase):
@@ -137,8 +389,11 @@ class DeleteSnippetTest(CreateTestSnippetMixin,
     Test APIs of snippets app: DELETE
     """
 
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls._create_test_snippet()
+
     def setUp(self) -> None:
-        self._create_test_snippet()
         self._set_required_config_to_api_call()
 
     def test_delete_snippet(self) -> None:
@@ -149,3 +404,398 @@ class DeleteSnippetTest(CreateTestSnippetMixin,
         # Response and Result check
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(self.client.get(url, format='json').status_code, status.HTTP_404_NOT_FOUND)
+
+
+def throttle_rates(user: str = None, ip: str = None) -> dict:
+    return {'REST_FRAMEWORK': {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+        'snippet-write-user': user, 'snippet-write-ip': ip}}}
+
+
+class ThrottleTests(CreateTestSnippetMixin,
+                    APITestRequiredMixin,
+                    APITestCase):
+    """
+    Test APIs of snippets app: write rate limits and highlight capacity
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.url = f'/snippets/{cls._create_test_snippet().pk}/'
+
+    def setUp(self) -> None:
+        self._set_required_config_to_api_call()
+
+    def _create(self):
+        return self.client.post('/snippets/', data={'code': 'print(1)'}, format='json')
+
+    @override_settings(**throttle_rates(user='2/min'))
+    def test_user_write_rate(self) -> None:
+        self.assertEqual(self._create().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.patch(self.url, data={'title': 'x'}, format='json').status_code,
+                         status.HTTP_200_OK)
+        response = self._create()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+
+        # Reads and deletes are not throttled.
+        self.assertEqual(self.client.get(self.url, format='json').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.delete(self.url).status_code, status.HTTP_204_NO_CONTENT)
+
+    @override_settings(**throttle_rates(ip='1/min'))
+    def test_ip_write_rate(self) -> None:
+        self.assertEqual(self._create().status_code, status.HTTP_201_CREATED)
+        self.client.force_authenticate(user=User.objects.create(username='other'))
+        self.assertEqual(self._create().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(**throttle_rates(user='60/min'))
+    def test_bucket_refills(self) -> None:
+        with mock.patch.object(TokenBucketThrottle, 'timer', return_value=1000.0):
+            for _ in range(60):
+                self.assertEqual(self._create().status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self._create().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        with mock.patch.object(TokenBucketThrottle, 'timer', return_value=1001.0):
+            self.assertEqual(self._create().status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self._create().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_highlight_capacity(self) -> None:
+        with self.settings(SNIPPET_HIGHLIGHT={**settings.SNIPPET_HIGHLIGHT, 'MAX_IN_FLIGHT': 0}):
+            response = self._create()
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '1')
+            self.assertEqual(response.data['detail'].code, 'highlight_busy')
+            self.assertEqual(self.client.get('/snippets/', format='json').status_code, status.HTTP_200_OK)
+        self.assertEqual(Snippet.objects.count(), 1)
+
+
+class ListCacheTests(CreateTestSnippetMixin,
+                     APITestRequiredMixin,
+                     APITestCase):
+    """
+    Test APIs of snippets app: cached list pages and counts, invalidated by the snippets generation
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        for i in range(12):
+            cls._create_test_snippet(title=f'Cached snippet {i}')
+
+    def setUp(self) -> None:
+        self._set_required_config_to_api_call()
+
+    def _snippet_queries(self, url: str) -> list:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in context.captured_queries if 'snippets_snippet' in query['sql']]
+
+    def test_pages_and_counts_are_cached(self) -> None:
+        # Exact counts, the unfiltered list is otherwise counted by the row counter.
+        self.assertEqual(len(self._snippet_queries('/snippets/?exact_count=1')), 2)  # COUNT and page
+        self.assertEqual(self._snippet_queries('/snippets/?page=1&exact_count=1'), [])
+        # Another page runs its own query, but shares the count.
+        self.assertEqual(len(self._snippet_queries('/snippets/?page=2&exact_count=1')), 1)
+        self.assertEqual(len(self._snippet_queries('/snippets/')), 1)  # Page only
+
+    def test_writes_invalidate(self) -> None:
+        self.assertEqual(self.client.get('/snippets/', format='json').data['count'], 12)
+        response = self.client.post('/snippets/', data={'code': 'print(1)'}, format='json')
+        self.assertEqual(self.client.get('/snippets/', format='json').data['count'], 13)
+
+        self.client.delete(f'/snippets/{response.data["id"]}/')
+        self.assertEqual(self.client.get('/snippets/', format='json').data['count'], 12)
+
+        # Writes outside the API and to the owners too.
+        User.objects.filter(username=self.username).update(username='renamed')
+        User.objects.get(username='renamed').save()
+        self.assertEqual(self.client.get('/snippets/', format='json').data['results'][0]['owner'], 'renamed')
+
+    def test_logins_do_not_invalidate(self) -> None:
+        key = list_cache_key(Request(APIRequestFactory().get('/snippets/')))
+        self.assertTrue(self.client.login(username=self.username, password=self.password))
+        self.assertEqual(list_cache_key(Request(APIRequestFactory().get('/snippets/'))), key)
+
+    def test_cache_key_normalization(self) -> None:
+        def key(url: str) -> str:
+            return list_cache_key(Request(APIRequestFactory().get(url)))
+
+        self.assertEqual(key('/snippets/'), key('/snippets/?page=1&format=json&language='))
+        self.assertEqual(key('/snippets/?a=1&b=2&page=2'), key('/snippets/?page=2&b=2&a=1'))
+        self.assertNotEqual(key('/snippets/'), key('/snippets/?page=2'))
+        generation = key('/snippets/')
+        bump_generation()
+        self.assertNotEqual(key('/snippets/'), generation)
+
+
+class ApproximateCountTests(CreateTestSnippetMixin,
+                            APITestRequiredMixin,
+                            APITestCase):
+    """
+    Test APIs of snippets app: approximate counts of unfiltered lists, from the row counter
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        for i in range(3):
+            cls._create_test_snippet(title=f'Counted snippet {i}')
+
+    def setUp(self) -> None:
+        self._set_required_config_to_api_call()
+
+    def _count(self, url: str) -> tuple:
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['count'], response.data['count_is_exact']
+
+    def test_counter_is_maintained(self) -> None:
+        # Created by the migration, then counted by signals.
+        self.assertEqual(RowCounter.get_count(Snippet), 3)
+        self.assertEqual(self._count('/snippets/'), (3, False))
+
+        response = self.client.post('/snippets/', data={'code': 'print(1)'}, format='json')
+        self.assertEqual(self._count('/snippets/'), (4, False))
+        self.client.delete(f'/snippets/{response.data["id"]}/')
+        self.assertEqual(self._count('/snippets/'), (3, False))
+
+    def test_missing_counter_is_exact(self) -> None:
+        RowCounter.objects.all().delete()
+        self.assertEqual(self._count('/snippets/'), (3, True))
+
+    def test_exact_count_opt_in(self) -> None:
+        RowCounter.refresh(Snippet, 1000)
+        bump_generation()
+        self.assertEqual(self._count('/snippets/'), (1000, False))
+        self.assertEqual(self._count('/snippets/?exact_count=1'), (3, True))
+
+    def test_counter_skips_rows_without_signals_until_refresh(self) -> None:
+        owner = User.objects.get(username=self.username)
+        Snippet.objects.bulk_create([Snippet(code='x', owner=owner, highlighted='x') for _ in range(2)])
+        bump_generation()
+        self.assertEqual(self._count('/snippets/'), (3, False))
+
+        call_command('refresh_row_counts', stdout=io.StringIO())
+        self.assertEqual(self._count('/snippets/'), (5, False))
+        self.assertEqual(RowCounter.get_count(User), User.objects.count())
+
+    def test_filtered_lists_are_exact(self) -> None:
+        RowCounter.refresh(Snippet, 1000)
+        paginator = ApproximateCountPaginator(Snippet.objects.filter(title__endswith='1'), 10)
+        self.assertEqual(paginator.count, 1)
+        self.assertTrue(paginator.count_is_exact)
+
+    def test_quickstart_users(self) -> None:
+        count, exact = self._count('/quickstart/users/')
+        self.assertEqual((count, exact), (User.objects.count(), False))
+
+
+class FilterTests(CreateTestSnippetMixin,
+                  APITestRequiredMixin,
+                  APITestCase):
+    """
+    Test APIs of snippets app: list filters
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls._create_test_snippet(title='Python', language='python', style='monokai')
+        cls._create_test_snippet(title='', language='sql', style='monokai')
+        other = User.objects.create_user(username='other', password='other-password')
+        cls._create_test_snippet(title='Other', language='python', style='friendly', owner=other)
+        Snippet.objects.filter(title='Python').update(created='2022-01-01T00:00:00Z')
+
+    def setUp(self) -> None:
+        self._set_required_config_to_api_call()
+
+    def _titles(self, query: str) -> list:
+        response = self.client.get(f'/snippets/?{query}', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return sorted(snippet['title'] for snippet in response.data['results'])
+
+    def test_filters(self) -> None:
+        self.assertEqual(self._titles('language=python'), ['Other', 'Python'])
+        self.assertEqual(self._titles('style=monokai'), ['', 'Python'])
+        self.assertEqual(self._titles('owner=other'), ['Other'])
+        self.assertEqual(self._titles('created_before=2022-01-02'), ['Python'])
+        self.assertEqual(self._titles('created_after=2022-01-01T00:00:01Z'), ['', 'Other'])
+        self.assertEqual(self._titles('has_title=false'), [''])
+        self.assertEqual(self._titles('has_title=true&language=python&owner=other'), ['Other'])
+        self.assertEqual(self._titles('language=&style='), ['', 'Other', 'Python'])
+
+    def test_filtered_counts_are_exact(self) -> None:
+        response = self.client.get('/snippets/?language=python', format='json')
+        self.assertEqual((response.data['count'], response.data['count_is_exact']), (2, True))
+
+    def test_invalid_values(self) -> None:
+        response = self.client.get('/snippets/?language=nope&created_after=yesterday&has_title=maybe', format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'language', 'created_after', 'has_title'})
+
+    def test_detail_ignores_filters(self) -> None:
+        snippet = Snippet.objects.get(title='Other')
+        response = self.client.get(f'/snippets/{snippet.pk}/?language=sql', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class QueryInspectionTests(CreateTestSnippetMixin,
+                           APITestRequiredMixin,
+                           APITestCase):
+    """
+    Test APIs of snippets app: N+1 patterns and query budgets
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        for i in range(6):
+            cls._create_test_snippet(title=f'{cls.title} - {i}')
+
+    def setUp(self) -> None:
+        self._set_required_config_to_api_call()
+
+    def test_list_queries_do_not_grow_per_row(self) -> None:
+        for url in ('/snippets/', '/user-snippets/', '/quickstart/users/'):
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_inspector_detects_per_row_queries(self) -> None:
+        inspector = QueryInspector(label='serializer without select_related of the owner')
+        with inspector.watch():
+            SnippetSerializer(
+                Snippet.objects.select_related('code_blob'), many=True,
+                context={'request': self.factory.get('/snippets/')}).data
+
+        self.assertEqual([kind for kind, _, _ in inspector.problems], ['N+1'])
+        with self.assertRaises(QueryCheckFailed):
+            inspector.check(raise_exception=True)
+
+    def test_inspector_detects_budget_overrun(self) -> None:
+        inspector = QueryInspector(budget=1)
+        with inspector.watch():
+            list(Snippet.objects.all())
+            list(Snippet.objects.all())
+
+        self.assertEqual([kind for kind, _, _ in inspector.problems], ['budget'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(CreateTestSnippetMixin,
+                          APITestRequiredMixin,
+                          APITransactionTestCase):
+    """
+    Test APIs of snippets app: reads from a lagging replica, read-your-writes on the primary
+        Reads inside a transaction stay on the primary, so this can't run in a ```TestCase``` transaction.
+    """
+
+    databases = {'default', 'replica'}
+
+    def setUp(self) -> None:
+        with pin_to_primary():
+            self._create_test_snippet()
+            self._set_required_config_to_api_call()
+
+    def _replicate(self) -> None:
+        """Simulate the replica catching up with the primary."""
+        for model in (User, Blob, Snippet):
+            replicated = list(model.objects.using('replica').values_list('pk', flat=True))
+            model.objects.using('replica').bulk_create(model.objects.using('default').exclude(pk__in=replicated))
+        bump_generation()  # As sync_replica does.
+
+    def test_reads_are_served_by_replica(self) -> None:
+        url = f'/snippets/{Snippet.objects.using("default").get().pk}/'
+        self.assertEqual(self.client.get(url, format='json').status_code, status.HTTP_404_NOT_FOUND)  # Not replicated.
+        self._replicate()
+        self.assertEqual(self.client.get(url, format='json').status_code, status.HTTP_200_OK)
+
+        with override_settings(SNIPPET_LIST_CACHE={'ENABLED': False}):
+            self.assertEqual(self.client.get('/snippets/', format='json').json()['count'], 1)
+
+    def test_cached_lists_are_filled_from_replica(self) -> None:
+        self._replicate()
+        self.assertEqual(APIClient().get('/snippets/?exact_count=1', format='json').json()['count'], 1)
+        self.client.post('/snippets/?exact_count=1', data={'code': 'print(1)'}, format='json')
+
+        # Other clients fill the new generation from the lagging replica, the pinned writer from the primary.
+        with CaptureQueriesContext(connections['replica']) as context:
+            self.assertEqual(APIClient().get('/snippets/?exact_count=1', format='json').json()['count'], 1)
+        self.assertTrue(context.captured_queries)
+        self.assertEqual(self.client.get('/snippets/?exact_count=1', format='json').json()['count'], 2)
+        self.assertEqual(APIClient().get('/snippets/?exact_count=1', format='json').json()['count'], 1)
+
+        self._replicate()
+        self.assertEqual(APIClient().get('/snippets/?exact_count=1', format='json').json()['count'], 2)
+
+    def test_reads_across_a_bump_are_not_cached(self) -> None:
+        generation = get_generation()
+
+        def counter() -> int:
+            bump_generation()  # e.g. by 'sync_replica' while the replica is read.
+            return 1
+
+        self.assertEqual(cached_count('bumped', counter), 1)
+        cache.set(GENERATION_KEY, generation, None)
+        self.assertEqual(cached_count('bumped', lambda: 2), 2)
+
+    def test_read_your_writes(self) -> None:
+        self._replicate()
+        response = self.client.post('/snippets/', data={'code': 'print(1)'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url = f'/snippets/{response.data["id"]}/'
+
+        # The writer is pinned to the primary, other clients read from the lagging replica.
+        self.assertEqual(self.client.get(url, format='json').status_code, status.HTTP_200_OK)
+        self.assertEqual(APIClient().get(url, format='json').status_code, status.HTTP_404_NOT_FOUND)
+
+        self._replicate()
+        self.assertEqual(APIClient().get(url, format='json').status_code, status.HTTP_200_OK)
+
+
+@override_settings(ROOT_URLCONF='apps.snippets.tests.async_urls')
+class AsyncReadTests(CreateTestSnippetMixin,
+                     APITestRequiredMixin,
+                     APITransactionTestCase):
+    """
+    Test APIs of snippets app: coroutine views served under ASGI
+        Reads run in executor threads on their own connections, so this can't run in a ```TestCase``` transaction.
+    """
+
+    def setUp(self) -> None:
+        for i in range(3):
+            self._create_test_snippet(title=f'Async snippet {i}')
+        self._set_required_config_to_api_call()
+        self.async_client = AsyncClient()
+        self.async_client.force_login(User.objects.get(username=self.username))
+        self.pk = Snippet.objects.get(title='Async snippet 0').pk
+
+    def test_snippet_routes_are_coroutines(self) -> None:
+        for url in ('/snippets/', '/snippets/1/', '/snippets/1/highlight/'):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func), url)
+        # Routes with a format suffix fall through to the router.
+        self.assertFalse(asyncio.iscoroutinefunction(resolve('/snippets.json').func))
+
+    async def test_concurrent_reads(self) -> None:
+        responses = await asyncio.gather(*(
+            self.async_client.get(url, HTTP_ACCEPT='application/json')
+            for url in ('/snippets/', f'/snippets/{self.pk}/')
+        ))
+        for response in responses:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responses[0].json()['count'], 3)
+        self.assertEqual(responses[1].json()['title'], 'Async snippet 0')
+
+    async def test_highlight(self) -> None:
+        response = await self.async_client.get(f'/snippets/{self.pk}/highlight/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'<span', response.content)
+
+    async def test_large_highlight_is_not_streamed(self) -> None:
+        with override_settings(SNIPPET_HIGHLIGHT={'STREAM_CHUNK_SIZE': 500}):
+            response = await self.async_client.get(f'/snippets/{self.pk}/highlight/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.streaming)
+        highlighted = await sync_to_async(lambda: Snippet.objects.get(pk=self.pk).highlighted)()
+        self.assertEqual(response.content.decode(), highlighted)
+
+    async def test_write_is_delegated(self) -> None:
+        response = await self.async_client.post(
+            '/snippets/', data={'code': 'print(1)'}, content_type='application/json', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = await self.async_client.delete(f'/snippets/{response.json()["id"]}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
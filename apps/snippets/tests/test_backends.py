@@ -0,0 +1,48 @@
+"""
+Test the SQLite database backend of the project.
+"""
+
+import copy
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.test import SimpleTestCase
+
+from drftutorial.backends.sqlite3.base import DatabaseWrapper
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    """
+    Test the PRAGMAs applied by ```drftutorial.backends.sqlite3``` to new connections.
+    """
+
+    def _wrapper(self, name: str, pragmas: dict) -> DatabaseWrapper:
+        settings_dict = copy.deepcopy(connections['default'].settings_dict)
+        settings_dict.update(NAME=name, OPTIONS={'pragmas': pragmas})
+        return DatabaseWrapper(settings_dict, alias='pragmas')
+
+    def test_pragmas_are_applied_to_new_connections(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self._wrapper(os.path.join(directory, 'db.sqlite3'), {'busy_timeout': 1234})
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], 1234)
+                    cursor.execute('PRAGMA synchronous')
+                    self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            finally:
+                wrapper.close()
+
+    def test_invalid_pragmas_are_rejected(self) -> None:
+        for pragmas in ({'journal-mode': 'WAL'}, {'busy_timeout': '1; DROP TABLE auth_user'}, {'cache_size': ''}):
+            with self.subTest(pragmas=pragmas), self.assertRaises(ImproperlyConfigured):
+                self._wrapper(':memory:', pragmas).get_connection_params()
+
+    def test_unknown_pragmas_are_rejected(self) -> None:
+        wrapper = self._wrapper(':memory:', {'jornal_mode': 'WAL'})
+        with self.assertRaisesMessage(ImproperlyConfigured, 'Unknown SQLite PRAGMA: jornal_mode'):
+            wrapper.ensure_connection()
@@ -0,0 +1,249 @@
+"""
+Test management commands in snippets app.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.snippets.benchmarks import fit_power_law, parse_importtime
+from apps.snippets.highlighting import render_highlighted
+from apps.snippets.models import Blob, ChangeWatermark, Snippet, SnippetChange
+from .mixins import CreateTestSnippetMixin
+
+
+class SeedAndBenchmarkTests(TestCase):
+    """
+    Test ```seed_snippets``` and ```bench_api``` commands.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        call_command('seed_snippets', users=2, snippets=3, languages='python:1,sql:1', stdout=StringIO())
+
+    def test_seed_snippets(self) -> None:
+        self.assertEqual(User.objects.filter(username__startswith='seed-user-').count(), 2)
+        self.assertEqual(Snippet.objects.count(), 6)
+        self.assertEqual(set(Snippet.objects.values_list('language', flat=True)) - {'python', 'sql'}, set())
+        self.assertTrue(all(Snippet.objects.values_list('render_blob__data', flat=True)))
+
+    def test_seed_snippets_is_reproducible(self) -> None:
+        codes = list(Snippet.objects.order_by('id').values_list('code_blob__data', flat=True))
+        call_command('seed_snippets', users=2, snippets=3, languages='python:1,sql:1', clear=True, stdout=StringIO())
+        self.assertEqual(list(Snippet.objects.order_by('id').values_list('code_blob__data', flat=True)), codes)
+
+    def test_seed_snippets_rejects_unknown_language(self) -> None:
+        with self.assertRaises(CommandError):
+            call_command('seed_snippets', languages='no-such-language:1', stdout=StringIO())
+
+    def test_bench_api_report_and_baseline(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command('bench_api', requests=3, warmup=0, output=path, stdout=StringIO())
+            with open(path) as fp:
+                report = json.load(fp)
+
+            self.assertEqual(report['endpoints']['snippet-detail']['requests'], 3)
+            self.assertGreater(report['endpoints']['snippet-list']['queries_per_request'], 0)
+
+            # A baseline with fewer queries per request turns the current run into a regression.
+            report['endpoints']['snippet-list']['queries_per_request'] = 0
+            with open(path, 'w') as fp:
+                json.dump(report, fp)
+            with self.assertRaises(CommandError):
+                call_command('bench_api', requests=3, warmup=0, baseline=path, tolerance=100,
+                             stdout=StringIO(), stderr=StringIO())
+
+
+class HighlightBenchmarkTests(TestCase):
+    """
+    Test ```bench_highlight``` command.
+    """
+
+    def test_cost_table(self) -> None:
+        stdout = StringIO()
+        call_command('bench_highlight', languages='python,sql', sizes='1,2', repeat=1, stdout=stdout)
+        table = json.loads(stdout.getvalue())['languages']
+
+        self.assertEqual(set(table), {'python', 'sql'})
+        # 2 sizes x (linenos False, True)
+        self.assertEqual(len(table['python']['measurements']), 4)
+        self.assertGreater(table['python']['output_ratio'], 1)
+
+    def test_failing_lexer_is_marked(self) -> None:
+        def render(code, language, **kwargs):
+            if language == 'sql':
+                raise RuntimeError('broken lexer')
+            return render_highlighted(code, language=language, **kwargs)
+
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch('apps.snippets.management.commands.bench_highlight.render_highlighted', side_effect=render):
+            call_command('bench_highlight', languages='python,sql', sizes='1', repeat=1, stdout=stdout, stderr=stderr)
+        table = json.loads(stdout.getvalue())['languages']
+
+        self.assertEqual(table['sql'], {'failed': True, 'measurements': []})
+        self.assertEqual(len(table['python']['measurements']), 2)
+        self.assertIn('broken lexer', stderr.getvalue())
+
+    def test_fit_power_law_flags_quadratic_cost(self) -> None:
+        sizes = [1024, 4096, 16384]
+        _, linear = fit_power_law(sizes, [size * 1e-6 for size in sizes])
+        _, quadratic = fit_power_law(sizes, [size ** 2 * 1e-9 for size in sizes])
+
+        self.assertAlmostEqual(linear, 1.0)
+        self.assertAlmostEqual(quadratic, 2.0)
+
+
+class RevisionBenchmarkTests(TestCase):
+    """
+    Test ```bench_revisions``` command.
+    """
+
+    def test_deltas_are_smaller_than_full_copies(self) -> None:
+        stdout = StringIO()
+        call_command('bench_revisions', size=2, versions=20, intervals='1,8', stdout=stdout, stderr=StringIO())
+        report = json.loads(stdout.getvalue())
+
+        self.assertEqual(report['intervals']['1']['stored_bytes'], report['full_copies']['stored_bytes'])
+        self.assertEqual(report['intervals']['8']['keyframes'], 3)
+        self.assertLess(report['intervals']['8']['ratio_to_full_copies'], 0.5)
+
+
+class BulkCreateBenchmarkTests(CreateTestSnippetMixin, TestCase):
+    """
+    Test ```bench_bulk_create``` command.
+    """
+
+    def test_saves_are_rolled_back(self) -> None:
+        self._create_test_user()
+        stdout = StringIO()
+        call_command('bench_bulk_create', snippets=4, lines=3, stdout=stdout, stderr=StringIO())
+        report = json.loads(stdout.getvalue())
+
+        self.assertEqual(report['fresh']['requests'], 4)
+        self.assertEqual(report['shared']['requests'], 4)
+        self.assertEqual(Snippet.objects.count(), 0)
+
+
+class RehighlightTests(CreateTestSnippetMixin, TestCase):
+    """
+    Test ```rehighlight``` command.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls._create_test_snippet(language='python')
+        cls._create_test_snippet(title='SQL snippet', code='SELECT 1;', language='sql')
+        # Simulate stale output, e.g. after a Pygments upgrade.
+        Snippet.objects.update_renders({pk: ('stale', False) for pk in Snippet.objects.values_list('pk', flat=True)})
+
+    def test_rehighlight_with_filter(self) -> None:
+        call_command('rehighlight', language='sql', workers=1, stdout=StringIO())
+
+        self.assertEqual(Snippet.objects.get(language='python').highlighted, 'stale')
+        self.assertIn('SELECT', Snippet.objects.get(language='sql').highlighted)
+
+    def test_rehighlight_resumes_from_checkpoint(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, 'rehighlight.json')
+            first, second = Snippet.objects.order_by('pk')
+            with open(checkpoint, 'w') as fp:
+                json.dump({'last_pk': first.pk, 'filters': {'language': None, 'style': None, 'since': None}}, fp)
+
+            call_command('rehighlight', checkpoint=checkpoint, workers=1, chunk_size=1, stdout=StringIO())
+
+            self.assertEqual(Snippet.objects.get(pk=first.pk).highlighted, 'stale')
+            self.assertIn('SELECT', Snippet.objects.get(pk=second.pk).highlighted)
+            with open(checkpoint) as fp:
+                self.assertEqual(json.load(fp)['last_pk'], second.pk)
+
+            with self.assertRaises(CommandError):
+                call_command('rehighlight', checkpoint=checkpoint, language='sql', stdout=StringIO())
+
+    @override_settings(SNIPPET_HIGHLIGHT={'MAX_CODE_SIZE': 5})
+    def test_rehighlight_applies_size_limit(self) -> None:
+        call_command('rehighlight', workers=1, stdout=StringIO())
+        self.assertTrue(all(Snippet.objects.values_list('highlight_degraded', flat=True)))
+
+
+class GcBlobsTests(CreateTestSnippetMixin, TestCase):
+    """
+    Test ```gc_blobs``` command.
+    """
+
+    def setUp(self) -> None:
+        self._create_test_snippet()
+        self._create_test_snippet(code='print("deleted")')
+        Snippet.objects.get(code_blob__data='print("deleted")').delete()
+
+    def test_gc_blobs(self) -> None:
+        call_command('gc_blobs', dry_run=True, stdout=StringIO())
+        self.assertEqual(Blob.objects.count(), 4)
+
+        out = StringIO()
+        call_command('gc_blobs', batch_size=1, stdout=out)
+        self.assertIn('Deleted 2 blobs', out.getvalue())
+        snippet = Snippet.objects.get()
+        self.assertEqual(set(Blob.objects.values_list('pk', flat=True)), {snippet.code_blob_id, snippet.render_blob_id})
+
+    def test_recount(self) -> None:
+        Blob.objects.update(refs=0)  # Drifted, e.g. by raw SQL.
+        call_command('gc_blobs', recount=True, stdout=StringIO())
+        self.assertEqual(Blob.objects.count(), 2)
+        self.assertEqual(set(Blob.objects.values_list('refs', flat=True)), {1})
+
+
+class PruneChangesTests(CreateTestSnippetMixin, TestCase):
+    """
+    Test ```prune_changes``` command.
+    """
+
+    def test_old_changes_are_deleted_but_the_latest(self) -> None:
+        for number in range(3):
+            self._create_test_snippet(title=f'Snippet {number}')
+        latest = SnippetChange.objects.latest('pk').pk
+        call_command('prune_changes', days=0, stdout=StringIO())
+        self.assertEqual(list(SnippetChange.objects.values_list('pk', flat=True)), [latest])
+        self.assertEqual(ChangeWatermark.get_sequence(), latest - 1)
+
+
+class StartupTests(SimpleTestCase):
+    """
+    Test ```profile_startup``` command and the modules kept out of a worker boot.
+    """
+
+    def test_profile_startup(self) -> None:
+        stdout = StringIO()
+        call_command('profile_startup', repeat=1, top=5, stdout=stdout, stderr=StringIO())
+        report = json.loads(stdout.getvalue())
+        self.assertGreater(report['boot_ms'], 0)
+        self.assertEqual(len(report['modules_self_ms']), 5)
+        self.assertIn('drftutorial.wsgi', dict(report['project_cumulative_ms']))
+
+        imported = {module for module, *_ in parse_importtime(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        300 | apps.snippets\n'
+            'import time:       180 |        180 |   apps.snippets.models\n'
+        )}
+        self.assertEqual(imported, {'apps.snippets', 'apps.snippets.models'})
+
+    def test_boot_skips_unused_modules(self) -> None:
+        script = (
+            'import sys\n'
+            'from drftutorial.wsgi import application\n'
+            'print(",".join(sorted(m for m in sys.modules if m.startswith(("pygments", "apps.snippets.deprecated")))))\n'
+        )
+        result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                                env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'drftutorial.settings'})
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '')
@@ -0,0 +1,158 @@
+"""
+Test highlighting in snippets app.
+"""
+
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import get_resolver
+
+from pygments.util import ClassNotFound
+
+from apps.snippets.detection import detect_language, hinted_languages, score_languages
+from apps.snippets.highlighting import (
+    get_formatter, get_lexer, highlight_snippet, lex, pack_tokens, render_highlighted, render_tokens, unpack_tokens,
+    worker_pool,
+)
+from apps.snippets.models import Snippet
+from drftutorial.warmup import warm_up
+from .mixins import CreateTestSnippetMixin
+
+
+class HighlightLimitTests(CreateTestSnippetMixin, TestCase):
+    """
+    Test size and time limits of highlighting.
+    """
+
+    def test_highlight_in_worker(self) -> None:
+        highlighted, degraded = highlight_snippet(self.code, language='python', style='friendly')
+        self.assertFalse(degraded)
+        self.assertIn('<https://pygments.org/>', highlighted)
+
+    @override_settings(SNIPPET_HIGHLIGHT={'MAX_CODE_SIZE': 10, 'TIMEOUT': None})
+    def test_size_limit_falls_back_to_plain_output(self) -> None:
+        self._create_test_snippet(code='print("<b>too long</b>")')
+        snippet = Snippet.objects.get()
+
+        self.assertTrue(snippet.highlight_degraded)
+        self.assertIn('<pre>print(&quot;&lt;b&gt;too long&lt;/b&gt;&quot;)</pre>', snippet.highlighted)
+        self.assertIn(f'<h2>{self.title}</h2>', snippet.highlighted)
+
+    @override_settings(SNIPPET_HIGHLIGHT={'TIMEOUT': 0.0001, 'LANGUAGES': {'sql': {'TIMEOUT': 5.0}}})
+    def test_timeout_falls_back_and_replaces_worker(self) -> None:
+        code = 'x = 1\n' * 20000
+        highlighted, degraded = highlight_snippet(code, language='python', style='friendly')
+        self.assertTrue(degraded)
+        self.assertNotIn('pygments.org', highlighted)
+
+        # The per-language override applies and a fresh worker serves the next job.
+        highlighted, degraded = highlight_snippet('SELECT 1;', language='sql', style='friendly')
+        self.assertFalse(degraded)
+
+    def test_lexer_errors_are_raised(self) -> None:
+        with self.assertRaises(ClassNotFound):
+            highlight_snippet(self.code, language='no-such-language', style='friendly')
+        self.assertFalse(highlight_snippet(self.code, language='python', style='friendly')[1])
+        self.assertLessEqual(worker_pool._size, 2)
+
+
+class InstanceMemoTests(TestCase):
+    """
+    Test the shared lexer and formatter instances.
+    """
+
+    def test_instances_are_shared(self) -> None:
+        self.assertIs(get_lexer('python'), get_lexer('python'))
+        self.assertIs(get_formatter('monokai', True), get_formatter('monokai', True))
+        self.assertIsNot(get_formatter('monokai', True), get_formatter('monokai', False))
+
+    def test_title_does_not_leak_between_documents(self) -> None:
+        self.assertIn('<title>First</title>', render_highlighted('x = 1', 'python', 'monokai', title='First'))
+        self.assertIn('<title></title>', render_highlighted('x = 1', 'python', 'monokai'))
+        self.assertEqual(get_formatter('monokai').title, '')
+
+    def test_unknown_language_raises(self) -> None:
+        with self.assertRaises(ClassNotFound):
+            get_lexer('not-a-language')
+
+
+class TokenStreamTests(TestCase):
+    """
+    Test the packed token streams rendered again without lexing.
+    """
+
+    def test_round_trip_renders_like_pygments(self) -> None:
+        codes = ['x = 1', '\n\nx = "é"\r\ny = 2\n\n', 'SELECT 1;\n', '']
+        for code, language in ((code, language) for code in codes for language in ('python', 'sql')):
+            with self.subTest(code=code, language=language):
+                tokens = unpack_tokens(pack_tokens(code, lex(code, language)), code)
+                self.assertEqual(render_tokens(tokens, 'monokai', True, 'Title'),
+                                 render_highlighted(code, language, 'monokai', True, 'Title'))
+
+    def test_stream_of_other_pygments_version_is_stale(self) -> None:
+        data = pack_tokens('x = 1', lex('x = 1', 'python'))
+        with mock.patch('pygments.__version__', '0.0'):
+            self.assertIsNone(unpack_tokens(data, 'x = 1'))
+
+
+class DetectionTests(TestCase):
+    """
+    Test language detection of 'language=auto'.
+    """
+
+    def test_hints(self) -> None:
+        self.assertEqual(hinted_languages('#!/usr/bin/env python3\nx = 1'), ['python'])
+        self.assertEqual(hinted_languages('#!/bin/sh\necho hi'), ['bash'])
+        self.assertEqual(hinted_languages('#!/usr/bin/env -S node --harmony\n'), ['javascript'])
+        self.assertEqual(hinted_languages('-- vim: set ft=sql:\nSELECT 1;'), ['sql'])
+        self.assertEqual(hinted_languages('# -*- mode: ruby -*-\nputs 1'), ['ruby'])
+        self.assertEqual(hinted_languages('x', title='Makefile'), ['make'])
+        self.assertEqual(hinted_languages('x', title='My snippet'), [])
+        self.assertEqual(set(hinted_languages('x', title='util.h')), {'c', 'objective-c'})
+
+    def test_model(self) -> None:
+        self.assertEqual(detect_language('import os\n\n\ndef main(argv):\n    return os.path.join(*argv)\n'), 'python')
+        rust = 'fn main() {\n    let v: Vec<u8> = Vec::new();\n    println!("{:?}", v);\n}\n'
+        self.assertEqual(detect_language(rust), 'rust')
+        self.assertEqual(detect_language('{"name": "snippets", "version": 1, "tags": ["a", "b"]}'), 'json')
+        self.assertEqual(detect_language('<div class="item">\n  <p>Hello</p>\n</div>\n'), 'html')
+        # A file name narrows the candidates down, the model picks one of them.
+        self.assertIn(detect_language('int main(void) { return 0; }', title='main.h'), hinted_languages('', 'main.h'))
+
+    def test_no_evidence_falls_back(self) -> None:
+        self.assertEqual(detect_language('x'), 'text')
+        with override_settings(SNIPPET_DETECTION={'FALLBACK': 'python'}):
+            self.assertEqual(detect_language(''), 'python')
+
+    def test_scores_are_cached_by_content(self) -> None:
+        code = 'package main\n\nfunc main() {}\n'
+        scores = score_languages(code)
+        with mock.patch('apps.snippets.detection._score') as score:
+            self.assertEqual(score_languages(code), scores)
+            score.assert_not_called()
+
+    def test_rebuilt_model_is_not_served_from_cache(self) -> None:
+        code = 'package main\n\nfunc main() {}\n'
+        score_languages(code)
+        with mock.patch('apps.snippets.detection.model_version', return_value='rebuilt'), \
+                mock.patch('apps.snippets.detection._score', return_value={'go': -1.0}) as score:
+            self.assertEqual(score_languages(code), {'go': -1.0})
+        score.assert_called_once()
+
+
+@override_settings(WARM_UP={'TOP_LANGUAGES': 1, 'LANGUAGES': ['python', 'not-a-language'], 'STYLES': ['monokai']},
+                   SNIPPET_HIGHLIGHT={'TIMEOUT': None})
+class WarmUpTests(CreateTestSnippetMixin, TransactionTestCase):
+    """
+    Test the warm-up run before forking workers. It closes the connections, so it can't run in a transaction.
+    """
+
+    def test_warm_up(self) -> None:
+        for _ in range(2):
+            self._create_test_snippet(language='sql')
+        self._create_test_snippet(language='c')
+
+        result = warm_up(freeze=False)
+        self.assertEqual(result['languages'], ['python', 'not-a-language', 'sql'])
+        self.assertEqual(result['styles'], 1)
+        self.assertTrue(get_resolver()._populated)
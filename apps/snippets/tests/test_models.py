@@ -2,10 +2,23 @@
 Test models in snippets app.
 """
 
-from django.test import TestCase
+import threading
+from itertools import combinations, product
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 
-from apps.snippets.models import Snippet
+from apps.snippets.filters import FILTER_PARAMS, filter_snippets
+from apps.snippets.highlighting import lex, render_format, render_highlighted, render_plain
+from apps.snippets.lines import pack_line_index, slice_lines
+from apps.snippets.models import Blob, Revision, Snippet, TokenStream, blob_digest
+from apps.snippets.revisions import apply_delta, make_delta
+from apps.snippets.variants import SingleFlight, get_variant, local_variants
+from apps.snippets.views import SnippetViewSet
 from .mixins import CreateTestSnippetMixin
 
 
@@ -14,8 +27,9 @@ class SnippetTests(CreateTestSnippetMixin, TestCase):
     Test module for Snippet model.
     """
 
-    def setUp(self) -> None:
-        self._create_test_snippet()
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls._create_test_snippet()
 
     def test_get_snippets(self) -> None:
         """Test snippet list"""
@@ -43,3 +57,360 @@ class SnippetTests(CreateTestSnippetMixin, TestCase):
 
         self.assertIn(code, snippet.code)
         self.assertEqual(len(snippets), 2)
+
+
+class BlobTests(CreateTestSnippetMixin, TestCase):
+    """
+    Test module for the blobs shared by snippets with the same code and render.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls._create_test_snippet()
+
+    def _refs(self, text: str) -> int:
+        return Blob.objects.get(pk=blob_digest(text)).refs
+
+    def test_duplicate_shares_blobs_without_highlighting(self) -> None:
+        first = Snippet.objects.get()
+        with mock.patch('apps.snippets.models.highlight_with_tokens') as highlight, \
+                mock.patch('apps.snippets.models.render_tokens') as render:
+            Snippet(title=first.title, code=self.code, linenos=first.linenos, language=first.language,
+                    style=first.style, owner=first.owner).save()
+        highlight.assert_not_called()
+        render.assert_not_called()
+
+        second = Snippet.objects.exclude(pk=first.pk).get()
+        self.assertEqual((second.code_blob_id, second.render_blob_id), (first.code_blob_id, first.render_blob_id))
+        self.assertEqual(Blob.objects.count(), 2)
+        self.assertEqual(self._refs(self.code), 2)
+
+    def test_other_options_are_highlighted(self) -> None:
+        self._create_test_snippet(style='monokai')
+        first, second = Snippet.objects.order_by('pk')
+        self.assertEqual(first.code_blob_id, second.code_blob_id)
+        self.assertNotEqual(first.render_blob_id, second.render_blob_id)
+        self.assertEqual(self._refs(self.code), 2)
+
+    def test_references_follow_updates_and_deletes(self) -> None:
+        snippet = Snippet.objects.get()
+        old_render = snippet.render_blob_id
+        snippet.code = 'print("changed")'
+        snippet.save()
+        self.assertEqual(self._refs(self.code), 0)
+        self.assertEqual(Blob.objects.get(pk=old_render).refs, 0)
+        self.assertEqual(self._refs('print("changed")'), 1)
+        self.assertIn('changed', Snippet.objects.get().highlighted)
+
+        snippet.delete()
+        self.assertEqual(self._refs('print("changed")'), 0)
+
+
+class LineRangeTests(CreateTestSnippetMixin, TestCase):
+    """
+    Test module for the line ranges of renders, read by substrings located by their line index.
+    """
+    code = 'def f(x):\n    """Doc\n    string."""\n    return x\n\n\nprint(f(1))\n'
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls._create_test_snippet(title='plain.py')
+        cls._create_test_snippet(title='numbered.py', linenos=True)
+
+    def test_renders_are_indexed_when_stored(self) -> None:
+        for snippet in Snippet.objects.select_related('render_blob'):
+            self.assertEqual(bytes(snippet.render_blob.line_index), pack_line_index(snippet.highlighted))
+            self.assertTrue(snippet.render_blob.line_index)
+        self.assertIsNone(Blob.objects.get(pk=blob_digest(self.code)).line_index)
+
+    def test_ranges_match_slicing_in_memory(self) -> None:
+        for snippet in Snippet.objects.all():
+            for start, end in ((1, 1), (2, 3), (6, 7), (7, 7), (1, 100), (8, 9)):
+                expected = slice_lines(snippet.highlighted, start, end)
+                with self.assertNumQueries(2):
+                    located = Snippet.objects.with_line_range(start, end).get(pk=snippet.pk)
+                    self.assertEqual(located.highlighted_lines(start, end), expected)
+                self.assertEqual(expected[0], 7)
+
+        html = Snippet.objects.get(title='numbered.py').highlighted_lines(2, 3)[1]
+        self.assertIn('&quot;&quot;&quot;Doc', html)
+        self.assertNotIn('print', html)
+        self.assertRegex(html, r'>2</span>\n<span class="normal">3<')
+        self.assertNotRegex(html, r'>[14]</span>')
+
+    def test_render_without_index_is_indexed_on_read(self) -> None:
+        snippet = Snippet.objects.get(title='plain.py')
+        Blob.objects.filter(pk=snippet.render_blob_id).update(line_index=None)
+        located = Snippet.objects.with_line_range(4, 4).get(pk=snippet.pk)
+        self.assertEqual(located.highlighted_lines(4, 4), slice_lines(snippet.highlighted, 4, 4))
+        self.assertEqual(bytes(Blob.objects.get(pk=snippet.render_blob_id).line_index),
+                         pack_line_index(snippet.highlighted))
+
+    def test_spans_across_lines_are_sliced_in_memory(self) -> None:
+        html = '<h2>t</h2><pre><span class="s">"a\nb\nc"</span>\nd\n</pre>'
+        self.assertEqual(pack_line_index(html), b'')
+        self.assertEqual(slice_lines(html, 2, 2), (4, '<h2>t</h2><pre><span class="s">b\n</span></pre>'))
+
+
+@override_settings(SNIPPET_HIGHLIGHT={'STREAM_THRESHOLD': 100, 'STREAM_CHUNK_SIZE': 1000, 'TIMEOUT': None})
+class StreamingTests(CreateTestSnippetMixin, TestCase):
+    """
+    Test module for the large renders written to a file, stored in chunks and read back in chunks.
+    """
+    code = ''.join(f'def f{number}(x):\n    return "é{number}" * x\n\n' for number in range(100))
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.owner = cls._create_test_user()
+
+    def _save(self, **options) -> Snippet:
+        snippet = Snippet(code=self.code, owner=self.owner, title='big.py', **options)
+        snippet.save()
+        return Snippet.objects.with_render_head(1000).get(pk=snippet.pk)
+
+    def test_render_is_stored_in_chunks(self) -> None:
+        for linenos in (False, True):
+            snippet = self._save(linenos=linenos, style='monokai')
+            expected = render_highlighted(self.code, 'python', 'monokai', linenos, 'big.py')
+            self.assertEqual(snippet.highlighted, expected)
+            self.assertEqual(snippet.render_blob_id, blob_digest(expected))
+            self.assertEqual(snippet.render_size, len(expected.encode('utf-8')))
+            self.assertEqual(bytes(snippet.render_blob.line_index), pack_line_index(expected))
+            # Stored as text, searched like any other.
+            self.assertTrue(Blob.objects.filter(pk=snippet.render_blob_id, data__contains='f99').exists())
+            self.assertTrue(TokenStream.objects.filter(code_blob_id=snippet.code_blob_id).exists())
+
+            chunks = list(snippet.iter_highlighted(1000))
+            self.assertEqual(''.join(chunks), expected)
+            self.assertEqual({len(chunk) for chunk in chunks[:-1]}, {1000})
+
+    def test_plain_fallback_is_stored_in_chunks(self) -> None:
+        with override_settings(SNIPPET_HIGHLIGHT={'STREAM_THRESHOLD': 100, 'STREAM_CHUNK_SIZE': 1000,
+                                                  'MAX_CODE_SIZE': 100}):
+            snippet = self._save()
+        self.assertTrue(snippet.highlight_degraded)
+        self.assertEqual(snippet.highlighted, render_plain(self.code, 'big.py'))
+
+    def test_stored_render_is_reused(self) -> None:
+        first = self._save()
+        with mock.patch('apps.snippets.models.highlight_with_tokens') as highlight:
+            second = self._save()
+        highlight.assert_not_called()
+        self.assertEqual(second.render_blob_id, first.render_blob_id)
+        self.assertEqual(Blob.objects.get(pk=first.render_blob_id).refs, 2)
+
+    def test_degraded_render_is_not_reused(self) -> None:
+        with override_settings(SNIPPET_HIGHLIGHT={'MAX_CODE_SIZE': 100}):
+            first = self._save()
+        self.assertTrue(first.highlight_degraded)
+        second = self._save()
+        self.assertFalse(second.highlight_degraded)
+        self.assertNotEqual(second.render_blob_id, first.render_blob_id)
+
+    def test_collected_render_is_highlighted_again(self) -> None:
+        first = self._save()
+        Snippet.objects.filter(pk=first.pk).delete()
+        Blob.objects.filter(pk=first.render_blob_id).delete()  # By 'gc_blobs', after the lookup.
+        with mock.patch.object(Snippet, 'find_render', return_value=first.render_blob_id):
+            second = self._save()
+        self.assertEqual(second.render_blob_id, first.render_blob_id)
+        self.assertEqual(second.highlighted, first.highlighted)
+        self.assertEqual(Blob.objects.get(pk=second.render_blob_id).refs, 1)
+        self.assertEqual(Blob.objects.get(pk=second.code_blob_id).refs, 1)
+
+
+class TokenStreamTests(CreateTestSnippetMixin, TestCase):
+    """
+    Test module for the token streams rendering snippets in other styles without lexing again.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls._create_test_snippet()
+
+    def setUp(self) -> None:
+        cache.clear()
+        local_variants.clear()
+
+    def test_saved_snippet_stores_its_stream(self) -> None:
+        stream = TokenStream.objects.get()
+        self.assertEqual((stream.code_blob_id, stream.language), (blob_digest(self.code), 'python'))
+
+    def test_style_change_does_not_lex(self) -> None:
+        snippet = Snippet.objects.get()
+        with mock.patch('apps.snippets.models.highlight_with_tokens') as highlight:
+            snippet.style = 'monokai'
+            snippet.save()
+            restyled = Snippet.objects.get().render_style('vim')
+        highlight.assert_not_called()
+        self.assertIn('#272822', Snippet.objects.get().highlighted)  # Monokai background.
+        self.assertEqual(restyled, render_highlighted(self.code, 'python', 'vim', snippet.linenos, snippet.title))
+
+    def test_render_style_of_snippet_without_stream(self) -> None:
+        TokenStream.objects.all().delete()
+        snippet = Snippet.objects.get()
+        self.assertEqual(snippet.render_style('monokai'), render_highlighted(
+            self.code, 'python', 'monokai', snippet.linenos, snippet.title))
+        self.assertEqual(TokenStream.objects.count(), 1)
+        self.assertEqual(snippet.render_style(snippet.style), snippet.highlighted)
+
+    @override_settings(SNIPPET_HIGHLIGHT={'TIMEOUT': None})  # Lexed in this process, where the formatter is patched.
+    def test_render_variant_without_stream_only_lexes(self) -> None:
+        TokenStream.objects.all().delete()
+        snippet = Snippet.objects.get()
+        expected = render_format(lex(self.code, 'python'), 'terminal256', 'monokai', snippet.linenos, snippet.title)
+        with mock.patch('apps.snippets.highlighting.render_tokens') as render:
+            self.assertEqual(snippet.render_variant('terminal256', 'monokai'), expected)
+        render.assert_not_called()
+        self.assertEqual(TokenStream.objects.count(), 1)
+
+    def test_render_variant_is_cached_by_content(self) -> None:
+        snippet = Snippet.objects.get()
+        expected = render_format(lex(self.code, 'python'), 'terminal256', 'monokai', snippet.linenos, snippet.title)
+        self.assertEqual(snippet.render_variant('terminal256', 'monokai'), expected)
+
+        # Another snippet with the same code and options reads the variant of the first one.
+        other = self._create_test_snippet()
+        with self.assertNumQueries(0):
+            self.assertEqual(other.render_variant('terminal256', 'monokai'), expected)
+        # The shared cache serves the other processes.
+        local_variants.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(other.render_variant('terminal256', 'monokai'), expected)
+
+    @override_settings(SNIPPET_VARIANTS={'MAX_ENTRIES': 2})
+    def test_local_variants_are_bounded(self) -> None:
+        for key in ('a', 'b', 'c'):
+            get_variant(f'test:{key}', lambda: (key, True))
+        self.assertIsNone(local_variants.get('test:a'))
+        self.assertEqual(local_variants.get('test:c'), 'c')
+
+    def test_concurrent_requests_render_once(self) -> None:
+        flight, calls, results = SingleFlight(), [], []
+        started, release, waiting = threading.Event(), threading.Event(), threading.Semaphore(0)
+
+        def render():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'variant'
+
+        def run():
+            results.append(flight.do('key', render))
+
+        leader = threading.Thread(target=run)
+        leader.start()
+        self.assertTrue(started.wait(5))
+        # The followers find the call of the leader running, the leader finishes once they all wait for it.
+        done = flight._calls['key'].done
+        wait = done.wait
+
+        def follow(timeout=None):
+            waiting.release()
+            return wait(timeout)
+
+        with mock.patch.object(done, 'wait', follow):
+            followers = [threading.Thread(target=run) for _ in range(4)]
+            for thread in followers:
+                thread.start()
+            for _ in followers:
+                self.assertTrue(waiting.acquire(timeout=5))
+            release.set()
+            for thread in [leader, *followers]:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['variant'] * 5)
+
+
+class RevisionTests(CreateTestSnippetMixin, TestCase):
+    """
+    Test module for the delta-compressed revisions recorded by every save.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.snippet = cls._create_test_snippet()
+
+    def _save_versions(self, codes: list) -> None:
+        for code in codes:
+            self.snippet.code = code
+            self.snippet.save()
+
+    def test_delta_round_trip(self) -> None:
+        base = 'a = 1\nb = "é"\nc = 3'
+        for code in (base, '', 'a = 1\nb = 2\r\nc = 3\n', 'x\n' + base + '\ny'):
+            with self.subTest(code=code):
+                self.assertEqual(apply_delta(base, make_delta(base, code)), code)
+        self.assertEqual(make_delta(base, base), b'')
+
+    @override_settings(SNIPPET_REVISIONS={'KEYFRAME_INTERVAL': 3})
+    def test_keyframes_bound_the_chain(self) -> None:
+        codes = [f'{self.code}\n' + ''.join(f'x = {number}\n' for number in range(version)) for version in range(6)]
+        self._save_versions(codes)
+
+        revisions = Revision.objects.filter(snippet=self.snippet)
+        self.assertEqual(list(revisions.values_list('depth', flat=True)), [0, 0, 1, 2, 0, 1, 2])
+        for number, code in enumerate([self.code] + codes, start=1):
+            self.assertEqual(Revision.objects.get_code(self.snippet.pk, number), code)
+        self.assertIsNone(Revision.objects.get_code(self.snippet.pk, 8))
+
+    def test_metadata_change_stores_empty_delta(self) -> None:
+        self.snippet.title = 'Renamed'
+        self.snippet.save()
+        revision = Revision.objects.get_with_code(self.snippet.pk, 2)
+        self.assertEqual((revision.title, revision.code, bytes(revision.data)), ('Renamed', self.code, b''))
+
+    def test_metadata_save_does_not_load_the_code(self) -> None:
+        snippet = Snippet.objects.get(pk=self.snippet.pk)
+        snippet.owner = User.objects.create_user(username='other')
+        with CaptureQueriesContext(connection) as queries:
+            snippet.save()
+        self.assertNotIn('_code', snippet.__dict__)
+        blob_reads = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertEqual([sql for sql in blob_reads if 'snippets_blob' in sql], [])
+        revision = Revision.objects.get(snippet=snippet, number=2)
+        self.assertEqual((revision.size, bytes(revision.data)), (len(self.code.encode('utf-8')), b''))
+
+    def test_previous_code_rebuilt_when_its_blob_is_collected(self) -> None:
+        self._save_versions(['first = 1\n'])
+        self.snippet.code = 'second = 2\n'
+        self.snippet.save()
+        Blob.objects.filter(pk=blob_digest('first = 1\n')).delete()
+        self._save_versions(['third = 3\n'])
+        self.assertEqual(Revision.objects.get_code(self.snippet.pk, 4), 'third = 3\n')
+
+    def test_revisions_are_deleted_with_the_snippet(self) -> None:
+        self.snippet.delete()
+        self.assertFalse(Revision.objects.exists())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked with SQLite.')
+class FilterIndexTests(TestCase):
+    """
+    Test module for the indexes of snippet list filters: every combination is served by an index, in order.
+    """
+
+    values = {
+        'language': ['python'],
+        'style': ['monokai'],
+        'owner': ['someone'],
+        'created_after': ['2022-01-01'],
+        'created_before': ['2030-01-01T12:00:00'],
+        'has_title': ['true', 'false'],
+    }
+
+    def _plan(self, params: dict) -> str:
+        return filter_snippets(SnippetViewSet.queryset.all(), params).explain()
+
+    def test_every_combination_is_index_served(self) -> None:
+        for size in range(1, len(FILTER_PARAMS) + 1):
+            for names in combinations(FILTER_PARAMS, size):
+                for values in product(*(self.values[name] for name in names)):
+                    params = dict(zip(names, values))
+                    with self.subTest(**params):
+                        plan = self._plan(params)
+                        snippet_steps = [line for line in plan.splitlines() if 'snippets_snippet' in line]
+                        self.assertTrue(snippet_steps, plan)
+                        for line in snippet_steps:
+                            self.assertIn('USING INDEX snippet_', line, plan)
+                        self.assertNotIn('TEMP B-TREE', plan)
@@ -0,0 +1,92 @@
+"""
+Custom throttles of snippets app.
+    Creating or updating a snippet highlights its code, so write actions are rate limited per user and per IP,
+    and the highlighting running at once is capped so that a burst of writes is shed with '429 Too Many Requests'
+    instead of queueing up behind every worker. Reads are never throttled.
+"""
+
+from contextlib import contextmanager, nullcontext
+
+from rest_framework.exceptions import Throttled
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from .highlighting import HighlightBusy, highlight_slot
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket throttle of write actions, stored in the Django cache like the built-in throttles.
+        A rate of 'N/period' is a bucket of N tokens refilled continuously at N per period, so a client may
+        burst up to N requests and then sustains the rate. A rate of None disables the throttle.
+        Only the remaining tokens and their timestamp are stored, instead of the history of every request.
+        As with the built-in throttles, concurrent requests of one client may race on the stored bucket.
+    """
+
+    actions = ('create', 'update', 'partial_update')
+    cache_format = 'throttle_bucket_%(scope)s_%(ident)s'
+
+    def get_rate(self):
+        # Read the settings on every request, the class attribute of the parent is bound at import time.
+        self.THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+        return super().get_rate()
+
+    def allow_request(self, request, view):
+        if self.rate is None or getattr(view, 'action', None) not in self.actions:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        tokens, updated = self.cache.get(self.key, (self.num_requests, now))
+        tokens = min(self.num_requests, tokens + (now - updated) * self.num_requests / self.duration)
+        if tokens < 1:
+            self._wait = (1 - tokens) * self.duration / self.num_requests
+            return False
+        self.cache.set(self.key, (tokens - 1, now), self.duration)
+        return True
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class UserWriteThrottle(TokenBucketThrottle):
+    """
+    Limit the write rate of each authenticated user.
+    """
+    scope = 'snippet-write-user'
+
+    def get_cache_key(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.pk}
+
+
+class IPWriteThrottle(TokenBucketThrottle):
+    """
+    Limit the write rate of each client address, whoever is logged in.
+    """
+    scope = 'snippet-write-ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class HighlightThrottled(Throttled):
+    default_detail = 'Too many snippets are being highlighted.'
+    default_code = 'highlight_busy'
+
+
+@contextmanager
+def highlight_capacity(slot: bool = True):
+    """
+    Take a highlight slot for the block, or raise ```HighlightThrottled``` (429 with Retry-After).
+        With ```slot=False``` the block takes a slot itself only when it highlights, e.g. a cold variant,
+        and a ```HighlightBusy``` raised by the block gets the same response.
+    """
+    try:
+        with highlight_slot() if slot else nullcontext():
+            yield
+    except HighlightBusy as exc:
+        raise HighlightThrottled(wait=exc.retry_after)
@@ -2,15 +2,14 @@
 URLConf of snippet app.
 """
 
+from django.conf import settings
 from django.urls import path, include
 
-from rest_framework import renderers
-from rest_framework.urlpatterns import format_suffix_patterns
-
 from rest_framework.routers import DefaultRouter
 
 from ..quickstart.views import UserViewSet as QuickstartUserViewSet
-from .views import UserViewSet, SnippetViewSet, api_root
+from .async_views import async_view
+from .views import UserViewSet, SnippetViewSet
 
 
 # Tutorial6: Create a router and register our viewsets with it.
@@ -24,35 +23,70 @@ urlpatterns = [
     path('', include(router.urls)),
 ]
 
+# Coroutine views of the router's snippet routes for ASGI servers, see async_views.py.
+# They come first and are unnamed, so reversing and format suffixes still resolve to the router's routes.
+_router_views = {pattern.name: pattern.callback for pattern in router.urls if pattern.name}
+async_urlpatterns = [
+    path('snippets/', async_view(_router_views['snippet-list'])),
+    path('snippets/<int:pk>/', async_view(_router_views['snippet-detail'])),
+    path('snippets/<int:pk>/highlight/', async_view(_router_views['snippet-highlight'])),
+]
+if getattr(settings, 'SNIPPETS_ASYNC_READS', False):
+    urlpatterns = async_urlpatterns + urlpatterns
+
 
 # DEPRECATED!!
+# Built on first access only (PEP 562), the router above replaced these patterns.
 # Notice: "Expected type 'ViewSetMixin'" warning is caused by specific version of DRF or PyCharm editor.
-snippet_list = SnippetViewSet.as_view({
-    'get': 'list',
-    'post': 'create',
-})
-snippet_detail = SnippetViewSet.as_view({
-    'get': 'retrieve',
-    'put': 'update',
-    'patch': 'partial_update',
-    'delete': 'destroy',
-})
-snippet_highlight = SnippetViewSet.as_view({
-    'get': 'highlight',
-}, renderer_classes=[renderers.StaticHTMLRenderer])
-user_list = UserViewSet.as_view({
-    'get': 'list',
-})
-user_detail = UserViewSet.as_view({
-    'get': 'retrieve',
-})
-Deprecated_urlpatterns = format_suffix_patterns(urlpatterns=[
-    path(r'', api_root),
-    path(r'snippets/', snippet_list, name='snippet-list'),
-    path(r'snippets/<int:pk>/', snippet_detail, name='snippet-detail'),
-    path(r'snippets/<int:pk>/highlight/',
-         snippet_highlight,
-         name='snippet-highlight'),  # Using HTML renderer from REST framework
-    path(r'users/', user_list, name='snippet-user-list'),
-    path(r'users/<int:pk>/', user_detail, name='snippet-user-detail'),
-])
+def _deprecated_urlpatterns() -> dict:
+    from rest_framework import renderers
+    from rest_framework.urlpatterns import format_suffix_patterns
+
+    from .views import api_root
+
+    snippet_list = SnippetViewSet.as_view({
+        'get': 'list',
+        'post': 'create',
+    })
+    snippet_detail = SnippetViewSet.as_view({
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    })
+    snippet_highlight = SnippetViewSet.as_view({
+        'get': 'highlight',
+    }, renderer_classes=[renderers.StaticHTMLRenderer])
+    user_list = UserViewSet.as_view({
+        'get': 'list',
+    })
+    user_detail = UserViewSet.as_view({
+        'get': 'retrieve',
+    })
+    Deprecated_urlpatterns = format_suffix_patterns(urlpatterns=[
+        path(r'', api_root),
+        path(r'snippets/', snippet_list, name='snippet-list'),
+        path(r'snippets/<int:pk>/', snippet_detail, name='snippet-detail'),
+        path(r'snippets/<int:pk>/highlight/',
+             snippet_highlight,
+             name='snippet-highlight'),  # Using HTML renderer from REST framework
+        path(r'users/', user_list, name='snippet-user-list'),
+        path(r'users/<int:pk>/', user_detail, name='snippet-user-detail'),
+    ])
+    return {
+        'snippet_list': snippet_list,
+        'snippet_detail': snippet_detail,
+        'snippet_highlight': snippet_highlight,
+        'user_list': user_list,
+        'user_detail': user_detail,
+        'Deprecated_urlpatterns': Deprecated_urlpatterns,
+    }
+
+
+def __getattr__(name: str):
+    if name in ('snippet_list', 'snippet_detail', 'snippet_highlight', 'user_list', 'user_detail',
+                'Deprecated_urlpatterns'):
+        deprecated = _deprecated_urlpatterns()
+        globals().update(deprecated)
+        return deprecated[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
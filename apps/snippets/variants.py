@@ -0,0 +1,154 @@
+"""
+Cache of the rendered variants of snippets, served by ```/snippets/<pk>/render/```.
+    A variant is the code of a snippet rendered in a format (see ```highlighting.RENDER_FORMATS```) and style.
+    It is rendered on first request and kept in two tiers: a bounded LRU of this process, then the shared
+    cache. Keys hold the content hash of the code, so snippets with the same code and options share their
+    variants, and a changed code gets new keys: stale variants are never read again and simply expire.
+
+    Concurrent requests for a cold variant are coalesced. In a process, the first request renders it while
+    the others wait for its result (single flight). Across processes, the first one takes a lock in the
+    shared cache and the others poll the shared cache for its result, up to ```LOCK_TIMEOUT``` seconds.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+DEFAULTS = {
+    # Bounds of the in-process LRU, in variants and in characters.
+    'MAX_ENTRIES': 256,
+    'MAX_SIZE': 32 * 1024 * 1024,
+    # Seconds variants are kept in the shared cache.
+    'TIMEOUT': 3600,
+    'LOCK_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.05,
+}
+
+
+def get_config() -> dict:
+    """Return the ```SNIPPET_VARIANTS``` setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'SNIPPET_VARIANTS', {})}
+
+
+class LRUCache(object):
+    """
+    A thread-safe LRU of strings, bounded by the number of entries and their total length.
+    """
+
+    def __init__(self) -> None:
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        config = get_config()
+        if len(value) > config['MAX_SIZE']:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = value
+            self._size += len(value)
+            while len(self._entries) > config['MAX_ENTRIES'] or self._size > config['MAX_SIZE']:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class _Call(object):
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Run a function once per key at a time: callers arriving while it runs wait for its result, or its error.
+    """
+
+    def __init__(self) -> None:
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+local_variants = LRUCache()
+_flight = SingleFlight()
+
+
+def get_variant(key: str, render) -> str:
+    """
+    Return the variant cached under ```key```, rendering it once if it is cold.
+        :param render: Called without arguments, returns (variant, False if it may not be cached, e.g. degraded).
+    """
+    variant = local_variants.get(key)
+    if variant is None:
+        variant, cacheable = _flight.do(key, lambda: _get_shared(key, render))
+        if cacheable:
+            local_variants.set(key, variant)
+    return variant
+
+
+def _get_shared(key: str, render) -> tuple:
+    variant = cache.get(key)
+    if variant is not None:
+        return variant, True
+    config = get_config()
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, config['LOCK_TIMEOUT']):
+        # Another process renders it.
+        deadline = time.monotonic() + config['LOCK_TIMEOUT']
+        while time.monotonic() < deadline:
+            time.sleep(config['POLL_INTERVAL'])
+            variant = cache.get(key)
+            if variant is not None:
+                return variant, True
+            if cache.get(lock) is None:  # It failed, or the variant may not be cached.
+                break
+        return render()
+    try:
+        variant, cacheable = render()
+        if cacheable:
+            cache.set(key, variant, config['TIMEOUT'])
+    finally:
+        cache.delete(lock)
+    return variant, cacheable
@@ -23,29 +23,51 @@ Views of snippets app.
         except that they provide operations such as ```retrieve```, or ```update```,
         and not method handlers such as ```get``` or ```put```.
 
-[!!] If you look at the DEPRECATED views from the bottom of this page,
+[!!] If you look at the DEPRECATED views in the ```deprecated_views.py``` module,
 You'll see how much code has been simplified as you go through the tutorial.
 """
 
-from django.http import Http404
 from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 
-from rest_framework import status
-from rest_framework import renderers
-from rest_framework.views import APIView
-from rest_framework.decorators import api_view, action
+from rest_framework import renderers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotAuthenticated, Throttled, ValidationError
+from rest_framework.negotiation import BaseContentNegotiation
 from rest_framework.response import Response
-from rest_framework.reverse import reverse
 
-from rest_framework import mixins
-from rest_framework import generics
 from rest_framework import permissions
 
 from rest_framework import viewsets
 
-from .models import Snippet
-from .serializers import UserSerializer, SnippetSerializer
+from drftutorial.pagination import ApproximateCountPagination
+
+from .caching import CachedListMixin
+from .changes import (
+    WaitBusy, get_config as get_changes_config, is_expired, latest_sequence, wait_for_changes, wait_slot,
+)
+from .filters import filter_snippets
+from .highlighting import RENDER_FORMATS, get_config as get_highlight_config
+from .lines import LineRangeError, parse_range, slice_lines
+from .models import STYLE_CHOICES, Revision, Snippet
+from .serializers import (
+    RevisionDetailSerializer, RevisionSerializer, SnippetChangeSerializer, UserSerializer, SnippetSerializer,
+)
 from .permissions import IsOwnerOrReadOnly
+from .throttles import IPWriteThrottle, UserWriteThrottle, highlight_capacity
+
+
+class FormatParameterNegotiation(BaseContentNegotiation):
+    """
+    Ignore the Accept header, the output format is chosen by the '?fmt=' query parameter.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
 
 
 # Tutorial6: 'UserViewSet' that is combination of 'UserList' and 'UserDetail' view classes.
@@ -57,19 +79,54 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     This viewset automatically provides 'list' and 'retrieve' actions.
         ```ReadOnlyModelViewSet``` class provide the default 'read-only' operations.
     """
-    queryset = User.objects.all()
+    queryset = User.objects.prefetch_related('snippets').order_by('id')
     serializer_class = UserSerializer
+    query_budget = {'list': 5, 'retrieve': 4}
 
 
-class SnippetViewSet(viewsets.ModelViewSet):
+class SnippetViewSet(CachedListMixin, viewsets.ModelViewSet):
     """
     This viewset automatically provides 'list', 'create', 'retrieve', 'update' and 'destroy' actions.
-    Additionally we also provide an extra 'highlight' action.
+    Additionally we also provide extra 'highlight', 'render', 'revisions', 'revision' and 'changes' actions.
         ```ModelViewSet``` class is used to get the complete set of default read and write operations.
+        ```CachedListMixin``` caches the pages of 'list' until the next snippet write.
+        ```ApproximateCountPagination``` counts the unfiltered list with a counter, unless '?exact_count=1'.
     """
-    queryset = Snippet.objects.all()
+    queryset = Snippet.objects.select_related('owner', 'code_blob')
     serializer_class = SnippetSerializer
+    pagination_class = ApproximateCountPagination
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    # Saving highlights the code, so writes are rate limited and the highlighting running at once is capped.
+    throttle_classes = [UserWriteThrottle, IPWriteThrottle]
+    # Session and user lookups of the first authenticated request (then cached) are included, and the token stream
+    # of '?style='.
+    # A cold variant of 'render' reads the token stream and the code.
+    query_budget = {
+        'list': 4, 'retrieve': 3, 'highlight': 4, 'render': 5, 'revisions': 5, 'revision': 4, 'changes': 5,
+    }
+
+    def get_queryset(self):
+        """
+        Filter the 'list' action by the query parameters of ```filter_snippets```.
+            Other actions ignore them, so a detail URL never turns into a 404 because of a filter.
+        """
+        if self.action == 'highlight':
+            # Only the render is read, not the code, unless rendering another style.
+            if self.request.query_params.get('style'):
+                return Snippet.objects.select_related('render_blob', 'code_blob')
+            lines = self._get_lines()
+            if lines:
+                # Only the index entries of the range, the range itself is read by 'highlighted_lines()'.
+                return Snippet.objects.with_line_range(*lines)
+            # Only the first chunk, the rest of a large render is streamed by 'iter_highlighted()'.
+            return Snippet.objects.with_render_head(get_highlight_config()['STREAM_CHUNK_SIZE'])
+        if self.action in ('render', 'revisions', 'revision'):
+            # The code of 'render' is only read to render a cold variant.
+            return Snippet.objects.all()
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_snippets(queryset, self.request.query_params)
+        return queryset
 
     @action(detail=True, renderer_classes=[renderers.StaticHTMLRenderer])
     def highlight(self, request, *args, **kwargs):
@@ -85,291 +142,170 @@ class SnippetViewSet(viewsets.ModelViewSet):
         The URLs for custom actions by default depend on the method name itself.
         If you want to change the way url should be constructed,
         you can include ```url_path``` as a decorator keyword argument.
+
+        '?style=<name>' renders the snippet in another style, from its stored token stream.
+        '?lines=<start>-<end>' returns those lines only, with the number of lines in 'X-Total-Lines'.
+        Renders larger than ```STREAM_CHUNK_SIZE``` are streamed a chunk at a time, as they are read.
         """
+        lines = self._get_lines()
+        style = self._get_style()
         snippet = self.get_object()
-        return Response(snippet.highlighted)
-
-    def perform_create(self, serializer):
+        if not style:
+            if not lines:
+                return self._stream_highlighted(request, snippet)
+            total, highlighted = snippet.highlighted_lines(*lines)
+            return Response(highlighted, headers={'X-Total-Lines': str(total)})
+        with highlight_capacity(slot=False):
+            highlighted = snippet.render_style(style)
+        if not lines:
+            return Response(highlighted)
+        # Variants of other styles are cached whole, their lines are sliced in memory.
+        total, highlighted = slice_lines(highlighted, *lines)
+        return Response(highlighted, headers={'X-Total-Lines': str(total)})
+
+    @action(detail=True, content_negotiation_class=FormatParameterNegotiation)
+    def render(self, request, *args, **kwargs):
         """
-        Same as 'perform_create' method of the SnippetList view.
+        Render the snippet in the format of '?fmt=' (see ```RENDER_FORMATS```), and the style of '?style='.
+            Variants are rendered on first request and cached, see ```variants```.
         """
-        serializer.save(owner=self.request.user)
-
-
-# Tutorial5: Single entry point for the snippet's root API
-# Tutorial5: Code highlighting endpoints using pre-rendered HTML plugin provided by REST framework.
-
-
-@api_view(['GET'])
-def api_root(request, format=None):
-    """
-    DEPRECATED!
-
-    Single entry point to provide 'snippets' and 'users'.
-        :return:
-            Using REST framework's ```reverse``` function in order to return fully-qualified URLs.
-            and a URL patterns like specified below will also be declared in the ```snippets/urls.py``` module.
-    """
-    return Response({
-        'users': reverse('user-list', request=request, format=format),
-        'snippet-users': reverse('snippet-user-list', request=request, format=format),
-        'snippets': reverse('snippet-list', request=request, format=format),
-    })
-
-
-class SnippetHighlight(generics.GenericAPIView):
-    """
-    DEPRECATED!
-
-    Code highlighting endpoint.
-        Instead of using a concrete generic view, we'll use the base class for representing instances,
-        and create our own ```.get()``` method.
-        We're not returning an object instance, but instead a property of an object instance.
-    """
-    queryset = Snippet.objects.all()
-    renderer_classes = [renderers.StaticHTMLRenderer]
-
-    def get(self, request, *args, **kwargs):
+        fmt = request.query_params.get('fmt', 'html')
+        if fmt not in RENDER_FORMATS:
+            raise ValidationError({'fmt': [f'Unknown format "{fmt}", expected one of {", ".join(RENDER_FORMATS)}.']})
+        style = self._get_style()
         snippet = self.get_object()
-        return Response(snippet.highlighted)
-
-
-# CBV for user model
-
-
-class UserList(generics.ListAPIView):
-    """
-    DEPRECATED!
-
-    User list view.
-    This is used for read-only views for user representation only.
-    """
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
-
-
-class UserDetail(generics.RetrieveAPIView):
-    """
-    DEPRECATED!
-
-    User detail view.
-    This is used for read-only views for user representation only.
-    """
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
-
-
-# Class based views using generic class-based views.
-
-
-class SnippetList(generics.ListCreateAPIView):
-    """
-    DEPRECATED!
-
-    DRF provides a set of already mixed-in generic views like ```ListCreateAPIView```
-    """
-    queryset = Snippet.objects.all()
-    serializer_class = SnippetSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+        with highlight_capacity(slot=False):
+            return HttpResponse(snippet.render_variant(fmt, style), content_type=RENDER_FORMATS[fmt])
+
+    @staticmethod
+    def _stream_highlighted(request, snippet):
+        size = get_highlight_config()['STREAM_CHUNK_SIZE']
+        if len(snippet.render_head) < size:
+            return Response(snippet.render_head)
+        if isinstance(request._request, ASGIRequest):
+            # Django 3.2 iterates streaming responses on the event loop, where the ORM reading the chunks can't run.
+            return Response(snippet.highlighted)
+        response = StreamingHttpResponse(snippet.iter_highlighted(size), content_type='text/html; charset=utf-8')
+        response['Content-Length'] = snippet.render_size
+        return response
+
+    def _get_style(self):
+        """The style of '?style=', None if not given."""
+        style = self.request.query_params.get('style')
+        if style and style not in dict(STYLE_CHOICES):
+            raise ValidationError({'style': [f'Unknown style "{style}".']})
+        return style or None
+
+    def _get_lines(self):
+        """The (start, end) line range of '?lines=', None if not given."""
+        value = self.request.query_params.get('lines')
+        if not value:
+            return None
+        try:
+            return parse_range(value)
+        except LineRangeError as exc:
+            raise ValidationError({'lines': [str(exc)]})
 
-    def perform_create(self, serializer):
+    @action(detail=True)
+    def revisions(self, request, *args, **kwargs):
         """
-        Overridden method from ```rest_framework.mixins.CreateModelMixin```:
-            This method allows us to modify how the instance save is managed,
-            and handle any information that is implicit in the incoming request or reqeusted URL.
+        List the saved versions of the snippet, oldest first and without their code.
         """
+        snippet = self.get_object()
+        page = self.paginate_queryset(Revision.objects.filter(snippet=snippet).defer('data'))
+        serializer = RevisionSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
-        # The ```CreateModelMixin.create()``` method of this serializer will now be passed an additional 'owner' field,
-        # along with the validated data from the request.
-        serializer.save(owner=self.request.user)
-
-
-class SnippetDetail(generics.RetrieveUpdateDestroyAPIView):
-    """
-    DEPRECATED!
-
-    DRF provides a set of already mixed-in generic views like ```RetrieveUpdateDestroyAPIView```
-    """
-    queryset = Snippet.objects.all()
-    serializer_class = SnippetSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-
-
-# Class based views using mixing classes.
-
-
-class DeprecatedMixinSnippetList(mixins.ListModelMixin,
-                  mixins.CreateModelMixin,
-                  generics.GenericAPIView):
-    """
-    DEPRECATED!
-
-    The base class, ```GenericAPIView``` provides the core functionality,
-    and the mixin classes provide the ```.list()``` and ```.create()``` actions.
-    """
-    queryset = Snippet.objects.all()
-    serializer_class = SnippetSerializer
-
-    def get(self, request, *args, **kwargs):
-        return self.list(request=request, *args, **kwargs)
-
-    def post(self, request, *args, **kwargs):
-        return self.create(request=request, *args, **kwargs)
-
-
-class DeprecatedMixinSnippetDetail(mixins.RetrieveModelMixin,
-                    mixins.UpdateModelMixin,
-                    mixins.DestroyModelMixin,
-                    generics.GenericAPIView):
-    """
-    DEPRECATED!
-
-    Again we're using the ```GenericAPIView``` class to provide the core functionality,
-    and adding in mixins to provide the ```.retrieve()```, ```.update()``` and ```.destroy()``` actions.
-    """
-    queryset = Snippet.objects.all()
-    serializer_class = SnippetSerializer
-
-    def get(self, request, *args, **kwargs):
-        return self.retrieve(request=request, *args, **kwargs)
-
-    def put(self, request, *args, **kwargs):
-        return self.update(request=request, *args, **kwargs)
-
-    def delete(self, request, *args, **kwargs):
-        return self.destroy(request=request, *args, **kwargs)
-
-
-# Class based views using APIView.
-
-
-class DeprecatedSnippetList(APIView):
-    """
-    DEPRECATED!
-
-    List all snippets, or create a new snippet.
-    """
-    def get(self, request, format=None):
-        snippets = Snippet.objects.all()
-        serializer = SnippetSerializer(snippets, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
-    def post(self, request, format=None):
-        serializer = SnippetSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class DeprecatedSnippetDetail(APIView):
-    """
-    DEPRECATED!
-
-    Retrieve, update or delete a snippet instance.
-    """
-    def get_object(self, pk):
-        try:
-            return Snippet.objects.get(pk=pk)
-        except Snippet.DoesNotExist:
+    @action(detail=True, url_path=r'revisions/(?P<number>[0-9]+)')
+    def revision(self, request, number, *args, **kwargs):
+        """
+        Retrieve a saved version of the snippet with its code, rebuilt from the nearest keyframe.
+        """
+        snippet = self.get_object()
+        revision = Revision.objects.get_with_code(snippet.pk, int(number))
+        if revision is None:
             raise Http404
+        return Response(RevisionDetailSerializer(revision, context=self.get_serializer_context()).data)
 
-    def get(self, request, pk, format=None):
-        snippet = self.get_object(pk=pk)
-        serializer = SnippetSerializer(snippet)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
-    def put(self, request, pk, format=None):
-        snippet = self.get_object(pk=pk)
-        serializer = SnippetSerializer(snippet, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    def delete(self, request, pk, format=None):
-        snippet = self.get_object(pk=pk)
-        snippet.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
-
-
-# Function based views.
-
-
-@api_view(['GET', 'POST'])
-def snippet_list(request, format=None):
-    """
-    DEPRECATED!
-
-    List all code snippets, or create a new snippet.
-        :param request: Http request object.
-        :return: Jsonify object formed by request method.
-    """
-    if request.method == 'GET':
-        snippets = Snippet.objects.all()
-        serializer = SnippetSerializer(snippets, many=True)
-
-        return Response(serializer.data)
-        # return JsonResponse(serializer.data, safe=False)
-    elif request.method == 'POST':
+    @action(detail=False)
+    def changes(self, request, *args, **kwargs):
         """
-        rest_framework.request.Request:
-            This object has ```request.data``` attribute
-            that is commonly used in 'POST', 'PUT', and 'DELETE' methods.
+        Read the change feed after the cursor '?since=<sequence>', oldest first (see ```changes.py```).
+            Each snippet appears once per page, with its current state, or as a tombstone if deleted.
+            '?limit=' bounds the changes read, '?wait=<seconds>' waits for a change when there is none yet
+            (authenticated clients only).
+            The returned 'cursor' is the 'since' of the next request.
         """
-        serializer = SnippetSerializer(data=request.data)
-        # data = JSONParser().parse(request)
-        # serializer = SnippetSerializer(data=data)
-
-        if serializer.is_valid():
-            serializer.save()
-
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        #     return JsonResponse(serializer.data, status=201)
-        # return JsonResponse(serializer.errors, status=400)
-
+        config = get_changes_config()
+        params, errors = {}, {}
+        for name, cast, default, low, high in (
+                ('since', int, 0, 0, None),
+                ('limit', int, config['PAGE_SIZE'], 1, config['MAX_PAGE_SIZE']),
+                ('wait', float, 0, 0, config['MAX_WAIT'])):
+            try:
+                value = cast(request.query_params.get(name) or default)
+            except ValueError:
+                errors[name] = ['A number is required.']
+                continue
+            if value < low:
+                errors[name] = [f'Must be at least {low}.']
+            elif high is not None and value > high:
+                errors[name] = [f'Must be at most {high}.']
+            params[name] = value
+        if errors:
+            raise ValidationError(errors)
+        if is_expired(params['since']):
+            return Response({
+                'detail': 'Changes after this cursor were pruned, list the snippets again.',
+                'cursor': latest_sequence(),
+            }, status=status.HTTP_410_GONE)
+
+        if not params['wait']:
+            changes, has_more = wait_for_changes(params['since'], params['limit'], 0)
+        elif not request.user.is_authenticated:
+            raise NotAuthenticated('Log in to wait for changes.')
+        else:
+            try:
+                with wait_slot():
+                    changes, has_more = wait_for_changes(params['since'], params['limit'], params['wait'])
+            except WaitBusy as exc:
+                raise Throttled(wait=exc.retry_after, detail='Too many requests are waiting for changes.')
+        latest = {change.snippet_id: change for change in changes}
+        saved = [snippet_id for snippet_id, change in latest.items() if not change.deleted]
+        snippets = self.get_queryset().in_bulk(saved) if saved else {}
+        # A save of a snippet deleted since is followed by its tombstone, which is enough.
+        entries = sorted(
+            (change for change in latest.values() if change.deleted or change.snippet_id in snippets),
+            key=lambda change: change.pk)
+        context = {**self.get_serializer_context(), 'snippets': snippets}
+        return Response({
+            'cursor': changes[-1].pk if changes else params['since'],
+            'has_more': has_more,
+            'changes': SnippetChangeSerializer(entries, many=True, context=context).data,
+        })
 
-@api_view(['GET', 'PUT', 'DELETE'])
-def snippet_detail(request, pk, format=None):
-    """
-    DEPRECATED!
-
-    Retrieve, update or delete a code snippet.
-        :param request: Http request object.
-        :param pk: Target object's primary key.
-        :return: Detailed data of specific snippet.
-    """
-    try:
-        snippet = Snippet.objects.get(pk=pk)
-    except Snippet.DoesNotExist:
-        return Response(status=status.HTTP_404_NOT_FOUND)
-        # return HttpResponse(status=404)
-
-    if request.method == 'GET':
-        serializer = SnippetSerializer(snippet)
-
-        return Response(serializer.data)
-        # return JsonResponse(serializer.data)
-    elif request.method == 'PUT':
+    def perform_create(self, serializer):
         """
-        rest_framework.request.Request:
-            This object has ```request.data``` attribute
-            that is commonly used in 'POST', 'PUT', and 'DELETE' methods.
+        Same as 'perform_create' method of the SnippetList view.
         """
-        serializer = SnippetSerializer(snippet, data=request.data)
-        # data = JSONParser().parse(request)
-        # serializer = SnippetSerializer(snippet, data=data)
+        with highlight_capacity():
+            serializer.save(owner=self.request.user)
 
-        if serializer.is_valid():
+    def perform_update(self, serializer):
+        with highlight_capacity():
             serializer.save()
 
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        #     return JsonResponse(serializer.data)
-        # return JsonResponse(serializer.errors, status=400)
-    elif request.method == 'DELETE':
-        snippet.delete()
 
-        return Response(status=status.HTTP_204_NO_CONTENT)
-        # return HttpResponse(status=204)
+# DEPRECATED views are imported on first access only (PEP 562).
+DEPRECATED_VIEWS = (
+    'api_root', 'SnippetHighlight', 'UserList', 'UserDetail', 'SnippetList', 'SnippetDetail',
+    'DeprecatedMixinSnippetList', 'DeprecatedMixinSnippetDetail', 'DeprecatedSnippetList', 'DeprecatedSnippetDetail',
+    'snippet_list', 'snippet_detail',
+)
+
+
+def __getattr__(name: str):
+    if name in DEPRECATED_VIEWS:
+        from . import deprecated_views
+        return getattr(deprecated_views, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'drftutorial.settings')
+os.environ.setdefault('DRFTUTORIAL_ASYNC_READS', '1')
 
 application = get_asgi_application()
+
+# Set by gunicorn.conf.py, so that the master process warms up once before forking its workers.
+if os.environ.get('DRFTUTORIAL_WARM_UP') == '1':
+    from .warmup import warm_up
+
+    warm_up()
@@ -0,0 +1,51 @@
+"""
+SQLite database backend tuned for a web server.
+    Applies PRAGMAs on every new connection. They can be overridden with ```OPTIONS['pragmas']```:
+
+        - journal_mode=WAL: readers no longer block on a writer and vice versa.
+        - synchronous=NORMAL: safe with WAL, only the checkpoint is synced instead of every commit.
+        - mmap_size, cache_size: serve hot pages from memory instead of read() calls.
+        - busy_timeout: wait for a lock instead of failing immediately with 'database is locked'.
+"""
+
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # Negative values are KiB.
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+_PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+_PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # 'pragmas' is not a keyword argument of sqlite3.connect().
+        self.pragmas = {**DEFAULT_PRAGMAS, **params.pop('pragmas', {})}
+        for name, value in self.pragmas.items():
+            if not _PRAGMA_NAME.match(name) or not _PRAGMA_VALUE.match(str(value)):
+                raise ImproperlyConfigured(f'Invalid SQLite PRAGMA {name}={value}')
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        # SQLite silently ignores unknown PRAGMAs, so a misspelled one would never apply.
+        known = {name for name, in conn.execute('PRAGMA pragma_list')}
+        unknown = sorted(set(self.pragmas) - known) if known else []
+        if unknown:
+            conn.close()
+            raise ImproperlyConfigured(f'Unknown SQLite PRAGMA: {", ".join(unknown)}')
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
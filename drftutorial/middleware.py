@@ -0,0 +1,135 @@
+"""
+Project-wide middlewares.
+"""
+
+import asyncio
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from apps.quickstart.authcache import get_user
+
+from .querycheck import QueryInspector, get_config, get_view_budget
+from .routers import get_replicas, pin_to_primary
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class HybridMiddleware(object):
+    """
+    Base of middlewares supporting both WSGI and ASGI without switching threads.
+        Subclasses implement ```__call__``` for the sync chain and ```__acall__``` for the async chain.
+        In an async chain the middleware is a coroutine function calling ```__acall__```, as function-based
+        middlewares returning an ```async def``` are, and it carries the ```process_*``` hooks of the instance.
+    """
+
+    sync_capable = True
+    async_capable = True
+    hooks = ('process_view', 'process_exception', 'process_template_response')
+
+    def __new__(cls, get_response):
+        instance = super().__new__(cls)
+        instance.get_response = get_response
+        if not asyncio.iscoroutinefunction(get_response):
+            return instance
+
+        async def middleware(request):
+            return await instance.__acall__(request)
+
+        for hook in cls.hooks:
+            if hasattr(instance, hook):
+                setattr(middleware, hook, getattr(instance, hook))
+        return middleware
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+
+class QueryInspectMiddleware(HybridMiddleware):
+    """
+    Inspect every query executed while handling a request.
+        Enabled by ```QUERY_INSPECT['ENABLED']```. The view's ```query_budget``` is resolved in ```process_view```.
+    """
+
+    def __call__(self, request):
+        if not get_config()['ENABLED']:
+            return self.get_response(request)
+
+        inspector = request.query_inspector = QueryInspector(label=f'{request.method} {request.path}')
+        with inspector.activate():
+            response = self.get_response(request)
+        inspector.check()
+        return response
+
+    async def __acall__(self, request):
+        if not get_config()['ENABLED']:
+            return await self.get_response(request)
+
+        inspector = request.query_inspector = QueryInspector(label=f'{request.method} {request.path}')
+        with inspector.activate():
+            response = await self.get_response(request)
+        inspector.check()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        inspector = getattr(request, 'query_inspector', None)
+        if inspector is not None:
+            inspector.budget = get_view_budget(view_func, request.method)
+        return None
+
+
+class ReplicaPinMiddleware(HybridMiddleware):
+    """
+    Pin the reads of a request to the primary database for read-your-writes consistency.
+        Unsafe requests are pinned and set a short-lived cookie, so the client's following
+        requests keep reading from the primary until the replicas have caught up.
+    """
+
+    cookie_name = 'db_pin'
+
+    def __call__(self, request):
+        if not self._should_pin(request):
+            return self.get_response(request)
+
+        with pin_to_primary():
+            response = self.get_response(request)
+        return self._set_cookie(request, response)
+
+    async def __acall__(self, request):
+        if not self._should_pin(request):
+            return await self.get_response(request)
+
+        with pin_to_primary():
+            response = await self.get_response(request)
+        return self._set_cookie(request, response)
+
+    def _should_pin(self, request) -> bool:
+        if not get_replicas():
+            return False
+        return request.method not in SAFE_METHODS or self.cookie_name in request.COOKIES
+
+    def _set_cookie(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                self.cookie_name, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5), httponly=True,
+                samesite='Lax')
+        return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    Set ```request.user``` like ```AuthenticationMiddleware```, loading the user from the cache.
+        See ```apps.quickstart.authcache```, the user is still only loaded when the request reads it.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: self._get_user(request))
+
+    @staticmethod
+    def _get_user(request):
+        if not hasattr(request, '_cached_user'):
+            request._cached_user = get_user(request)
+        return request._cached_user
@@ -0,0 +1,104 @@
+"""
+Pagination classes shared by the apps.
+    Counts are cached until the next snippet write (see apps/snippets/caching.py). Unfiltered lists go further
+    and read their count from a ```RowCounter``` maintained by signals, which costs one indexed lookup instead of
+    a ```COUNT(*)``` over the whole table after each write.
+
+    Both the count cache and ```RowCounter``` belong to the snippets app, so these classes require it installed,
+    the quickstart lists included. Snippet writes and user writes alike bump its generation.
+"""
+
+from collections import OrderedDict
+from functools import partial
+
+from django.apps import apps
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from apps.snippets.caching import cached_count, digest
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Django paginator caching ```COUNT(*)``` by the SQL of the query, so every page of a listing shares it.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except (AttributeError, EmptyResultSet):  # Not a queryset, or a query known to be empty.
+            return super().count
+        return cached_count(digest(sql, params), lambda: Paginator.count.func(self))
+
+
+class CachedCountPagination(PageNumberPagination):
+    django_paginator_class = CachedCountPaginator
+
+
+def is_unfiltered(queryset) -> bool:
+    """Whether ```queryset``` holds every row of its model, so that its count is the row count of the table."""
+    query = getattr(queryset, 'query', None)
+    if query is None:
+        return False
+    return (not query.where and not query.distinct and not query.combinator
+            and query.low_mark == 0 and query.high_mark is None)
+
+
+class ApproximateCountPaginator(CachedCountPaginator):
+    """
+    Paginator counting unfiltered querysets with the ```RowCounter``` of their model, unless ```exact``` is set.
+        Filtered querysets, and models without a counter, keep the exact (cached) count.
+        Counters are created by the migration of ```RowCounter``` and the 'refresh_row_counts' command.
+    """
+
+    def __init__(self, *args, exact: bool = False, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.exact = exact
+        self.count_is_exact = True
+
+    @cached_property
+    def count(self) -> int:
+        if self.exact or not is_unfiltered(self.object_list):
+            return super().count
+        model = self.object_list.model
+        row_counter = apps.get_model('snippets', 'RowCounter')
+        # Signals bump the generation along with the counter, so the counter may be cached like exact counts.
+        count = cached_count(f'rows:{model._meta.label_lower}', lambda: row_counter.get_count(model))
+        if count is None:
+            return super().count
+        self.count_is_exact = False
+        return count
+
+
+class ApproximateCountPagination(CachedCountPagination):
+    """
+    Page number pagination with approximate counts of unfiltered lists.
+        The response tells whether its 'count' is exact, clients may ask for an exact count with '?exact_count=1'.
+        An approximate count may be off by the rows written without signals since the last refresh,
+        so the last page may come out short or empty.
+    """
+    exact_count_query_param = 'exact_count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        exact = request.query_params.get(self.exact_count_query_param, '').lower() in ('1', 'true', 'yes')
+        self.django_paginator_class = partial(ApproximateCountPaginator, exact=exact)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_is_exact', self.page.paginator.count_is_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_exact'] = {'type': 'boolean', 'example': False}
+        return response_schema
@@ -0,0 +1,197 @@
+"""
+Query inspection for development and CI.
+    Every query executed while a ```QueryInspector``` is active is recorded through Django's
+    execute wrapper hook, so it works with ```DEBUG = False``` as well (e.g. in tests).
+    ```watch()``` installs the inspector on the current thread's connections, ```activate()``` follows
+    the current context instead, which also covers views run in other threads under ASGI.
+
+    Three kinds of problems are reported:
+        - N+1 patterns: the same (normalized) statement executed repeatedly within one request.
+        - Slow queries: a single statement running longer than the configured threshold.
+        - Budget overruns: a view executing more queries than it declares in ```query_budget```.
+"""
+
+import logging
+import re
+import time
+import traceback
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'RAISE': False,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOW_QUERY_MS': 100,
+}
+
+# Literals are normally passed as parameters, but raw SQL and 'IN (...)' lists of varying length
+# would otherwise hide structurally identical statements from each other.
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.IGNORECASE)
+
+_PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
+
+_active_inspector = ContextVar('active_query_inspector', default=None)
+
+
+class QueryCheckFailed(AssertionError):
+    """Raised when an inspected block violates a query rule and ```RAISE``` is set."""
+
+
+def get_config() -> dict:
+    """Return the ```QUERY_INSPECT``` setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'QUERY_INSPECT', {})}
+
+
+def normalize_sql(sql: str) -> str:
+    """Reduce a statement to its structure so that repeated per-row queries compare equal."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return ' '.join(sql.split())
+
+
+def project_stack() -> list:
+    """Return the current call stack restricted to frames inside this project."""
+    frames = traceback.extract_stack()[:-2]
+    return [
+        frame for frame in frames
+        if frame.filename.startswith(_PROJECT_ROOT) and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('querycheck.py')
+    ]
+
+
+class QueryInspector(object):
+    """
+    Record queries executed on every database connection and report N+1 patterns,
+    slow statements and query budget overruns.
+    """
+
+    def __init__(self, label: str = '', budget: int = None, n_plus_one_threshold: int = None,
+                 slow_query_ms: float = None) -> None:
+        config = get_config()
+        self.label = label
+        self.budget = budget
+        self.n_plus_one_threshold = (
+            n_plus_one_threshold if n_plus_one_threshold is not None else config['N_PLUS_ONE_THRESHOLD'])
+        self.slow_query_ms = slow_query_ms if slow_query_ms is not None else config['SLOW_QUERY_MS']
+        self.queries = []
+        self._counts = {}
+        self._problems = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute wrapper installed by ```connection.execute_wrapper()```."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self._record(sql, duration_ms)
+
+    def _record(self, sql: str, duration_ms: float) -> None:
+        self.queries.append((sql, duration_ms))
+        shape = normalize_sql(sql)
+        count = self._counts.get(shape, 0) + 1
+        self._counts[shape] = count
+
+        # Capture the stack only when a rule fires, walking the stack on every query is expensive.
+        if self.n_plus_one_threshold and count == self.n_plus_one_threshold:
+            self._problems.append(('N+1', f'Repeated query executed {count}+ times: {shape}', project_stack()))
+        if self.slow_query_ms and duration_ms > self.slow_query_ms:
+            self._problems.append(('slow', f'Query took {duration_ms:.1f}ms: {shape}', project_stack()))
+
+    @contextmanager
+    def watch(self):
+        """Install the inspector on every configured database connection."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @contextmanager
+    def activate(self):
+        """Inspect the queries executed in the current context, in whichever thread they run."""
+        for connection in connections.all():
+            install_dispatcher(connection)
+        token = _active_inspector.set(self)
+        try:
+            yield self
+        finally:
+            _active_inspector.reset(token)
+
+    @property
+    def problems(self) -> list:
+        problems = list(self._problems)
+        if self.budget is not None and len(self.queries) > self.budget:
+            problems.append(('budget', f'{len(self.queries)} queries exceed the budget of {self.budget}', []))
+        return problems
+
+    def report(self) -> str:
+        lines = []
+        for kind, message, stack in self.problems:
+            lines.append(f'[{kind}] {self.label}: {message}')
+            lines.extend(f'    {line.rstrip()}' for line in traceback.format_list(stack))
+        return '\n'.join(lines)
+
+    def check(self, raise_exception: bool = None) -> None:
+        """Log the problems found, or raise ```QueryCheckFailed``` if requested."""
+        if not self.problems:
+            return
+        if raise_exception is None:
+            raise_exception = get_config()['RAISE']
+        report = self.report()
+        if raise_exception:
+            raise QueryCheckFailed(report)
+        logger.warning(report)
+
+
+@contextmanager
+def uninspected():
+    """
+    Leave the queries of the block out of the inspector activated in the current context,
+    e.g. the reads a long poll repeats on purpose.
+    """
+    token = _active_inspector.set(None)
+    try:
+        yield
+    finally:
+        _active_inspector.reset(token)
+
+
+def get_view_budget(view_func, method: str):
+    """
+    Read the ```query_budget``` declared on a view class.
+        The budget may be a single integer or a dict keyed by viewset action name.
+    """
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        return budget.get(actions.get(method.lower()))
+    return budget
+
+
+def _dispatch(execute, sql, params, many, context):
+    """Execute wrapper of every connection, forwarding to the inspector active in the current context."""
+    inspector = _active_inspector.get()
+    if inspector is None:
+        return execute(sql, params, many, context)
+    return inspector(execute, sql, params, many, context)
+
+
+def install_dispatcher(connection, **kwargs) -> None:
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+connection_created.connect(install_dispatcher)
@@ -0,0 +1,60 @@
+"""
+Database routers.
+    ```PrimaryReplicaRouter``` sends writes to the 'default' (primary) database and reads to one of the
+    aliases listed in ```DATABASE_REPLICAS```. Reads stay on the primary while pinned:
+        - for the whole handling of an unsafe (writing) request,
+        - for ```REPLICA_PIN_SECONDS``` after a client's own write (read-your-writes, see ```ReplicaPinMiddleware```),
+        - inside a transaction on the primary,
+        - within an explicit ```pin_to_primary()``` block.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+@contextmanager
+def pin_to_primary():
+    """Route every read in the block to the primary database."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def is_pinned() -> bool:
+    return _pinned.get()
+
+
+def get_replicas() -> list:
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+class PrimaryReplicaRouter(object):
+    """Route reads to read replicas and writes to the primary database."""
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every configured database is the primary or a copy of it.
+        databases = set(settings.DATABASES)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,17 +44,23 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'drftutorial.middleware.QueryInspectMiddleware',
+    'drftutorial.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware reading users from the cache, see apps/quickstart/authcache.py.
+    'drftutorial.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'drftutorial.urls'
 
+# Serve snippet endpoints with coroutine views (see apps/snippets/async_views.py), set by asgi.py.
+SNIPPETS_ASYNC_READS = os.environ.get('DRFTUTORIAL_ASYNC_READS', '') == '1'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -76,13 +83,35 @@ WSGI_APPLICATION = 'drftutorial.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# The tuned SQLite backend enables WAL and applies PRAGMAs on connection creation,
+# see drftutorial/backends/sqlite3/base.py. Connections are kept open for CONN_MAX_AGE seconds.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'drftutorial.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,
+            },
+        },
+    },
+    # Local stand-in of a read replica, kept up to date by 'manage.py sync_replica'.
+    'replica': {
+        'ENGINE': 'drftutorial.backends.sqlite3',
+        'NAME': os.environ.get('DRFTUTORIAL_REPLICA_DB', BASE_DIR / 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+    },
 }
 
+# Reads go to these aliases (see drftutorial/routers.py), e.g. DRFTUTORIAL_REPLICAS=replica.
+DATABASE_ROUTERS = ['drftutorial.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in os.environ.get('DRFTUTORIAL_REPLICAS', '').split(',') if alias]
+# Seconds a client keeps reading from the primary after its own write.
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -131,4 +160,120 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Token buckets of snippet writes (see apps/snippets/throttles.py), None disables a throttle.
+    'DEFAULT_THROTTLE_RATES': {
+        'snippet-write-user': '120/min',
+        'snippet-write-ip': '240/min',
+    },
+}
+
+# Throttle counters and snippet list pages. LocMemCache is private to each process,
+# point it to a shared cache server (e.g. memcached) when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DRFTUTORIAL_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DRFTUTORIAL_CACHE_LOCATION', 'drftutorial'),
+    }
+}
+
+# Sessions and users are only cached in a shared cache: with LocMemCache, a logout, password change or
+# deactivation in one worker would not reach the entries cached by the others (see apps/quickstart/authcache.py).
+_cache_is_shared = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
+# Sessions are read from the cache and written through to the database.
+SESSION_ENGINE = ('django.contrib.sessions.backends.cached_db' if _cache_is_shared
+                  else 'django.contrib.sessions.backends.db')
+
+# Users of authenticated requests, invalidated by their saves, deletes and logouts (see apps/quickstart/authcache.py).
+AUTH_USER_CACHE = {
+    'ENABLED': _cache_is_shared,
+    'TIMEOUT': 300,
+}
+
+# Query inspection (N+1 patterns, slow queries, per-view query budgets)
+QUERY_INSPECT = {
+    'ENABLED': DEBUG,
+    'RAISE': False,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOW_QUERY_MS': 100,
+}
+
+# Snippet list pages and counts, invalidated by any snippet write (see apps/snippets/caching.py).
+SNIPPET_LIST_CACHE = {
+    'ENABLED': True,
+    'TIMEOUT': 300,
+}
+
+# Preloaded before forking the server's workers, see drftutorial/warmup.py.
+# The most used TOP_LANGUAGES are added to LANGUAGES, STYLES None means every style.
+WARM_UP = {
+    'TOP_LANGUAGES': 20,
+    'LANGUAGES': os.environ.get('DRFTUTORIAL_WARM_UP_LANGUAGES', 'python').split(','),
+    'STYLES': None,
+}
+
+# Snippet highlighting limits. Code over MAX_CODE_SIZE characters, or taking longer than TIMEOUT seconds
+# in a highlighter worker process, is stored as plain escaped HTML. TIMEOUT None highlights in-process.
+SNIPPET_HIGHLIGHT = {
+    'MAX_CODE_SIZE': 256 * 1024,
+    'TIMEOUT': 5.0,
+    'WORKERS': 2,
+    # Saves highlighting at once per process, beyond that writes get '429 Too Many Requests' and Retry-After.
+    'MAX_IN_FLIGHT': 8,
+    'RETRY_AFTER': 1,
+    # Code of this size or more is highlighted into a temporary file and stored in chunks,
+    # and renders larger than a chunk are streamed by '/snippets/<pk>/highlight/'.
+    'STREAM_THRESHOLD': 64 * 1024,
+    'STREAM_CHUNK_SIZE': 64 * 1024,
+    'LANGUAGES': {
+        # Per-language overrides, e.g. from the 'bench_highlight' cost table.
+        # 'perl': {'MAX_CODE_SIZE': 64 * 1024, 'TIMEOUT': 2.0},
+    },
+}
+
+# Renders of snippets in other formats and styles ('/snippets/<pk>/render/?fmt=&style=',
+# '/snippets/<pk>/highlight/?style='), see apps/snippets/variants.py.
+SNIPPET_VARIANTS = {
+    # Bounds of the LRU of each process, in variants and in characters.
+    'MAX_ENTRIES': 256,
+    'MAX_SIZE': 32 * 1024 * 1024,
+    # Seconds variants are kept in the shared cache.
+    'TIMEOUT': 3600,
+    # Longest wait of a process for the variant rendered by another one.
+    'LOCK_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.05,
+}
+
+# Snippet revisions, see apps/snippets/revisions.py.
+SNIPPET_REVISIONS = {
+    # A full copy every N revisions, the others are deltas: rebuilding a revision applies at most N - 1 of them.
+    'KEYFRAME_INTERVAL': 16,
+}
+
+# Snippet change feed ('/snippets/changes/'), see apps/snippets/changes.py.
+SNIPPET_CHANGES = {
+    'PAGE_SIZE': 100,
+    'MAX_PAGE_SIZE': 1000,
+    # Longest '?wait=' of a long poll in seconds, each waiting request holds a server thread.
+    'MAX_WAIT': 25,
+    'POLL_INTERVAL': 0.5,
+    # Requests waiting at once, counted in the default cache (per process with LocMemCache), None for no cap.
+    # Beyond that they get '429 Too Many Requests' and Retry-After.
+    'MAX_WAITING': 2,
+    'RETRY_AFTER': 5,
+    # Seconds changes are held back, for databases committing concurrent writes out of sequence order.
+    'SETTLE': 0,
+    # Kept by the 'prune_changes' command.
+    'RETENTION_DAYS': 30,
+}
+
+# Language detection of snippets saved with 'language=auto', see apps/snippets/detection.py.
+SNIPPET_DETECTION = {
+    # Written by the 'build_language_model' command.
+    'MODEL': os.path.join(BASE_DIR, 'apps', 'snippets', 'data', 'language_model.json'),
+    'MAX_SCAN': 16 * 1024,
+    'MIN_TOKENS': 3,
+    # Language of code without any evidence.
+    'FALLBACK': 'text',
+    'CACHE_TIMEOUT': 24 * 3600,
 }
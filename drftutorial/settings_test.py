@@ -0,0 +1,15 @@
+"""
+Django settings of the test suite, the default of 'manage.py test'.
+    Everything of ```settings``` is kept, except what only makes tests slower:
+        - Passwords are hashed with MD5 instead of 260000 rounds of PBKDF2, the hash of every fixture user.
+        - ```testrunner.TestRunner``` lets the processes of the parallel runner start highlighter processes.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+TEST_RUNNER = 'drftutorial.testrunner.TestRunner'
@@ -0,0 +1,24 @@
+"""
+Test runner of the test suite, see ```settings_test```.
+    The parallel runner ('--parallel') runs tests in the daemonic processes of a ```multiprocessing.Pool```,
+    which may not start processes of their own. Saving a snippet starts highlighter processes
+    (```apps.snippets.highlighting.worker_pool```), so the test processes are made non-daemonic.
+    Highlighter processes are daemonic themselves, and still stop with the test process.
+"""
+
+import multiprocessing
+
+from django.test.runner import DiscoverRunner, ParallelTestSuite, _init_worker
+
+
+def _init_test_process(counter) -> None:
+    multiprocessing.current_process().daemon = False
+    _init_worker(counter)
+
+
+class HighlightingParallelTestSuite(ParallelTestSuite):
+    init_worker = _init_test_process
+
+
+class TestRunner(DiscoverRunner):
+    parallel_test_suite = HighlightingParallelTestSuite
@@ -0,0 +1,74 @@
+"""
+Warm-up of a server process before it forks its workers.
+    Without it, every worker lists the pygments lexers, imports and compiles lexers and styles,
+    and populates the URL resolvers on its own first requests, which are therefore much slower than the rest.
+    Done once in the master process (e.g. gunicorn's ```preload_app```), the workers share that state
+    copy-on-write. ```gc.freeze()``` keeps the garbage collector from touching, and so copying, those pages.
+"""
+
+import gc
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from django.urls import get_resolver
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TOP_LANGUAGES': 20,
+    'LANGUAGES': ['python'],
+    'STYLES': None,
+}
+
+
+def get_config() -> dict:
+    """Return the ```WARM_UP``` setting merged over the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'WARM_UP', {})}
+
+
+def top_languages(limit: int) -> list:
+    """Return the languages of most snippets, or an empty list if the database is not usable yet."""
+    from apps.snippets.models import Snippet
+
+    try:
+        return list(
+            Snippet.objects.order_by().values('language').annotate(total=Count('id'))
+            .order_by('-total').values_list('language', flat=True)[:limit])
+    except Exception as exc:  # e.g. before the first migration.
+        logger.warning('Skip loading the top languages: %r', exc)
+        return []
+
+
+def warm_up(freeze: bool = True) -> dict:
+    """
+    Preload the state every worker would otherwise build on its first requests.
+        Database connections are closed at the end, they must not be shared with forked workers.
+        :param freeze: Move every object tracked so far to the permanent generation of the garbage collector.
+        :return: What was loaded, and how long it took.
+    """
+    from apps.snippets.highlighting import preload
+    from apps.snippets.models import LANGUAGE_CHOICES, STYLE_CHOICES
+
+    start = time.perf_counter()
+    config = get_config()
+    valid_languages, valid_styles = dict(LANGUAGE_CHOICES), dict(STYLE_CHOICES)
+
+    languages = list(dict.fromkeys(config['LANGUAGES'] + top_languages(config['TOP_LANGUAGES'])))
+    styles = config['STYLES'] if config['STYLES'] is not None else list(valid_styles)
+    preload([language for language in languages if language in valid_languages],
+            [style for style in styles if style in valid_styles])
+
+    # Imports every view and populates the reverse lookup tables.
+    get_resolver().reverse_dict
+
+    connections.close_all()
+    if freeze:
+        gc.freeze()
+
+    result = {'languages': languages, 'styles': len(styles), 'seconds': round(time.perf_counter() - start, 3)}
+    logger.info('Warmed up %d languages and %d styles in %.3fs.', len(languages), len(styles), result['seconds'])
+    return result
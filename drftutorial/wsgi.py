@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'drftutorial.settings')
 
 application = get_wsgi_application()
+
+# Set by gunicorn.conf.py, so that the master process warms up once before forking its workers.
+if os.environ.get('DRFTUTORIAL_WARM_UP') == '1':
+    from .warmup import warm_up
+
+    warm_up()
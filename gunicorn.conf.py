@@ -0,0 +1,23 @@
+"""
+gunicorn configuration of drftutorial project.
+    (venv) $ gunicorn -c gunicorn.conf.py drftutorial.wsgi
+
+    The application is loaded and warmed up once in the master process (see drftutorial/warmup.py),
+    and the forked workers share it copy-on-write.
+"""
+
+import os
+
+os.environ.setdefault('DRFTUTORIAL_WARM_UP', '1')
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Highlighter processes can't be shared between workers, start each worker's own before its first request.
+    from apps.snippets.highlighting import worker_pool
+
+    worker_pool.prestart()
@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'drftutorial.settings')
+    # Tests run with their own settings profile, see drftutorial/settings_test.py.
+    is_test = len(sys.argv) > 1 and sys.argv[1] == 'test'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'drftutorial.settings_test' if is_test else 'drftutorial.settings')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: